@@ -0,0 +1,265 @@
+#!/usr/bin/python
+#
+# checkpoint.py
+#
+# 2015/05/16
+# rg
+#
+# compact binary checkpoints for a Population, replacing pickled Population objects. a checkpoint file holds:
+#
+# - 8 byte magic, then the format version and the header length as little-endian uint32s
+# - a JSON header: population settings, the genome and stats shapes, the stats column names and block offsets
+# - the genome matrix: one row of little-endian float64 genes per member, 64-byte aligned
+# - the stats table: one row of little-endian int64 stats per member, in header column order
+#
+# the blocks are raw arrays, so a checkpoint can be memory-mapped rather than read. writes go to a temporary file
+# that is renamed into place, so a crash mid-write never leaves a torn checkpoint behind. a CheckpointWriter does the
+# writing on a background thread.
+
+import atexit
+import json
+import numpy as np
+import os
+import pickle
+import struct
+import threading
+import weakref
+
+MAGIC = 'GINCKPT\0'
+VERSION = 1
+PREAMBLE = struct.Struct('<8sII')
+ALIGNMENT = 64
+
+GENOME_DTYPE = np.dtype('<f8')
+STATS_DTYPE = np.dtype('<i8')
+
+# the per-member stats Population keeps, in the order we store them
+STATS_COLUMNS = ['match_wins', 'match_losses', 'game_wins', 'coinflip_game_wins', 'game_losses', 'game_points',
+                 'generation']
+
+
+class CheckpointError(Exception):
+    pass
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+# does the file at path start like a checkpoint?
+def is_checkpoint(path):
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except IOError:
+        return False
+
+
+# write genomes (members x genes) and stats (members x columns) with an info dict of population settings
+def write_checkpoint(path, genomes, stats, info, columns=None):
+    if columns is None:
+        columns = STATS_COLUMNS
+    genomes = np.ascontiguousarray(genomes, dtype=GENOME_DTYPE)
+    stats = np.ascontiguousarray(stats, dtype=STATS_DTYPE)
+    assert genomes.ndim == 2 and stats.ndim == 2, "genomes and stats must be 2-d"
+    assert len(genomes) == len(stats), "need one stats row per genome"
+    assert stats.shape[1] == len(columns), "need one stats column per column name"
+
+    # the header records where the blocks go, which depends on the header's own length. the offsets are padded out
+    # to a fixed width so that filling them in can't change that length.
+    header = {'info': info,
+              'member_count': genomes.shape[0],
+              'gene_count': genomes.shape[1],
+              'columns': list(columns),
+              'genome_offset': 0,
+              'stats_offset': 0}
+    header_length = len(json.dumps(header, sort_keys=True)) + 40
+    header['genome_offset'] = _align(PREAMBLE.size + header_length)
+    header['stats_offset'] = _align(header['genome_offset'] + genomes.nbytes)
+    encoded = json.dumps(header, sort_keys=True)
+    assert len(encoded) <= header_length, "checkpoint header outgrew its space"
+    encoded = encoded.ljust(header_length)
+
+    temporary_path = path + '.tmp'
+    with open(temporary_path, 'wb') as f:
+        f.write(PREAMBLE.pack(MAGIC, VERSION, header_length))
+        f.write(encoded)
+        f.write('\0' * (header['genome_offset'] - f.tell()))
+        f.write(genomes.tobytes())
+        f.write('\0' * (header['stats_offset'] - f.tell()))
+        f.write(stats.tobytes())
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(temporary_path, path)
+
+
+def read_header(path):
+    with open(path, 'rb') as f:
+        preamble = f.read(PREAMBLE.size)
+        if len(preamble) < PREAMBLE.size:
+            raise CheckpointError("truncated checkpoint: " + path)
+        magic, version, header_length = PREAMBLE.unpack(preamble)
+        if magic != MAGIC:
+            raise CheckpointError("not a checkpoint: " + path)
+        if version != VERSION:
+            raise CheckpointError("unsupported checkpoint version {0}: {1}".format(version, path))
+        return json.loads(f.read(header_length))
+
+
+# return (info, columns, genomes, stats). with mmap, the arrays are read-only maps of the file rather than copies.
+def read_checkpoint(path, mmap=True):
+    header = read_header(path)
+    member_count, gene_count = header['member_count'], header['gene_count']
+    columns = header['columns']
+
+    # np.memmap can't map zero bytes
+    if mmap and member_count > 0:
+        genomes = np.memmap(path, dtype=GENOME_DTYPE, mode='r', offset=header['genome_offset'],
+                            shape=(member_count, gene_count))
+        stats = np.memmap(path, dtype=STATS_DTYPE, mode='r', offset=header['stats_offset'],
+                          shape=(member_count, len(columns)))
+    else:
+        with open(path, 'rb') as f:
+            f.seek(header['genome_offset'])
+            genomes = np.fromfile(f, dtype=GENOME_DTYPE, count=member_count * gene_count)
+            f.seek(header['stats_offset'])
+            stats = np.fromfile(f, dtype=STATS_DTYPE, count=member_count * len(columns))
+        if len(genomes) != member_count * gene_count or len(stats) != member_count * len(columns):
+            raise CheckpointError("truncated checkpoint: " + path)
+        genomes = genomes.reshape(member_count, gene_count)
+        stats = stats.reshape(member_count, len(columns))
+
+    return header['info'], columns, genomes, stats
+
+
+# writers that haven't been closed yet. held weakly, so a writer nobody references any more can be collected, and
+# closed by a single hook at interpreter exit.
+_live_writers = weakref.WeakSet()
+
+
+@atexit.register
+def _close_live_writers():
+    for writer in list(_live_writers):
+        writer.close()
+
+
+# writes checkpoints on a background thread. at most one snapshot waits behind the one being written: submitting
+# another replaces it, since only the newest matters. flush() waits for everything submitted so far to land, and runs
+# at interpreter exit too. the thread only holds a weak reference, and exits once the writer is closed or collected.
+class CheckpointWriter(object):
+    def __init__(self, path):
+        self.path = path
+        self.pending = None
+        self.writing = False
+        self.closed = False
+        self.last_error = None
+        self.condition = threading.Condition()
+
+        condition = self.condition
+        writer_ref = weakref.ref(self, lambda ref: _wake(condition))
+        self.thread = threading.Thread(target=_write_loop, args=(writer_ref, condition), name='CheckpointWriter')
+        self.thread.daemon = True
+        self.thread.start()
+        _live_writers.add(self)
+
+    # queue (genomes, stats, info) for writing. the arrays must not change afterwards, so pass copies.
+    def submit(self, genomes, stats, info):
+        with self.condition:
+            assert not self.closed, "can't submit to a closed CheckpointWriter"
+            self.pending = (genomes, stats, info)
+            self.condition.notify_all()
+
+    # wait for the submitted snapshots to be written. returns False if the last write failed.
+    def flush(self):
+        with self.condition:
+            while self.pending is not None or self.writing:
+                self.condition.wait(0.1)
+            return self.last_error is None
+
+    def close(self):
+        if self.closed:
+            return self.last_error is None
+        result = self.flush()
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+        _live_writers.discard(self)
+        return result
+
+
+def _wake(condition):
+    with condition:
+        condition.notify_all()
+
+
+# the CheckpointWriter thread. it drops its reference to the writer while it waits, so an unreferenced writer can be
+# collected; the weakref callback then wakes it up to exit.
+def _write_loop(writer_ref, condition):
+    while True:
+        with condition:
+            writer = writer_ref()
+            while writer is not None and writer.pending is None and not writer.closed:
+                writer = None
+                condition.wait()
+                writer = writer_ref()
+            if writer is None or writer.pending is None:
+                return
+            path = writer.path
+            genomes, stats, info = writer.pending
+            writer.pending = None
+            writer.writing = True
+            writer = None
+
+        try:
+            write_checkpoint(path, genomes, stats, info)
+            error = None
+        except Exception as e:
+            error = e
+
+        with condition:
+            writer = writer_ref()
+            if writer is None:
+                return
+            writer.last_error = error
+            writer.writing = False
+            writer = None
+            condition.notify_all()
+
+
+# convert a Population pickled by the old persist() into a checkpoint
+def convert_legacy_pickle(legacy_path, path):
+    with open(legacy_path, 'r') as f:
+        restored = pickle.load(f)
+
+    members = restored.member_genes.items()
+    genomes = np.array([np.asarray(geneset.genes, dtype=GENOME_DTYPE) for geneset, stats in members])
+    if len(members) == 0:
+        genomes = np.zeros((0, 0), dtype=GENOME_DTYPE)
+    stats = np.array([[stats[column] for column in STATS_COLUMNS] for geneset, stats in members],
+                     dtype=STATS_DTYPE).reshape(len(members), len(STATS_COLUMNS))
+    info = {'current_generation': restored.current_generation, 'retain_best': restored.retain_best}
+
+    write_checkpoint(path, genomes, stats, info)
+    return len(members)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="inspect population checkpoints or convert legacy pickles to them")
+    subparsers = parser.add_subparsers(dest='command')
+    convert_parser = subparsers.add_parser('convert', help="convert a pickled population to a checkpoint")
+    convert_parser.add_argument('legacy_path')
+    convert_parser.add_argument('path')
+    info_parser = subparsers.add_parser('info', help="describe a checkpoint")
+    info_parser.add_argument('path')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        count = convert_legacy_pickle(args.legacy_path, args.path)
+        print "wrote {0} members to {1}".format(count, args.path)
+    else:
+        header = read_header(args.path)
+        print "{0}: {1} members x {2} genes, {3}".format(args.path, header['member_count'], header['gene_count'],
+                                                        header['info'])
@@ -0,0 +1,40 @@
+#!/usr/bin/python
+#
+# dealbank.py
+#
+# 2015/05/22
+# rg
+#
+# a bank of pre-shuffled deals, so that fitness tests can play every pairing on the same cards (common random numbers)
+# and rankings reflect skill rather than luck of the draw. each deal is a deck order: a permutation of the 52 card bits
+# (Card.ranking() - 1), dealt from the end, as taken by Deck and GinMatchBatch. banks are generated from a seed, and
+# saved as a uint8 .npy array of 52 bytes per deal that loads (memory-mapped) without re-shuffling.
+
+import numpy as np
+
+
+class DealBank(object):
+    def __init__(self, deals):
+        self.deals = np.asarray(deals, dtype=np.uint8)
+        assert self.deals.ndim == 2 and self.deals.shape[1] == 52, "deals must be rows of 52 cards"
+        assert len(self.deals) > 0, "a deal bank needs at least one deal"
+
+    def __len__(self):
+        return len(self.deals)
+
+    # the deck order for the n-th deal. banks wrap around, so every n has a deal.
+    def deal(self, n):
+        return self.deals[n % len(self.deals)].tolist()
+
+    # generate count deals from a seed. the same seed always gives the same bank.
+    @staticmethod
+    def generate(count, seed=None):
+        assert count > 0, "a deal bank needs at least one deal"
+        return DealBank(np.random.RandomState(seed).rand(count, 52).argsort(axis=1))
+
+    def save(self, path):
+        np.save(path, self.deals)
+
+    @staticmethod
+    def load(path, mmap=True):
+        return DealBank(np.load(path, mmap_mode='r' if mmap else None))
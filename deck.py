@@ -7,7 +7,29 @@
 #
 # base classes for managing a deck of cards
 
-from random import shuffle
+import random
+
+
+# bit layout for hand masks. each card occupies bit (Card.ranking() - 1), so clubs live in bits 0-12, diamonds in
+# 13-25, hearts in 26-38 and spades in 39-51. a suit's 13-bit rank mask has bit (rank - 1) set for each held rank.
+SUIT_OFFSETS = {'c': 0, 'd': 13, 'h': 26, 's': 39}
+RANK_MASK = 0x1FFF
+
+# RANK_COLUMNS[rank] has the bit for that rank set in all four suits
+RANK_COLUMNS = [0] * 14
+for _rank in range(1, 14):
+    for _offset in SUIT_OFFSETS.values():
+        RANK_COLUMNS[_rank] |= 1 << (_offset + _rank - 1)
+
+
+# return the mask bit for a given rank/suit
+def card_bit(rank, suit):
+    return 1 << (SUIT_OFFSETS[suit] + rank - 1)
+
+
+# return the number of set bits in a mask
+def popcount(mask):
+    return bin(mask).count('1')
 
 
 class Card(object):
@@ -48,16 +70,24 @@ class Card(object):
 
 
 class Deck(object):
-    def __init__(self):
+    # create a shuffled deck, or one stacked in a given order: a permutation of the 52 card bits (Card.ranking() - 1),
+    # to be dealt from the end. decks shuffle with rng: a random.Random, or the random module itself.
+    def __init__(self, order=None, rng=random):
+        self.rng = rng
         self.cards = []
-        for suit in ('c', 'd', 'h', 's'):
-            for rank in range(1, 14):
-                c = Card(rank, suit)
-                self.cards.append(c)
-        self.shuffle()
+        if order is None:
+            for suit in ('c', 'd', 'h', 's'):
+                for rank in range(1, 14):
+                    c = Card(rank, suit)
+                    self.cards.append(c)
+            self.shuffle()
+        else:
+            order = [int(bit) for bit in order]
+            assert sorted(order) == range(52), "deck order must be a permutation of the 52 cards"
+            self.cards = [Card(bit % 13 + 1, 'cdhs'[bit // 13]) for bit in order]
 
     def shuffle(self):
-        shuffle(self.cards)
+        self.rng.shuffle(self.cards)
 
     def deal_a_card(self):
         return self.cards.pop()
\ No newline at end of file
@@ -7,13 +7,22 @@
 #
 # everything required to create a population, perform cross-overs and mutations and run fitness tests
 
+import Queue
+import collections
+import math
 import random
 from texttable import *
 from utility import *
 from ginmatch import *
 from neuralnet import *
 from ginstrategy import *
+import multiprocessing
+import numpy as np
+import signal
 import pickle
+import checkpoint
+from pairing import *
+from dealbank import *
 
 
 class GeneSet(object):
@@ -79,6 +88,54 @@ class GeneSet(object):
                 self.genes[i] += random.gauss(0, 0.5)
 
 
+# a GeneSet holding its genes in one contiguous float array. crossing and mutating work on the whole genome at once.
+# random numbers come from a numpy generator seeded off the random module, so random.seed() still makes runs
+# repeatable.
+class ArrayGeneSet(GeneSet):
+    def __init__(self, genes=None):
+        if isinstance(genes, int):
+            self.genes = ArrayGeneSet.random_state().normal(0, 1, genes)
+        elif isinstance(genes, (list, np.ndarray)):
+            self.genes = np.array(genes, dtype=np.float64)
+        else:
+            raise AssertionError("strange value passed in")
+
+    @staticmethod
+    def make_geneset(*args, **kwargs):
+        return ArrayGeneSet(*args, **kwargs)
+
+    @staticmethod
+    def random_state():
+        return np.random.RandomState(random.getrandbits(32))
+
+    # cross the genes of two GeneSets, taking each gene from either partner with equal odds
+    def cross(self, partner):
+        big_partner, small_partner = self, partner
+        if len(self.genes) < len(partner.genes):
+            big_partner, small_partner = partner, self
+
+        rng = ArrayGeneSet.random_state()
+        overlap = len(small_partner.genes)
+        child_genes = np.empty(len(big_partner.genes), dtype=np.float64)
+
+        from_small_partner = rng.random_sample(overlap) < 0.5
+        child_genes[:overlap] = np.where(from_small_partner, np.asarray(small_partner.genes, dtype=np.float64),
+                                         np.asarray(big_partner.genes[:overlap], dtype=np.float64))
+
+        # like GeneSet, genes beyond the smaller genome are fresh random ones
+        child_genes[overlap:] = rng.normal(0, 1, len(child_genes) - overlap)
+
+        return self.make_geneset(child_genes)
+
+    # additively mutate our genes (independently) at a given probability, only drawing noise for the genes that mutate
+    def mutate(self, probability=None):
+        if probability is None:
+            probability = 0.001
+        rng = ArrayGeneSet.random_state()
+        mutated = np.nonzero(rng.random_sample(len(self.genes)) < probability)[0]
+        self.genes[mutated] += rng.normal(0, 0.5, len(mutated))
+
+
 class GinGeneSet(GeneSet):
     def __init__(self, genes=None):
         super(GinGeneSet, self).__init__(genes)
@@ -88,11 +145,227 @@ class GinGeneSet(GeneSet):
         return GinGeneSet(*args, **kwargs)
 
 
+# per-member stats for a population, as one row of a structured array per member. it is the dict of GeneSet -> stats
+# it replaces: looking a member up gives a StatsRow, which reads and writes its row in place, and any mapping of stats
+# can be stored. members iterate in row order. the whole table can be scored at once (see Population.ranking_scores).
+class MemberStats(dict):
+    dtype = np.dtype([(column, np.int64) for column in checkpoint.STATS_COLUMNS])
+
+    def __init__(self, members=None):
+        super(MemberStats, self).__init__()
+        self.table = np.zeros(16, dtype=MemberStats.dtype)
+        self.members = []
+        self.rows = {}
+        if members is not None:
+            self.update(members)
+
+    def __setitem__(self, member, stats):
+        # read before writing, in case stats is this member's own row
+        values = tuple(stats[column] for column in checkpoint.STATS_COLUMNS)
+        if member not in self.rows:
+            if len(self.members) == len(self.table):
+                self.table = np.resize(self.table, 2 * len(self.table))
+            self.rows[member] = len(self.members)
+            self.members.append(member)
+            super(MemberStats, self).__setitem__(member, StatsRow(self, member))
+        self.table[self.rows[member]] = values
+
+    # move the last row into the hole, so the table stays packed
+    def __delitem__(self, member):
+        super(MemberStats, self).__delitem__(member)
+        row = self.rows.pop(member)
+        last = self.members.pop()
+        if last is not member:
+            self.table[row] = self.table[len(self.members)]
+            self.members[row] = last
+            self.rows[last] = row
+
+    # remove a member, returning its stats as a dict
+    def pop(self, member, *default):
+        if member not in self.rows and default:
+            return default[0]
+        stats = self[member].copy()
+        del self[member]
+        return stats
+
+    def popitem(self):
+        if not self.members:
+            raise KeyError("popitem(): dictionary is empty")
+        member = self.members[-1]
+        return member, self.pop(member)
+
+    def setdefault(self, member, default=None):
+        if member not in self.rows:
+            self[member] = default
+        return self[member]
+
+    def update(self, members=(), **kwargs):
+        if hasattr(members, 'keys'):
+            members = [(member, members[member]) for member in members.keys()]
+        for member, stats in members:
+            self[member] = stats
+        for member, stats in kwargs.items():
+            self[member] = stats
+
+    def clear(self):
+        super(MemberStats, self).clear()
+        self.members = []
+        self.rows = {}
+
+    def copy(self):
+        return MemberStats(self)
+
+    def __iter__(self):
+        return iter(list(self.members))
+
+    def iterkeys(self):
+        return iter(self)
+
+    def keys(self):
+        return list(self.members)
+
+    def itervalues(self):
+        return iter(self.values())
+
+    def values(self):
+        return [self[member] for member in self.members]
+
+    def iteritems(self):
+        return iter(self.items())
+
+    def items(self):
+        return [(member, self[member]) for member in self.members]
+
+    # the rows of the table in use, in the order of self.members
+    def active(self):
+        return self.table[:len(self.members)]
+
+    # a copy of the rows of the given members, in order
+    def select(self, members):
+        return self.table[[self.rows[member] for member in members]]
+
+    # pickle as the members and their stats, since dict unpickling would store items before restoring our attributes
+    def __reduce__(self):
+        return MemberStats, ([(member, self[member].copy()) for member in self.members],)
+
+    def __repr__(self):
+        return repr(dict((member, self[member].copy()) for member in self.members))
+
+
+# one member's stats in a MemberStats table
+class StatsRow(collections.MutableMapping):
+    def __init__(self, member_stats, member):
+        self.member_stats = member_stats
+        self.member = member
+
+    def __getitem__(self, column):
+        return int(self.member_stats.table[column][self.member_stats.rows[self.member]])
+
+    def __setitem__(self, column, value):
+        self.member_stats.table[column][self.member_stats.rows[self.member]] = value
+
+    def __delitem__(self, column):
+        raise TypeError("stats columns can't be deleted")
+
+    def __iter__(self):
+        return iter(checkpoint.STATS_COLUMNS)
+
+    def __len__(self):
+        return len(checkpoint.STATS_COLUMNS)
+
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return repr(self.copy())
+
+
+# the population under test in a fitness test worker process, as a stacked net with one member per genome
+_worker_stack = None
+
+
+# a stacked net with one member per genome
+def _stack_genomes(genomes):
+    num_inputs = 11 + 5 + 33
+    num_outputs = 4
+    num_hidden = int((num_inputs + num_outputs) * (2.0 / 3.0))
+    return GinStackedNeuralNet([WeightSet(ArrayGeneSet(genes), num_inputs, num_hidden, num_outputs)
+                                for genes in genomes], [11, 33, 5])
+
+
+# set up a fitness test worker. the parent handles Ctrl-C, so workers ignore it.
+def _init_fitness_worker(genomes=()):
+    global _worker_stack
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    _worker_stack = _stack_genomes(genomes) if genomes else None
+
+
+# play one match between two members of a stacked net, from the given seed and deck order. returns the match result
+# with the winner and loser given as member indexes. the match draws from a random.Random of its own, so playing it
+# in-process (as steady-state evolution does) leaves the caller's random state alone.
+def _play_match(stack, challenger, defender, seed, deck_order):
+    challenger_player = GinPlayer()
+    defender_player = GinPlayer()
+    match = GinMatch(challenger_player, defender_player, deck_order, random.Random(seed))
+    for player, opponent, member in [(challenger_player, defender_player, challenger),
+                                     (defender_player, challenger_player, defender)]:
+        features = FeatureVector([player, match.table, match])
+        player.strategy = NeuralGinStrategy(player, opponent, match, MemberNeuralNet(stack, member, features))
+
+    match_result = match.run()
+    for key in ('winner', 'loser'):
+        if match_result[key] is challenger_player:
+            match_result[key] = challenger
+        elif match_result[key] is defender_player:
+            match_result[key] = defender
+    return match_result
+
+
+# play one (challenger, defender, seed, deck_order) pairing of the worker's population
+def _play_pairing(pairing):
+    return _play_match(_worker_stack, *pairing)
+
+
+# play one (challenger genes, defender genes, seed, deck_order) match. the winner and loser are given as 0 for the
+# challenger and 1 for the defender.
+def _play_genomes(match):
+    challenger_genes, defender_genes, seed, deck_order = match
+    return _play_match(_stack_genomes([challenger_genes, defender_genes]), 0, 1, seed, deck_order)
+
+
 class Population(object):
-    def __init__(self, gene_size, population_size, retain_best=None, local_storage=None):
+    def __init__(self, gene_size, population_size, retain_best=None, local_storage=None, batched_inference=True,
+                 workers=1, gene_storage='array', incremental_fitness=True, games_per_pairing=1, scheduler=None,
+                 deal_bank=None, swap_seats=True):
         self.member_genes = {}
         self.current_generation = 0
 
+        # genomes are either numpy arrays (ArrayGeneSet) or lists of floats (GeneSet)
+        assert gene_storage in ('array', 'list'), "gene_storage must be 'array' or 'list'"
+        self.gene_storage = gene_storage
+
+        # pulse every member's network for all concurrent games at once (see fitness_test)
+        self.batched_inference = batched_inference
+
+        # number of processes to play fitness test matches in. 1 plays them all in this process.
+        self.workers = workers
+
+        # every pair of members is owed games_per_pairing matches. incrementally, a pairing is only played until it has
+        # had them, so survivors of a cull don't replay each other; otherwise every pairing is replayed each generation.
+        self.incremental_fitness = incremental_fitness
+        self.games_per_pairing = games_per_pairing
+        self.pairing_games = {}
+
+        # the cards pairings play (see deal_pairings). without a DealBank, every match is shuffled afresh.
+        self.deal_bank = deal_bank
+        self.swap_seats = swap_seats
+
+        # who plays whom in the fitness test (see pairing.py). by default, everyone plays everyone.
+        if scheduler is None:
+            self.scheduler = RoundRobinScheduler()
+        else:
+            self.scheduler = scheduler
+
         if retain_best is None:
             # by default, keep at least 2 and at most best 10%
             self.retain_best = max(2, int(len(self.member_genes) * 0.10))
@@ -105,9 +378,36 @@ class Population(object):
         else:
             self.local_storage = local_storage
 
+        # writes checkpoints in the background (see persist)
+        self.checkpoint_writer = None
+
         # create the initial genes
         for i in range(population_size):
-            self.add_member(GeneSet(gene_size), 0)
+            self.add_member(self.make_geneset(gene_size), 0)
+
+    # a background checkpoint writer holds a thread, so it isn't pickled with us
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['checkpoint_writer'] = None
+        return state
+
+    # member GeneSet -> stats, held in a MemberStats. assigning any mapping of stats (such as a plain dict) converts it.
+    @property
+    def member_genes(self):
+        return self.__dict__['member_genes']
+
+    @member_genes.setter
+    def member_genes(self, members):
+        if not isinstance(members, MemberStats):
+            members = MemberStats(members)
+        self.__dict__['member_genes'] = members
+
+    # create a GeneSet in our storage mode
+    def make_geneset(self, genes):
+        if self.gene_storage == 'array':
+            return ArrayGeneSet(genes)
+        else:
+            return GeneSet(genes)
 
     # iterate through one generation
     def generate_next_generation(self):
@@ -123,9 +423,139 @@ class Population(object):
 
         self.current_generation += 1
 
-        # auto-save every so often
+        # auto-save every so often, without waiting for the write
         if self.local_storage and self.current_generation % 100 == 0:
-            self.persist(action='store')
+            self.persist(action='store', wait=False)
+
+    # steady-state evolution: rather than testing, culling and breeding a whole generation at a time, keep the workers
+    # playing matches and fold each result in as it arrives. the member with the fewest matches (counting those in
+    # flight) is always next to play, against a random opponent. every matches_per_birth results, two of the best
+    # retain_best members with at least minimum_matches behind them breed a child, and the worst such member outside
+    # the top retain_best makes room for it. a generation passes for every population-size births. the run ends once the
+    # given number of matches has been played.
+    def evolve_steady_state(self, matches, minimum_matches=3, matches_per_birth=None):
+        target_size = len(self.member_genes)
+        assert target_size >= 2, "need at least two members to play"
+        if matches_per_birth is None:
+            matches_per_birth = max(1, target_size // 2)
+
+        # matches in flight per member, and the next game each pairing deals (see deal_pairings)
+        in_flight = {}
+        dealt_games = {}
+        completed = Queue.Queue()
+        outstanding = []
+        results_seen = [0]
+        births = [0]
+
+        def submit(play):
+            challenger, defender = self.next_steady_state_pairing(in_flight)
+            for member in (challenger, defender):
+                in_flight[member] = in_flight.get(member, 0) + 1
+            challenger, defender, deck_order = self.deal_pairings([(challenger, defender)], dealt_games)[0]
+            play((challenger, defender), (challenger.genes, defender.genes, random.getrandbits(32), deck_order))
+
+        def receive(pairing, match_result):
+            for member in pairing:
+                in_flight[member] -= 1
+                if in_flight[member] == 0:
+                    del in_flight[member]
+
+            # results for members culled while their match was in flight are dropped
+            if all(member in self.member_genes for member in pairing):
+                self.record_match_result(pairing[match_result['winner']], pairing[match_result['loser']],
+                                         match_result)
+
+            results_seen[0] += 1
+            if results_seen[0] % matches_per_birth == 0 and self.breed_steady_state(target_size, minimum_matches):
+                self.forget_fallen_pairings(dealt_games)
+                births[0] += 1
+                if births[0] % target_size == 0:
+                    self.current_generation += 1
+                    if self.local_storage and self.current_generation % 100 == 0:
+                        self.persist(action='store', wait=False)
+
+        if self.workers <= 1:
+            for _ in range(matches):
+                submit(lambda pairing, match: receive(pairing, _play_genomes(match)))
+            return
+
+        pool = multiprocessing.Pool(self.workers, initializer=_init_fitness_worker)
+        try:
+            def play(pairing, match):
+                outstanding.append(pool.apply_async(_play_genomes, (match,),
+                                                    callback=lambda result: completed.put((pairing, result))))
+
+            # keep two matches per worker queued, so no worker waits on us
+            submitted = 0
+            while submitted < min(matches, 2 * self.workers):
+                submit(play)
+                submitted += 1
+
+            received = 0
+            while received < matches:
+                try:
+                    # a get() with a timeout can be interrupted by Ctrl-C under python 2
+                    pairing, match_result = completed.get(timeout=1)
+                except Queue.Empty:
+                    # a match that raised never calls back, so look for failures
+                    for async_result in outstanding:
+                        if async_result.ready() and not async_result.successful():
+                            async_result.get()
+                    continue
+                outstanding[:] = [async_result for async_result in outstanding if not async_result.ready()]
+
+                receive(pairing, match_result)
+                received += 1
+                if submitted < matches:
+                    submit(play)
+                    submitted += 1
+        finally:
+            pool.terminate()
+            pool.join()
+
+    # the next steady-state pairing: the member with the fewest matches, counting those in flight, against a random
+    # other member
+    def next_steady_state_pairing(self, in_flight):
+        members = self.member_genes.members
+        table = self.member_genes.active()
+        played = table['match_wins'] + table['match_losses']
+        played += np.array([in_flight.get(member, 0) for member in members])
+
+        challenger = int(np.argmin(played))
+        defender = random.randrange(len(members) - 1)
+        if defender >= challenger:
+            defender += 1
+        return members[challenger], members[defender]
+
+    # breed two of the best retain_best members with at least minimum_matches played, culling proven members to make
+    # room within target_size. returns False if there weren't two such members, or no room could be made.
+    def breed_steady_state(self, target_size, minimum_matches):
+        members = self.member_genes.members
+        table = self.member_genes.active()
+        proven = np.nonzero(table['match_wins'] + table['match_losses'] >= minimum_matches)[0]
+        if len(proven) < 2:
+            return False
+
+        scores = self.ranking_scores(table)
+        ranked = proven[np.argsort(-scores[proven], kind='mergesort')]
+
+        # make room by culling the worst proven members. the top retain_best are spared, and unproven members are left
+        # to prove themselves, so if that leaves no room, nobody is born yet.
+        spared = set(self.get_top_members(self.retain_best))
+        culled = [members[index] for index in ranked[::-1] if members[index] not in spared]
+        culled = culled[:max(0, len(self.member_genes) - target_size + 1)]
+        if len(self.member_genes) - len(culled) >= target_size:
+            return False
+
+        # like cross_over(), any of the best retain_best may breed, so that births don't all come from one pair
+        breeder, mate = random.sample(list(ranked[:max(2, self.retain_best)]), 2)
+        newborn = members[breeder].cross(members[mate])
+        newborn.mutate(0.075)
+        for member in culled:
+            del self.member_genes[member]
+        self.forget_fallen_pairings()
+        self.add_member(newborn, self.current_generation)
+        return True
 
     # add a member with a given generation
     def add_member(self, geneset, generation):
@@ -134,15 +564,21 @@ class Population(object):
 
     # return the top N specimens of the population
     def get_top_members(self, count):
-
-        top_list = sorted(self.member_genes.items(), key=lambda (k, v): self.ranking_func(v), reverse=True)
-        top_list = top_list[:count]
-
-        # separate out our keys
-        top_keys = []
-        [top_keys.append(top_list[i][0]) for i in range(len(top_list))]
-
-        return top_keys
+        members = self.member_genes.members
+        scores = self.ranking_scores(self.member_genes.active())
+
+        # find the N-th best score without sorting the rest, take everyone above it and as many members on it as fit
+        # (in member order, as a stable sort would), then sort those
+        count = max(0, min(count, len(members)))
+        if count == 0:
+            return []
+        threshold = -np.partition(-scores, count - 1)[count - 1]
+        above = np.nonzero(scores > threshold)[0]
+        on = np.nonzero(scores == threshold)[0][:count - len(above)]
+        top = np.sort(np.concatenate([above, on]))
+        top = top[np.argsort(-scores[top], kind='mergesort')]
+
+        return [members[i] for i in top]
 
     def ranking_func(self, gene_item):
         game_wins           = gene_item['game_wins']
@@ -167,93 +603,222 @@ class Population(object):
         # over 100 games, vs an opponent who scores 25 points per game, how many points will we win (can be negative)
         return 100 * (winrate * points_per_win - (1 - winrate) * 25)
 
-    # engage each member in competition with each other member, recording the results
-    def fitness_test(self):
+    # ranking_func for every row of a MemberStats table at once
+    def ranking_scores(self, table):
+        real_wins = (table['game_wins'] - table['coinflip_game_wins']).astype(np.float64)
+        games = real_wins + table['game_losses']
+        winrate = np.where(games == 0, 0.0, real_wins / np.where(games == 0, 1, games))
 
-        # keep track of matches
-        matches = []
-        player_geneset_dict = {}
+        points_per_win = table['game_points'] / np.maximum(1, real_wins)
+        return 100 * (winrate * points_per_win - (1 - winrate) * 25)
 
-        already_tested = []
-        for challenger_geneset in self.member_genes:
-            for defender_geneset in self.member_genes:
-                if challenger_geneset is not defender_geneset:
-                    # do not test both A vs B AND B vs A. Just test them once.
-                    if (challenger_geneset, defender_geneset) in already_tested or (
-                        defender_geneset, challenger_geneset) in already_tested:
-                        continue
-                    already_tested.append((challenger_geneset, defender_geneset))
+    # (lower, upper) bounds on ranking_func that hold with the given confidence, from a Hoeffding bound on the win rate.
+    # points per win are taken as measured.
+    def ranking_bounds(self, gene_item, confidence=0.95):
+        real_wins = float(gene_item['game_wins'] - gene_item['coinflip_game_wins'])
+        games = real_wins + gene_item['game_losses']
+        if games == 0:
+            return float('-inf'), float('inf')
 
-                    # create physical representations for these gene_sets
-                    challenger_player = GinPlayer()
-                    defender_player = GinPlayer()
+        winrate = real_wins / games
+        margin = math.sqrt(math.log(2 / (1 - confidence)) / (2 * games))
+        points_per_win = gene_item['game_points'] / max(1, real_wins)
 
-                    # store these in a lookup table
-                    player_geneset_dict[str(challenger_player.id)] = challenger_geneset
-                    player_geneset_dict[str(defender_player.id)]   = defender_geneset
+        def ranking(winrate):
+            return 100 * (winrate * points_per_win - (1 - winrate) * 25)
+        return ranking(max(0.0, winrate - margin)), ranking(min(1.0, winrate + margin))
 
-                    log_debug("Testing: {0} vs {1}".format(challenger_geneset, defender_geneset))
+    # engage members in competition with each other, as the scheduler pairs them, recording the results
+    def fitness_test(self):
+        members = self.member_genes.keys()
 
-                    match = GinMatch(challenger_player, defender_player)
-                    num_inputs = 11 + 5 + 33
-                    num_outputs = 4
-                    num_hidden = int((num_inputs + num_outputs) * (2.0 / 3.0))
+        # with more than one worker, matches are played in a process pool. workers index members by their place in
+        # members, so the results don't depend on which worker plays what. every match is played from a seed of its
+        # own, drawn in pairing order wherever it's played, so the results don't depend on the worker count either.
+        in_pool = self.workers > 1 and len(members) > 1
+        pool = None
 
-                    challenger_weightset = WeightSet(challenger_geneset, num_inputs, num_hidden, num_outputs)
-                    defender_weightset = WeightSet(defender_geneset, num_inputs, num_hidden, num_outputs)
+        # play the scheduler's rounds one at a time, telling it how each went. games dealt are counted across rounds.
+        schedule = self.scheduler.rounds(self, members)
+        dealt_games = {}
+        try:
+            results = None
+            while True:
+                try:
+                    pairings = schedule.send(results)
+                except StopIteration:
+                    break
+
+                pairings = self.deal_pairings(pairings, dealt_games)
+                if in_pool:
+                    if pool is None:
+                        pool = multiprocessing.Pool(self.workers, initializer=_init_fitness_worker,
+                                                    initargs=([geneset.genes for geneset in members],))
+                    results = self.play_pairings_in_pool(pool, members, pairings)
+                else:
+                    results = self.play_pairings(pairings)
+        finally:
+            if pool is not None:
+                pool.terminate()
+                pool.join()
+
+    # give each (challenger, defender) pairing the deck order to play, as (challenger, defender, deck_order). with a
+    # deal bank, the n-th game of every pairing is dealt the same n-th deal (counting from the pairing's first game when
+    # testing incrementally, or from the start of this test otherwise). with swap_seats, each deal is played twice,
+    # from both seats: the pair takes its seats in a fixed order (see seated_pairing) for even games, and swapped for
+    # odd ones, whichever order the scheduler gave them in. games maps each pairing to the next game number it deals;
+    # pass the same dict to every call of one test, so that later rounds carry on from earlier ones.
+    def deal_pairings(self, pairings, games=None):
+        if self.deal_bank is None:
+            return [(challenger, defender, None) for challenger, defender in pairings]
+
+        dealt = []
+        if games is None:
+            games = {}
+        for challenger, defender in pairings:
+            key = pairing_key(challenger, defender)
+            if key not in games:
+                games[key] = self.pairing_games.get(key, 0) if self.incremental_fitness else 0
+            game = games[key]
+            games[key] += 1
+
+            if self.swap_seats:
+                challenger, defender = seated_pairing(challenger, defender)
+                if game % 2:
+                    challenger, defender = defender, challenger
+                game //= 2
+            dealt.append((challenger, defender, self.deal_bank.deal(game)))
+        return dealt
+
+    # play one match for each (challenger, defender, deck_order) pairing in this process. returns (winner, loser)
+    # pairs.
+    def play_pairings(self, pairings):
+        # keep track of matches
+        matches = []
+        player_geneset_dict = {}
 
-                    challenger_observers = [Observer(challenger_player), Observer(match.table), Observer(match)]
-                    defender_observers   = [Observer(defender_player), Observer(match.table), Observer(match)]
+        num_inputs = 11 + 5 + 33
+        num_outputs = 4
+        num_hidden = int((num_inputs + num_outputs) * (2.0 / 3.0))
+
+        # in batched mode, the weights of every member playing are stacked into one net. all games then advance in
+        # lockstep and each round of pending decisions costs a single forward pass.
+        members, seen = [], set()
+        for pairing in pairings:
+            for member in pairing[:2]:
+                if member not in seen:
+                    seen.add(member)
+                    members.append(member)
+        batched = self.batched_inference and len(members) > 1
+        if batched:
+            stack = GinStackedNeuralNet([WeightSet(geneset, num_inputs, num_hidden, num_outputs)
+                                         for geneset in members], [11, 33, 5])
+            member_index = dict((members[i], i) for i in range(len(members)))
+
+        for challenger_geneset, defender_geneset, deck_order in pairings:
+            # the match shuffles and flips coins from a seed of its own, as in play_pairings_in_pool
+            seed = random.getrandbits(32)
+
+            # create physical representations for these gene_sets
+            challenger_player = GinPlayer()
+            defender_player = GinPlayer()
+
+            # store these in a lookup table
+            player_geneset_dict[str(challenger_player.id)] = challenger_geneset
+            player_geneset_dict[str(defender_player.id)]   = defender_geneset
+
+            log_debug("Testing: {0} vs {1}".format(challenger_geneset, defender_geneset))
+
+            match = GinMatch(challenger_player, defender_player, deck_order, random.Random(seed))
+
+            # the nets read the game state when they pulse, so the game doesn't push every change to them
+            challenger_features = FeatureVector([challenger_player, match.table, match])
+            defender_features   = FeatureVector([defender_player, match.table, match])
+
+            if batched:
+                challenger_neuralnet = MemberNeuralNet(stack, member_index[challenger_geneset],
+                                                       challenger_features)
+                defender_neuralnet   = MemberNeuralNet(stack, member_index[defender_geneset],
+                                                       defender_features)
+            else:
+                challenger_weightset = WeightSet(challenger_geneset, num_inputs, num_hidden, num_outputs)
+                defender_weightset = WeightSet(defender_geneset, num_inputs, num_hidden, num_outputs)
 
-                    challenger_neuralnet = GinNeuralNet(challenger_observers, challenger_weightset)
-                    defender_neuralnet   = GinNeuralNet(defender_observers,   defender_weightset)
+                challenger_neuralnet = GinMatrixNeuralNet(challenger_features, challenger_weightset)
+                defender_neuralnet   = GinMatrixNeuralNet(defender_features,   defender_weightset)
 
-                    challenger_strategy = NeuralGinStrategy(challenger_player, defender_player, match,
-                                                            challenger_neuralnet)
-                    defender_strategy = NeuralGinStrategy(defender_player, challenger_player, match,
-                                                          defender_neuralnet)
+            challenger_strategy = NeuralGinStrategy(challenger_player, defender_player, match,
+                                                    challenger_neuralnet)
+            defender_strategy = NeuralGinStrategy(defender_player, challenger_player, match,
+                                                  defender_neuralnet)
 
-                    challenger_player.strategy = challenger_strategy
-                    defender_player.strategy = defender_strategy
+            challenger_player.strategy = challenger_strategy
+            defender_player.strategy = defender_strategy
 
-                    # send the match to a worker and store a handle for later use
-                    matches.append(match)
+            # send the match to a worker and store a handle for later use
+            matches.append(match)
 
         # run matches and record output
-        for match in matches:
-            # run the match
-            match_result = match.run()
-
-            # update our records
-            winner                      = match_result['winner']
-            loser                       = match_result['loser']
-            winner_wins                 = match_result['winner_games_won']
-            winner_wins_by_coinflip     = match_result['winner_games_won_by_coinflip']
-            winner_losses               = match_result['winner_games_lost']
-            loser_wins                  = match_result['loser_games_won']
-            loser_wins_by_coinflip      = match_result['loser_games_won_by_coinflip']
-            loser_losses                = match_result['loser_games_lost']
-            winner_point_delta          = match_result['winner_point_delta']
-
-            # track match wins
-            winner_geneset = player_geneset_dict[str(winner.id)]
-            loser_geneset  = player_geneset_dict[str(loser.id)]
-
-            self.member_genes[winner_geneset]['game_points']  += winner_point_delta
-            self.member_genes[winner_geneset]['match_wins']   += 1
-            self.member_genes[loser_geneset]['match_losses']  += 1
-
-            # track game wins
-            self.member_genes[winner_geneset]['game_wins']    += winner_wins
-            self.member_genes[loser_geneset]['game_wins']     += loser_wins
-
-            # track coinflip wins
-            self.member_genes[winner_geneset]['coinflip_game_wins'] += winner_wins_by_coinflip
-            self.member_genes[loser_geneset]['coinflip_game_wins']  += loser_wins_by_coinflip
-
-            # track game losses
-            self.member_genes[winner_geneset]['game_losses'] += winner_losses
-            self.member_genes[loser_geneset]['game_losses']  += loser_losses
+        if batched:
+            match_results = GinMatch.run_in_lockstep(matches, NeuralGinStrategy.decide_in_batch)
+        else:
+            match_results = [match.run() for match in matches]
+
+        results = []
+        for match_result in match_results:
+            winner = player_geneset_dict[str(match_result['winner'].id)]
+            loser = player_geneset_dict[str(match_result['loser'].id)]
+            self.record_match_result(winner, loser, match_result)
+            results.append((winner, loser))
+        return results
+
+    # play one match for each (challenger, defender, deck_order) pairing in a pool of worker processes, set up with
+    # every member's genome by _init_fitness_worker. workers build their own copy of every member's net from the raw
+    # genomes once, then receive only (challenger, defender, seed, deck_order) descriptors. each match is seeded on its
+    # own. returns (winner, loser) pairs.
+    def play_pairings_in_pool(self, pool, members, pairings):
+        member_index = dict((members[i], i) for i in range(len(members)))
+        pairings = [(member_index[challenger], member_index[defender], random.getrandbits(32), deck_order)
+                    for challenger, defender, deck_order in pairings]
+
+        # a plain map() can't be interrupted by Ctrl-C under python 2, but a get() with a timeout can
+        results = []
+        for match_result in pool.map_async(_play_pairing, pairings).get(timeout=365 * 24 * 60 * 60):
+            winner, loser = members[match_result['winner']], members[match_result['loser']]
+            self.record_match_result(winner, loser, match_result)
+            results.append((winner, loser))
+        return results
+
+    # update our records for one match
+    def record_match_result(self, winner_geneset, loser_geneset, match_result):
+        winner_wins                 = match_result['winner_games_won']
+        winner_wins_by_coinflip     = match_result['winner_games_won_by_coinflip']
+        winner_losses               = match_result['winner_games_lost']
+        loser_wins                  = match_result['loser_games_won']
+        loser_wins_by_coinflip      = match_result['loser_games_won_by_coinflip']
+        loser_losses                = match_result['loser_games_lost']
+        winner_point_delta          = match_result['winner_point_delta']
+
+        # track match wins
+        self.member_genes[winner_geneset]['game_points']  += winner_point_delta
+        self.member_genes[winner_geneset]['match_wins']   += 1
+        self.member_genes[loser_geneset]['match_losses']  += 1
+
+        # track game wins
+        self.member_genes[winner_geneset]['game_wins']    += winner_wins
+        self.member_genes[loser_geneset]['game_wins']     += loser_wins
+
+        # track coinflip wins
+        self.member_genes[winner_geneset]['coinflip_game_wins'] += winner_wins_by_coinflip
+        self.member_genes[loser_geneset]['coinflip_game_wins']  += loser_wins_by_coinflip
+
+        # track game losses
+        self.member_genes[winner_geneset]['game_losses'] += winner_losses
+        self.member_genes[loser_geneset]['game_losses']  += loser_losses
+
+        # track games per pairing
+        pairing = frozenset((winner_geneset, loser_geneset))
+        self.pairing_games[pairing] = self.pairing_games.get(pairing, 0) + 1
 
     # remove members from prior generations, sparing the top N specimens
     def cull(self):
@@ -265,6 +830,16 @@ class Population(object):
             if key not in survivor_list:
                 del self.member_genes[key]
 
+        self.forget_fallen_pairings()
+
+    # forget the pairings of the fallen, in pairing_games or another dict keyed by pairing
+    def forget_fallen_pairings(self, pairings=None):
+        if pairings is None:
+            pairings = self.pairing_games
+        for pairing in pairings.keys():
+            if not all(member in self.member_genes for member in pairing):
+                del pairings[pairing]
+
     # breed the top N individuals against each other, sexually (no asexual reproduction)
     def cross_over(self, breeder_count):
         breeders = self.get_top_members(breeder_count)
@@ -300,14 +875,15 @@ class Population(object):
         max_age = 0
         max_score = 0
         max_winrate = 0
-        for item in self.member_genes.items():
+        scores = self.ranking_scores(self.member_genes.active())
+        for item, score in zip(self.member_genes.items(), scores):
             value = item[1]
             # collect values
             match_wins, match_losses = value['match_wins'], value['match_losses']
             coinflip_game_wins = value['coinflip_game_wins']
 
             # track maximum score
-            score = self.ranking_func(value)
+            score = float(score)
             if score > max_score:
                 max_score = score
 
@@ -357,6 +933,12 @@ class Population(object):
 
         output_text += "\n" + input_table.draw()
 
+        # a racing scheduler says how its last race spent its budget (see RacingScheduler)
+        if isinstance(self.scheduler, RacingScheduler):
+            output_text += "\n" + ("racing: played {0} games, {1} of them taken from eliminated members by the "
+                                   "remaining contenders; {2} games of the full schedule left unplayed").format(
+                self.scheduler.games_played, self.scheduler.games_redirected, self.scheduler.games_saved)
+
         # log the best score to disk
         try:
             filename = self.local_storage + '.tally'
@@ -369,7 +951,10 @@ class Population(object):
 
         return output_text
 
-    def persist(self, action=None):
+    # store to or load from local_storage. we store binary checkpoints (see checkpoint.py), and load either those or
+    # populations pickled by earlier versions. stores are written on a background thread; without wait, we return
+    # as soon as the population is snapshotted.
+    def persist(self, action=None, wait=True):
         assert action is not None, "must specify an action when calling persist()"
         # by default, do not persist
         if not self.local_storage:
@@ -377,16 +962,75 @@ class Population(object):
 
         if action == 'store':
             try:
-                pickle.dump(self, open(self.local_storage, 'w'))
+                if self.checkpoint_writer is None or self.checkpoint_writer.path != self.local_storage:
+                    self.flush_checkpoints()
+                    self.checkpoint_writer = checkpoint.CheckpointWriter(self.local_storage)
+                self.checkpoint_writer.submit(*self.snapshot())
+                if wait:
+                    return self.checkpoint_writer.flush()
                 return True
             except:
                 return False
         elif action == 'load':
             try:
-                # we make a new copy of the object, then we copy its __dict__ into our own __dict__
-                restored = pickle.load(open(self.local_storage, 'r'))
-                for key in self.__dict__:
-                    self.__dict__[key] = restored.__dict__[key]
+                # don't read the file out from under a background store
+                self.flush_checkpoints()
+                if checkpoint.is_checkpoint(self.local_storage):
+                    self.load_checkpoint()
+                else:
+                    self.load_pickle()
                 return True
             except:
-                return False
\ No newline at end of file
+                return False
+
+    # copy the genomes, stats and settings, for checkpointing
+    def snapshot(self):
+        members = self.member_genes.members
+        genomes = np.array([np.asarray(geneset.genes, dtype=np.float64) for geneset in members])
+        if len(members) == 0:
+            genomes = np.zeros((0, 0))
+        table = self.member_genes.active()
+        stats = np.column_stack([table[column] for column in checkpoint.STATS_COLUMNS])
+        info = {'current_generation': self.current_generation, 'retain_best': self.retain_best}
+        return genomes, stats, info
+
+    # wait for background stores to land. returns False if the last one failed.
+    def flush_checkpoints(self):
+        if self.checkpoint_writer is None:
+            return True
+        result = self.checkpoint_writer.close()
+        self.checkpoint_writer = None
+        return result
+
+    def load_checkpoint(self):
+        info, columns, genomes, stats = checkpoint.read_checkpoint(self.local_storage)
+        self.current_generation = info['current_generation']
+        self.retain_best = info['retain_best']
+        self.pairing_games = {}
+
+        # make_geneset copies each genome out of the mapped file
+        self.member_genes = {}
+        for genes, row in zip(genomes, stats):
+            if self.gene_storage == 'list':
+                genes = genes.tolist()
+            self.member_genes[self.make_geneset(genes)] = dict(zip(columns, row.tolist()))
+
+    def load_pickle(self):
+        # we make a new copy of the object, then we copy its __dict__ into our own __dict__
+        restored = pickle.load(open(self.local_storage, 'r'))
+        gene_storage = self.gene_storage
+        local_storage = self.local_storage
+        for key in self.__dict__:
+            if key in restored.__dict__ and key != 'checkpoint_writer':
+                self.__dict__[key] = restored.__dict__[key]
+
+        # we keep our own storage mode and location, converting list genomes (as in populations stored before array
+        # genomes existed) as needed
+        self.gene_storage = gene_storage
+        self.local_storage = local_storage
+        self.pairing_games = {}
+        self.member_genes = self.__dict__['member_genes']
+        if self.gene_storage == 'array':
+            for geneset in self.member_genes.keys():
+                if not isinstance(geneset, ArrayGeneSet):
+                    self.member_genes[ArrayGeneSet(geneset.genes)] = self.member_genes.pop(geneset)
\ No newline at end of file
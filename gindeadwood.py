@@ -0,0 +1,463 @@
+#!/usr/bin/python
+#
+# gindeadwood.py
+#
+# 2015/05/02
+# rg
+#
+# optimal deadwood evaluation for gin hands represented as 52-bit masks (see GinCardGroup.mask)
+#
+# Runs live entirely inside one suit, so with sets out of the picture the best arrangement for a suit depends only
+# on its 13-bit rank mask: every maximal block of 3+ consecutive ranks melds as a single run and everything else is
+# deadwood. We precompute that answer for all 8192 rank masks. Sets are where suits interact, and a 10 or 11 card
+# hand has at most three ranks held in 3+ suits. For each of those ranks we either skip the set, take the whole set,
+# or (for a 4-of-a-kind) take any 3 of the 4 cards and leave the fourth free for a run. We try every combination of
+# those choices and score the leftovers of each suit with a table lookup.
+
+from deck import SUIT_OFFSETS, RANK_MASK, popcount
+from utility import log_warn
+from collections import OrderedDict
+import itertools
+import numpy as np
+import os
+
+SUITS = ('c', 'd', 'h', 's')
+SUIT_SHIFTS = tuple(SUIT_OFFSETS[suit] for suit in SUITS)
+
+# point value of each rank (index 0 unused)
+POINT_VALUES = [0] + [min(rank, 10) for rank in range(1, 14)]
+
+
+# return the 13-bit mask of ranks covered by a run (3+ consecutive ranks) in a suit's rank mask
+def run_cover(suit_mask):
+    run_starts = suit_mask & (suit_mask >> 1) & (suit_mask >> 2)
+    return (run_starts | (run_starts << 1) | (run_starts << 2)) & RANK_MASK
+
+
+# sum the point values of the ranks in a 13-bit mask
+def rank_points(suit_mask):
+    total = 0
+    rank = 1
+    while suit_mask:
+        if suit_mask & 1:
+            total += POINT_VALUES[rank]
+        suit_mask >>= 1
+        rank += 1
+    return total
+
+
+# build the per-suit table, indexed by rank mask: row 0 holds the runs-only deadwood and row 1 the mask of ranks
+# melded into runs
+def build_suit_table():
+    table = np.zeros((2, RANK_MASK + 1), dtype=np.int64)
+    for suit_mask in range(RANK_MASK + 1):
+        covered = run_cover(suit_mask)
+        table[0, suit_mask] = rank_points(suit_mask & ~covered)
+        table[1, suit_mask] = covered
+    return table
+
+
+# write the suit table to disk as a .npy file. we write to a temporary file and rename it into place, so a reader
+# never maps a half-written table.
+def save_suit_table(path, table=None):
+    if table is None:
+        table = build_suit_table()
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as the_file:
+        np.save(the_file, table)
+    os.rename(temp_path, path)
+    return table
+
+
+# memory-map a suit table written by save_suit_table(). raises ValueError if the file isn't a suit table.
+def load_suit_table(path):
+    table = np.load(path, mmap_mode='r')
+    if table.shape != (2, RANK_MASK + 1) or table.dtype != np.int64:
+        raise ValueError("%s is not a suit table: shape %s, dtype %s" % (path, table.shape, table.dtype))
+    # spot check: an empty suit, a lone ace, a lone king and a full suit
+    if (table[0, 0], table[0, 1], table[0, 1 << 12], table[0, RANK_MASK], table[1, RANK_MASK]) != \
+            (0, 1, 10, 0, RANK_MASK):
+        raise ValueError("%s does not hold the expected suit table values" % path)
+    return table
+
+
+# return True if a suit table matches a freshly built one
+def verify_suit_table(table):
+    return np.array_equal(np.asarray(table), build_suit_table())
+
+
+# use the table on disk when we have one, otherwise build it
+def initial_suit_table(path):
+    if os.path.exists(path):
+        try:
+            return load_suit_table(path)
+        except (IOError, ValueError) as e:
+            log_warn("ignoring suit table at {0}: {1}".format(path, e))
+    return build_suit_table()
+
+
+# build the per-rank table: given a 4-bit pattern of which suits hold a rank (bit i = SUITS[i]), list the 4-bit
+# suit subsets that can be melded as a set
+def build_set_options():
+    options = []
+    for pattern in range(16):
+        count = popcount(pattern)
+        if count == 3:
+            options.append((pattern,))
+        elif count == 4:
+            # the full 4-set first, then each 3-set that frees one card for a run
+            options.append((pattern,) + tuple(pattern & ~(1 << i) for i in range(4)))
+        else:
+            options.append(())
+    return options
+
+
+# where the precomputed suit table lives. build it with `python gindeadwood.py build`, or point GIN_DEADWOOD_TABLE
+# somewhere else.
+DEFAULT_TABLE_PATH = os.environ.get('GIN_DEADWOOD_TABLE',
+                                    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'gindeadwood_table.npy'))
+
+SUIT_TABLE = initial_suit_table(DEFAULT_TABLE_PATH)
+
+# views onto the (possibly memory-mapped) table rows. the scalar search looks single entries up with item(), which
+# reads just that entry and gives a plain int; the batched search gathers whole arrays from the rows.
+SUIT_DEADWOOD = SUIT_TABLE[0]
+SUIT_MELDS = SUIT_TABLE[1]
+_suit_deadwood = SUIT_DEADWOOD.item
+_suit_melds = SUIT_MELDS.item
+
+SET_OPTIONS = build_set_options()
+
+
+# expand a 4-bit suit pattern at a given rank into a 52-bit mask
+def set_mask(rank, pattern):
+    mask = 0
+    for i in range(4):
+        if pattern & (1 << i):
+            mask |= 1 << (SUIT_SHIFTS[i] + rank - 1)
+    return mask
+
+
+# split a 52-bit hand mask into its four 13-bit suit masks
+def suit_masks(mask):
+    return [(mask >> shift) & RANK_MASK for shift in SUIT_SHIFTS]
+
+
+# return (deadwood, run_mask) for a hand with no sets melded: each suit is a single table lookup
+def _runs_only(masks):
+    deadwood = 0
+    run_mask = 0
+    for i in range(4):
+        deadwood += _suit_deadwood(masks[i])
+        run_mask |= _suit_melds(masks[i]) << SUIT_SHIFTS[i]
+    return deadwood, run_mask
+
+
+# return a list of (rank, options) for every rank held in 3 or more suits
+def set_candidates(masks):
+    c, d, h, s = masks
+    ranks = (c & d & h) | (c & d & s) | (c & h & s) | (d & h & s)
+    candidates = []
+    rank = 1
+    while ranks:
+        if ranks & 1:
+            bit = 1 << (rank - 1)
+            pattern = 0
+            for i in range(4):
+                if masks[i] & bit:
+                    pattern |= 1 << i
+            candidates.append((rank, [set_mask(rank, p) for p in SET_OPTIONS[pattern]]))
+        ranks >>= 1
+        rank += 1
+    return candidates
+
+
+# return (deadwood, run_mask, set_masks) for the best arrangement of a 52-bit hand mask
+def _search(mask):
+    masks = suit_masks(mask)
+    candidates = set_candidates(masks)
+
+    best_deadwood, best_runs = _runs_only(masks)
+    best_sets = ()
+    if not candidates or best_deadwood == 0:
+        return best_deadwood, best_runs, best_sets
+
+    # walk every combination of set choices. a choice of 0 skips the set for that rank.
+    choices = [[0] + options for _, options in candidates]
+    stack = [(0, 0, ())]
+    while stack:
+        depth, removed, chosen = stack.pop()
+        if depth == len(choices):
+            if not removed:
+                continue
+            deadwood, runs = _runs_only(suit_masks(mask & ~removed))
+            if deadwood < best_deadwood:
+                best_deadwood, best_runs, best_sets = deadwood, runs, chosen
+            continue
+        for option in choices[depth]:
+            if option:
+                stack.append((depth + 1, removed | option, chosen + (option,)))
+            else:
+                stack.append((depth + 1, removed, chosen))
+
+    return best_deadwood, best_runs, best_sets
+
+
+# split a 52-bit run mask into one 52-bit mask per run (each maximal block of consecutive ranks in a suit)
+def split_runs(run_mask):
+    runs = []
+    for shift in SUIT_SHIFTS:
+        suit_runs = (run_mask >> shift) & RANK_MASK
+        while suit_runs:
+            low_bit = suit_runs & -suit_runs
+            # adding the low bit carries through the block, leaving the bit just above it
+            block = suit_runs & ~(suit_runs + low_bit)
+            runs.append(block << shift)
+            suit_runs &= ~block
+    return runs
+
+
+# return (deadwood, meld_mask) for a 52-bit hand mask, where meld_mask holds every card melded in the best arrangement
+def evaluate(mask):
+    deadwood, runs, sets = _search(mask)
+    meld_mask = runs
+    for s in sets:
+        meld_mask |= s
+    return deadwood, meld_mask
+
+
+# return (deadwood, melds) for a 52-bit hand mask, where melds is a list of 52-bit masks, one per meld
+def arrange(mask):
+    deadwood, runs, sets = _search(mask)
+    return deadwood, list(sets) + split_runs(runs)
+
+
+# return the minimal deadwood for a 52-bit hand mask
+def deadwood_count(mask):
+    return _search(mask)[0]
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# hand-evaluation cache. everything the game asks about a hand, keyed by the hand's 52-bit mask.
+
+
+# return (deadwood, meld_mask, run_mask, set_mask) for a 52-bit hand mask:
+#   deadwood    minimal deadwood
+#   meld_mask   cards melded in the best arrangement
+#   run_mask    cards that belong to some run (3+ consecutive ranks in a suit)
+#   set_mask    cards that belong to some set (a rank held in 3+ suits)
+def analyze(mask):
+    deadwood, meld_mask = evaluate(mask)
+    masks = suit_masks(mask)
+
+    run_mask = 0
+    for i in range(4):
+        run_mask |= run_cover(masks[i]) << SUIT_SHIFTS[i]
+
+    c, d, h, s = masks
+    set_ranks = (c & d & h) | (c & d & s) | (c & h & s) | (d & h & s)
+    set_mask = 0
+    for shift in SUIT_SHIFTS:
+        set_mask |= set_ranks << shift
+
+    return deadwood, meld_mask, run_mask, set_mask & mask
+
+
+# return (canonical_mask, order) for a hand. suits are sorted by rank mask, largest first, so hands that only differ
+# by a permutation of suits share a canonical mask. order[i] is the suit index that landed in canonical position i.
+def canonical_form(mask):
+    masks = suit_masks(mask)
+    order = sorted(range(4), key=masks.__getitem__, reverse=True)
+    canonical = 0
+    for position in range(4):
+        canonical |= masks[order[position]] << SUIT_SHIFTS[position]
+    return canonical, order
+
+
+# move each suit of a canonical-form mask back to where canonical_form() found it
+def restore_suits(mask, order):
+    restored = 0
+    for position in range(4):
+        restored |= ((mask >> SUIT_SHIFTS[position]) & RANK_MASK) << SUIT_SHIFTS[order[position]]
+    return restored
+
+
+# bounded cache of analyze() results, keyed by hand mask. policy is 'lru' (evict the least recently used entry) or
+# 'fifo' (evict the oldest entry). with canonicalize on, hands are stored in canonical_form() so suit permutations of
+# the same hand share an entry; deadwood is suit-symmetric, and the masks are mapped back on the way out.
+class HandCache(object):
+    def __init__(self, maxsize=65536, policy='lru', canonicalize=False):
+        assert maxsize > 0, "cache must hold at least one entry"
+        assert policy in ('lru', 'fifo'), "unknown eviction policy: %s" % policy
+        self.maxsize = maxsize
+        self.policy = policy
+        self.canonicalize = canonicalize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    # return analyze(mask), from the cache when we can
+    def lookup(self, mask):
+        if self.canonicalize:
+            key, order = canonical_form(mask)
+        else:
+            key, order = mask, None
+
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.hits += 1
+            if self.policy == 'lru':
+                # move to the back of the eviction queue
+                del self.entries[key]
+                self.entries[key] = entry
+        else:
+            self.misses += 1
+            entry = analyze(key)
+            if len(self.entries) >= self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+            self.entries[key] = entry
+
+        if order is None:
+            return entry
+        deadwood, meld_mask, run_mask, set_mask = entry
+        return deadwood, restore_suits(meld_mask, order), restore_suits(run_mask, order), restore_suits(set_mask, order)
+
+    def stats(self):
+        return {'hits': self.hits, 'misses': self.misses, 'evictions': self.evictions,
+                'size': len(self.entries), 'maxsize': self.maxsize}
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+
+# the process-wide cache shared by GinCardGroup. replace it with configure_hand_cache().
+hand_cache = HandCache()
+
+
+def configure_hand_cache(maxsize=65536, policy='lru', canonicalize=False):
+    global hand_cache
+    hand_cache = HandCache(maxsize, policy, canonicalize)
+    return hand_cache
+
+
+# ---------------------------------------------------------------------------------------------------------------------
+# batched evaluation. the same search as above, run over a whole array of hand masks at once with NumPy.
+
+# set options per candidate rank: 0 skips the set, 1 takes every held card of the rank, 2-5 take all four but the
+# card in SUITS[option - 2] (only valid for a 4-of-a-kind)
+SET_CHOICE_COUNT = 6
+
+# cost given to combinations that ask for a 3-of-4 set on a rank we don't hold four of
+INVALID_DEADWOOD = 1 << 16
+
+
+# search one group of hands whose candidate set ranks are given by slots, a list of per-hand rank bits (one list
+# entry per candidate; 0 where a hand has fewer candidates)
+def _search_many(suits, slots):
+    # for each slot, which suits hold the rank and whether all four do
+    held = [[(suits[i] & bit) != 0 for i in range(4)] for bit in slots]
+    quads = [held_suits[0] & held_suits[1] & held_suits[2] & held_suits[3] for held_suits in held]
+
+    # only try the 3-of-4 choices for slots where some hand actually holds a 4-of-a-kind
+    choices = [range(SET_CHOICE_COUNT) if quads[slot].any() else range(2) for slot in range(len(slots))]
+
+    best_deadwood = None
+    best_melds = None
+    for combination in itertools.product(*choices):
+        removed = [0, 0, 0, 0]
+        invalid = None
+        for slot, choice in enumerate(combination):
+            if choice == 0:
+                continue
+            bit = slots[slot]
+            for i in range(4):
+                if choice == 1 or choice - 2 != i:
+                    removed[i] = removed[i] | np.where(held[slot][i], bit, 0)
+            if choice > 1:
+                invalid = ~quads[slot] if invalid is None else invalid | ~quads[slot]
+
+        deadwood = 0
+        melds = 0
+        for i in range(4):
+            remaining = suits[i] & ~removed[i]
+            deadwood = deadwood + SUIT_DEADWOOD[remaining]
+            melds = melds | ((SUIT_MELDS[remaining] | removed[i]) << SUIT_SHIFTS[i])
+        if invalid is not None:
+            deadwood = np.where(invalid, INVALID_DEADWOOD, deadwood)
+
+        if best_deadwood is None:
+            best_deadwood, best_melds = deadwood, melds
+        else:
+            better = deadwood < best_deadwood
+            best_deadwood = np.where(better, deadwood, best_deadwood)
+            best_melds = np.where(better, melds, best_melds)
+
+    return best_deadwood, best_melds
+
+
+# return (deadwood, meld_mask) arrays for an array of 52-bit hand masks. intended for 10 and 11 card hands, which
+# hold at most three ranks in 3+ suits. hands are grouped by how many such ranks they hold, so a group of k-candidate
+# hands tries at most 6^k combinations of set choices.
+def evaluate_many(hands):
+    masks = np.asarray(hands, dtype=np.uint64).astype(np.int64)
+    suits = [(masks >> shift) & RANK_MASK for shift in SUIT_SHIFTS]
+
+    # peel candidate set ranks off one at a time, lowest first
+    c, d, h, s = suits
+    ranks = (c & d & h) | (c & d & s) | (c & h & s) | (d & h & s)
+    slots = []
+    slot_counts = np.zeros(masks.shape, dtype=np.int64)
+    while ranks.any():
+        low_bit = ranks & -ranks
+        slots.append(low_bit)
+        slot_counts += low_bit != 0
+        ranks &= ~low_bit
+
+    deadwood = np.zeros(masks.shape, dtype=np.int64)
+    melds = np.zeros(masks.shape, dtype=np.int64)
+    for count in np.unique(slot_counts):
+        group = np.nonzero(slot_counts == count)[0]
+        group_deadwood, group_melds = _search_many([suit[group] for suit in suits],
+                                                   [slot[group] for slot in slots[:count]])
+        deadwood[group] = group_deadwood
+        melds[group] = group_melds
+
+    return deadwood, melds.astype(np.uint64)
+
+
+# return an array of minimal deadwood counts for an array of 52-bit hand masks
+def deadwood_count_many(hands):
+    return evaluate_many(hands)[0]
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="build or verify the precomputed gin deadwood suit table")
+    parser.add_argument('command', choices=['build', 'verify'])
+    parser.add_argument('path', nargs='?', default=DEFAULT_TABLE_PATH)
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        save_suit_table(args.path)
+        print "wrote suit table to " + args.path
+
+    try:
+        valid = verify_suit_table(load_suit_table(args.path))
+    except (IOError, ValueError) as e:
+        print "could not load suit table: " + str(e)
+        valid = False
+
+    if valid:
+        print "suit table at " + args.path + " verified"
+    else:
+        print "suit table at " + args.path + " does NOT match the rules"
+        raise SystemExit(1)
@@ -11,6 +11,7 @@ from deck import *
 from operator import attrgetter, itemgetter
 from gindeck import *
 from utility import *
+import gindeadwood
 import bisect
 
 
@@ -19,6 +20,8 @@ import bisect
 class GinCardGroup:
     def __init__(self, card_list=None):
         self.cards = []
+        # 52-bit membership mask, kept in step with self.cards by add_card() and discard()
+        self.mask = 0
         if card_list is not None:
             for card in card_list:
                 self.add_card(card)
@@ -44,23 +47,36 @@ class GinCardGroup:
         return len(self.cards)
 
     def __hash__(self):
-        return hash(self.cards.__repr__())
+        return hash(self.mask)
+
+    # structural key for utility.memoized: the mask identifies our cards without building a string
+    def __memo_key__(self):
+        return self.mask
 
     # add a card
     def add_card(self, card):
         assert isinstance(card, Card), "trying to add something that isn't a card"
+        bit = card_bit(card.rank, card.suit)
+        # the list and the mask must hold the same cards
+        assert not self.mask & bit, "trying to add a card we already hold"
         # first card goes in by itself
         if len(self.cards) == 0:
             self.cards.append(card)
         # we retain the order of the list
         else:
             bisect.insort_left(self.cards, card)
+        self.mask |= bit
 
     # discard a Card
     def discard(self, requested):
+        bit = card_bit(requested.rank, requested.suit)
+        if not self.mask & bit:
+            return
+
         for c in self.cards:
             if c.rank == requested.rank and c.suit == requested.suit:
                 self.cards.remove(c)
+        self.mask &= ~bit
 
     # sort by rank, suit.  option to reverse sort order.
     def sort(self, by_suit=False):
@@ -71,10 +87,13 @@ class GinCardGroup:
 
     # test presence of a card tuple
     def contains(self, rank, suit):
-        if any(c.rank == rank and c.suit == suit for c in self.cards):
-            return True
-        else:
+        if rank < 1 or rank > 13:
             return False
+        return self.mask & card_bit(rank, suit) != 0
+
+    # return the 13-bit rank mask for a single suit. bit (rank - 1) is set for each rank we hold in that suit.
+    def suit_mask(self, suit):
+        return (self.mask >> SUIT_OFFSETS[suit]) & RANK_MASK
 
     # return card at specific index (0-10)
     def get_card_at_index(self, index):
@@ -88,10 +107,7 @@ class GinCardGroup:
         return self.contains(card.rank, card.suit)
 
     def size(self):
-        count = 0
-        for _ in self.cards:
-            count += 1
-        return count
+        return len(self.cards)
 
     def points(self):
         total = 0
@@ -107,70 +123,29 @@ class GinCardGroup:
         if len(self.cards) < 3:
             return False
 
-        answer = False
-
-        # for aces we must have A23
-        if card.rank == 1:    # Ace
-            if self.contains(2, card.suit) and self.contains(3, card.suit):
-                answer = True
-            else:
-                answer = False
-
-        # for deuces we can have A23 or 234
-        elif card.rank == 2:  # 2
-            if self.contains(1, card.suit) and self.contains(3, card.suit):
-                answer = True
-            elif self.contains(3, card.suit) and self.contains(4, card.suit):
-                answer = True
-            else:
-                answer = False
-
-        # for kings we must have exactly JQK
-        elif card.rank == 13:  # King
-            if self.contains(11, card.suit) and self.contains(12, card.suit):
-                answer = True
-            else:
-                answer = False
-
-        # for queens we can have JQK or TJQ
-        elif card.rank == 12:  # Queen
-            if self.contains(11, card.suit) and self.contains(13, card.suit):
-                answer = True
-            elif self.contains(10, card.suit) and self.contains(11, card.suit):
-                answer = True
-            else:
-                answer = False
-
-        # for all other cards, we can have [card-2,card-1,card], [card-1,card,card+1] or [card,card+1,card+2]
-        else:
-            if self.contains(card.rank - 2, card.suit) and self.contains(card.rank - 1, card.suit):
-                answer = True
-            elif self.contains(card.rank - 1, card.suit) and self.contains(card.rank + 1, card.suit):
-                answer = True
-            elif self.contains(card.rank + 1, card.suit) and self.contains(card.rank + 2, card.suit):
-                answer = True
-            else:
-                answer = False
+        # treat the card as held, then look for a 3-run starting at rank-2, rank-1 or rank. bit i of run_starts is set
+        # when ranks i+1, i+2 and i+3 are all present; shifting it up twice more marks every card covered by a 3-run.
+        bit = 1 << (card.rank - 1)
+        m = self.suit_mask(card.suit) | bit
+        run_starts = m & (m >> 1) & (m >> 2)
+        covered = run_starts | (run_starts << 1) | (run_starts << 2)
 
-        return answer
+        return covered & bit != 0
+
+    # count the cards of a given rank held in suits other than the given one
+    def _count_rank_in_other_suits(self, gincard):
+        column = RANK_COLUMNS[gincard.rank] & ~card_bit(gincard.rank, gincard.suit)
+        return popcount(self.mask & column)
 
     # determine if a card is part of a three-of-a-kind (but not a 4-set)
     def _is_in_a_3set(self, gincard):
         # we need to find exactly two other cards of the same rank
-        matches = [x for x in self.cards if x.rank == gincard.rank and x.suit != gincard.suit]
-        if len(matches) == 2:
-            return True
-        else:
-            return False
+        return self._count_rank_in_other_suits(gincard) == 2
 
     # determine if a card is part of a four-of-a-kind
     def _is_in_a_4set(self, gincard):
         # we need to find exactly three other cards of the same rank
-        matches = [x for x in self.cards if x.rank == gincard.rank and x.suit != gincard.suit]
-        if len(matches) == 3:
-            return True
-        else:
-            return False
+        return self._count_rank_in_other_suits(gincard) == 3
 
     # return an array of GinCardGroups of all melds and sets that can be built with the cards in this hand
     @memoized(500)
@@ -269,50 +244,37 @@ class GinCardGroup:
 
         return agcg_all_sets_deduped
 
-    # return a GCG containing our deadwood cards
+    # return a GCG containing our deadwood cards: every card that is not part of any set or run we could form
     def deadwood_cards(self):
+        deadwood, meld_mask, run_mask, set_mask = gindeadwood.hand_cache.lookup(self.mask)
+        meldable = run_mask | set_mask
 
-        deadwood = GinCardGroup()
-        for c in self.cards:
-            if not self._is_in_a_3set(c) and not self._is_in_a_4set(c) and not self._is_in_a_meld(c):
-                deadwood.add_card(c)
+        return GinCardGroup([c for c in self.cards if not meldable & card_bit(c.rank, c.suit)])
 
-        return deadwood
-
-    @memoized(500)
+    # return our minimal deadwood, as found by the table-driven search in gindeadwood
     def deadwood_count(self):
-        debug_func = False
-        # begin with worst case: entire hand is deadwood.
-        worst_case = self.points()
+        return gindeadwood.hand_cache.lookup(self.mask)[0]
 
-        # optimization step: we remove all cards not part of a set or a meld
-        specimen = GinCardGroup()
-        early_deadwood = GinCardGroup()
-        for card in self.cards:
-            if self._is_in_a_meld(card) or self._is_in_a_3set(card) or self._is_in_a_4set(card):
-                specimen.add_card(card)
-            else:
-                early_deadwood.add_card(card)
-
-        if debug_func:
-            print "early_deadwood: " + str(early_deadwood.points())
-            all_melds = specimen.enumerate_all_melds_and_sets()
-            print "all_melds:"
-            for meld in all_melds:
-                print '\t' + ''.join((x.to_s() + '\t') for x in meld.cards)
-
-        # recursion. add smallest discovered deadwood count to early_deadwood count
-        explored_case = self._examine_melds(specimen) + early_deadwood.points()
-
-        lowest_deadwood = min(worst_case, explored_case)
-
-        if debug_func:
-            print "lowest_deadwood: " + str(lowest_deadwood)
-
-        return lowest_deadwood
-
-
-    # our recursive call for deadwood_count
+    # return (deadwood, meld_mask) arrays for many hands in one vectorized pass. hands may be an array of 52-bit masks
+    # (such as a NumPy uint64 array) or a list of GinCardGroups.
+    @staticmethod
+    def deadwood_count_many(hands):
+        if len(hands) and isinstance(hands[0], GinCardGroup):
+            hands = [hand.mask for hand in hands]
+        return gindeadwood.evaluate_many(hands)
+
+    # return the deadwood left after discarding each of our cards, in the same order as self.cards
+    def deadwood_after_each_discard(self):
+        candidates = [self.mask & ~card_bit(c.rank, c.suit) for c in self.cards]
+        deadwood, meld_masks = GinCardGroup.deadwood_count_many(candidates)
+        return list(deadwood)
+
+    # return the best meld arrangement for this hand as an array of GinCardGroups, one per meld
+    def arrange_melds(self):
+        deadwood, meld_masks = gindeadwood.arrange(self.mask)
+        return [GinCardGroup([c for c in self.cards if meld & card_bit(c.rank, c.suit)]) for meld in meld_masks]
+
+    # the original recursive search. deadwood_count() no longer uses it, but we keep it around as a reference.
     # parameters:
     #   cg          a GinCardGroup, representing cards to examine
     @staticmethod
@@ -420,35 +382,37 @@ class GinHand(GinCardGroup):
         # get a list of our deadwood cards
         gcg_deadwood = self.deadwood_cards()
 
-        agcg_knocker_sets = knocking_hand.enumerate_all_sets()
-        agcg_knocker_melds = knocking_hand.enumerate_all_melds()
+        # the knocker's sets and runs, as masks: every card of a set rank, and every card covered by a run
+        deadwood, meld_mask, knocker_runs, knocker_sets = gindeadwood.hand_cache.lookup(knocking_hand.mask)
 
         # We will lay off against our opponent's sets.
+        set_ranks = 0
+        for rank in range(1, 14):
+            if knocker_sets & RANK_COLUMNS[rank]:
+                set_ranks |= RANK_COLUMNS[rank]
 
-        # for each deadwood card we hold:
+        # for each deadwood card we hold, if our rank matches one of the knocker's sets, we lay it off
         for c in gcg_deadwood:
-            # for each set held by knocker:
-            for gcg in agcg_knocker_sets:
-                # if our rank matches knocker's rank, we lay it off
-                if gcg.cards[0].rank == c.rank:
-                    self.discard(c)
+            if set_ranks & card_bit(c.rank, c.suit):
+                self.discard(c)
 
         # We will attempt to lay off each card twice. In the case that we have two connected cards that will layoff on
         # the same meld (for instance: we hold 4c5c, knocker holds Ac2c3c) we cannot lay off the 5c until we first lay
         # off the 4c. Sorting does not necessarily fix this, as we may lay off low first or high first. Therefore,
-        # we run the process twice. We do not run the process a third time, as that would imply we held a 3-card meld
-        # of our own (which would not count as deadwood).
+        # we run the process twice, extending the knocker's runs by whatever we laid off in the first pass. We do not
+        # run the process a third time, as that would imply we held a 3-card meld of our own (which would not count
+        # as deadwood).
 
         for i in range(2):
-            # for each deadwood card we hold:
+            # a card can lay off if it sits one rank below or above a run in the same suit
+            ends = 0
+            for suit in SUIT_OFFSETS:
+                offset = SUIT_OFFSETS[suit]
+                runs = (knocker_runs >> offset) & RANK_MASK
+                ends |= (((runs << 1) | (runs >> 1)) & ~runs & RANK_MASK) << offset
+
             for c in gcg_deadwood:
-                # for each meld held by knocker:
-                for gcg in agcg_knocker_melds:
-                    # if our suit matches the meld's suit:
-                    if c.suit == gcg.cards[0].suit:
-                        # if our rank is one less than the lowest rank of the meld, we lay it off
-                        if c.rank == gcg.cards[0].rank - 1:
-                            self.discard(c)
-                        # if our rank is one more than the highest of the meld, we lay it off
-                        elif c.rank == gcg.cards[-1].rank + 1:
-                            self.discard(c)
+                bit = card_bit(c.rank, c.suit)
+                if ends & bit and self.mask & bit:
+                    self.discard(c)
+                    knocker_runs |= bit
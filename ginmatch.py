@@ -32,7 +32,7 @@ import random
 
 
 class GinMatch(Observable):
-    def __init__(self, player1, player2):
+    def __init__(self, player1, player2, deck_order=None, rng=random):
         """ @type p1: GinPlayer
             @type p2: GinPlayer
         """
@@ -49,8 +49,10 @@ class GinMatch(Observable):
         self.p1_games_won = 0
         self.p2_games_won = 0
 
-        # seat players (not randomly)
-        self.table = GinTable()
+        # seat players (not randomly). the first game is dealt from deck_order if given (see Deck), else shuffled.
+        # shuffles and coin flips use rng: a random.Random of the match's own, or the random module itself.
+        self.rng = rng
+        self.table = GinTable(deck_order, rng)
         self.p1 = player1
         self.p2 = player2
         self.table.seat_player(self.p1)
@@ -80,11 +82,46 @@ class GinMatch(Observable):
 
     # run the match until a winner is declared
     def run(self):
+        for player, phase in self.run_steps():
+            player.consult_strategy(phase)
+
+        return self.match_result()
+
+    # run the match one decision at a time. whenever a player must choose an action we yield (player, phase) and
+    # expect player.action to be set before we are resumed. this lets a caller advance many matches in lockstep.
+    def run_steps(self):
         # continue playing games until one player reaches 1  (normally 100)
         while self.p1_games_won + self.p2_games_won < 1:
 #        while self.p1_score < 1 and self.p2_score < 1:
-            self.play_game()
-
+            for step in self.play_game_steps():
+                yield step
+
+    # run many matches side by side. each pass advances every unfinished match to its next decision, then makes all
+    # of the pending decisions with one call to decide(requests), which must set the action of each (player, phase)
+    # in requests. returns the match results in the order the matches were given.
+    @staticmethod
+    def run_in_lockstep(matches, decide):
+        results = [None] * len(matches)
+        in_flight = [(i, matches[i].run_steps()) for i in range(len(matches))]
+
+        while in_flight:
+            still_running = []
+            requests = []
+            for i, steps in in_flight:
+                try:
+                    requests.append(next(steps))
+                    still_running.append((i, steps))
+                except StopIteration:
+                    results[i] = matches[i].match_result()
+
+            if requests:
+                decide(requests)
+            in_flight = still_running
+
+        return results
+
+    # tally the final scores of a completed match
+    def match_result(self):
         # perform final scoring
         # - calculate game bonus
         #if self.p1_score >= 100:
@@ -112,7 +149,7 @@ class GinMatch(Observable):
         if self.p1_score == self.p2_score:
             log_debug("We have a tie!")
             # tie: flip a coin to determine winner
-            if random.random() < 0.5:
+            if self.rng.random() < 0.5:
                 log_debug("Player 1 wins the coin flip!")
                 winner = self.p1
             else:
@@ -184,9 +221,17 @@ class GinMatch(Observable):
                 3: self.p1_games_won,
                 4: self.p2_games_won}
 
+    # organize_data(), written straight into a FeatureVector slot
+    def write_features(self, out):
+        out[:] = (self.knocking_point, self.p1_score, self.p2_score, self.p1_games_won, self.p2_games_won)
+
     # play one game of gin
-    @notify_observers_after
     def play_game(self):
+        for player, phase in self.play_game_steps():
+            player.consult_strategy(phase)
+
+    # play one game of gin, yielding at each decision as in run_steps()
+    def play_game_steps(self):
 
         log_debug("")
         log_debug("========================================================================================")
@@ -207,7 +252,8 @@ class GinMatch(Observable):
 
         # play one game
         self.deal_cards()
-        self.take_turns()
+        for step in self.take_turns_steps():
+            yield step
         self.update_score()
 
         # post-game cleanup
@@ -218,6 +264,8 @@ class GinMatch(Observable):
         log_debug("")
         log_debug("\tGame over")
 
+        self.noop_notify()
+
     # deal out 11 cards to p1 and 10 cards to p2
     def deal_cards(self):
         # deal 10 cards to each player
@@ -235,6 +283,11 @@ class GinMatch(Observable):
 
     # alternate play between each player
     def take_turns(self):
+        for player, phase in self.take_turns_steps():
+            player.consult_strategy(phase)
+
+    # alternate play between each player, yielding at each decision as in run_steps()
+    def take_turns_steps(self):
         # beginning with p1, take turns until a valid knock/gin is called OR we have only two cards remaining
         #  OR we have taken too many turns
         while not self.gameover:
@@ -248,7 +301,9 @@ class GinMatch(Observable):
                     if not self.gameover:
                         log_debug(
                             "\tTurn {0}. It is {1}'s turn:".format(self.turns_taken + 1, self.get_player_string(p)))
-                        p.take_turn()
+                        for phase in p.turn_phases():
+                            yield p, phase
+                            p.execute_strategy()
 
                         # validate the knock or reset the knock state and penalize the knocker
                         if self.player_who_knocked:
@@ -265,7 +320,7 @@ class GinMatch(Observable):
     def end_game_with_coinflip(self):
         self.gameover = True
 
-        if random.random() < 0.5:
+        if self.rng.random() < 0.5:
             log_info("\t\tPlayer 1 wins the game by coin flip.")
             self.player_who_won_coinflip = self.p1
         else:
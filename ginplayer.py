@@ -96,6 +96,12 @@ class GinPlayer(Observable):
 
         return dict(zip(indexes, rankings))
 
+    # organize_data(), written straight into a FeatureVector slot
+    def write_features(self, out):
+        cards = self.hand.cards
+        out[:len(cards)] = [card.ranking() for card in cards]
+        out[len(cards):] = 0
+
     def draw(self):
         if self.hand.size() == 11:
             raise DrawException(self)
@@ -135,16 +141,20 @@ class GinPlayer(Observable):
 
     # consult the strategy and perform the action suggested
     def take_turn(self):
+        for phase in self.turn_phases():
+            self.consult_strategy(phase=phase)
+            self.execute_strategy()
+
+    # the decisions we face this turn
+    def turn_phases(self):
         # ensure we have enough cards to take a turn
         assert self.hand.size() >= 10, "Not enough cards in hand"
 
-        # if we have 10 cards, we do this twice. otherwise (we have 11 cards), we do it once.
+        # if we have 10 cards, we decide twice. otherwise (we have 11 cards), we decide once.
         if self.hand.size() == 10:
-            self.consult_strategy(phase='start')
-            self.execute_strategy()
-
-        self.consult_strategy(phase='end')
-        self.execute_strategy()
+            return ['start', 'end']
+        else:
+            return ['end']
 
     def pickup_discard(self):
         card = self.table.pickup_from_discard_pile()
@@ -152,6 +162,7 @@ class GinPlayer(Observable):
         return card
 
     # drop the given card into the discard pile
+    @bump_version
     def discard_card(self, card):
         try:
             self.hand.discard(card)
@@ -163,6 +174,7 @@ class GinPlayer(Observable):
         return card
 
     # empty the player's hand
+    @bump_version
     def empty_hand(self):
         self.hand = GinHand()
 
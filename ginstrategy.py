@@ -70,6 +70,26 @@ class NeuralGinStrategy(GinStrategy):
     def determine_best_action(self, phase=None):
         assert phase is not None, "a phase of 'start' or 'end' is required"
         self.nn.pulse()
+        return self.decide(phase)
+
+    # decode the current outputs of our neural net into an action, without pulsing it
+    def decide(self, phase=None):
         action = self.decode_action(phase)
         index  = self.decode_index()
-        return [action, index]
\ No newline at end of file
+        return [action, index]
+
+    # make the pending decisions of many players with a single forward pass. requests is a list of (player, phase)
+    # as yielded by GinMatch.run_steps(). every player must hold a NeuralGinStrategy whose net is a MemberNeuralNet
+    # of one shared StackedNeuralNet.
+    @staticmethod
+    def decide_in_batch(requests):
+        nets = [player.strategy.nn for player, phase in requests]
+        stack = nets[0].stack
+        assert all(nn.stack is stack for nn in nets), "all players must share one stacked neural net"
+
+        output_values = stack.forward([nn.member for nn in nets], [nn.sense().copy() for nn in nets])
+
+        for i in range(len(requests)):
+            player, phase = requests[i]
+            nets[i].set_outputs(output_values[i])
+            player.action = player.strategy.decide(phase)
\ No newline at end of file
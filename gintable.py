@@ -12,16 +12,19 @@ from gindeck import *
 from observer import *
 from utility import *
 from pylru import lrudecorator
+import random
 
 
 class GinTable(Observable):
-    def __init__(self):
+    def __init__(self, deck_order=None, rng=random):
         super(GinTable, self).__init__()
         self.player1 = False
         self.player2 = False
 
-        # on instantiation, create a new, shuffled deck
-        self.deck = GinDeck()
+        # on instantiation, create a new deck: shuffled, or stacked in the given order (see Deck). every deck we shuffle
+        # uses rng.
+        self.rng = rng
+        self.deck = GinDeck(deck_order, rng)
 
         # also create a discard pile
         self.discard_pile = []
@@ -29,6 +32,15 @@ class GinTable(Observable):
         # we have 33 interesting points to export: 32 discards + size of deck
         self.observable_width = 33
 
+        # the discard pile as we export it (see organize_data()), updated in place as cards come and go, and the pile
+        # height it was encoded for
+        self.discard_features = [0] * self.observable_width
+        self._encoded_height = 0
+
+        # organize_data() as of the version it was built at
+        self._organized_data = None
+        self._organized_version = None
+
     def __repr__(self):
         its_repr = "<gintable.GinTable object at " + hex(id(self)) + ">"
         its_repr += " height:" + str(len(self.deck.cards))
@@ -54,28 +66,72 @@ class GinTable(Observable):
         else:
             raise TableSeatingError("gintable is full")
 
-    @memoized(1)
+    # built once per version of the table. the dict is shared between calls, so it mustn't be changed.
     def organize_data(self):
-        # we start with the current height of the drawing deck
-        data = {0: len(self.deck.cards)}
-
-        # we now add on the discard pile
-        for i in range(len(self.discard_pile)):
-            data[i] = self.discard_pile[i].ranking()
-
-        # we then add 0's up to 32 possible discards -- 32 = 52 - 10(cards per hand) X 2(hands)
-        discard_size = len(self.discard_pile)
-        for i in range(1, discard_size):
-            data[i] = self.discard_pile[i-1].ranking()
-        for i in range(discard_size, 1+32):
-            data[i] = 0
-
-        return data
+        if self._organized_version != self.version:
+            self._organized_data = self.build_organized_data()
+            self._organized_version = self.version
+        return self._organized_data
+
+    def build_organized_data(self):
+        return dict(enumerate(self.current_discard_features()))
+
+    # organize_data(), written straight into a FeatureVector slot
+    def write_features(self, out):
+        out[:] = self.current_discard_features()
+
+    # discard_features, re-encoded from scratch if the discard pile was changed other than through our methods
+    def current_discard_features(self):
+        if self._encoded_height != len(self.discard_pile):
+            self.encode_discard_pile()
+        return self.discard_features
+
+    # encode the whole discard pile. the deck height we start with is always overwritten: slot 0 holds the first
+    # discard (or 0 before there is one), and slot i the i-th discard but the last, up to 32 possible discards -- 32 =
+    # 52 - 10(cards per hand) X 2(hands). the rest are 0.
+    def encode_discard_pile(self):
+        features = [0] * self.observable_width
+        pile = self.discard_pile[:self.observable_width]
+        if pile:
+            features[0] = pile[0].ranking()
+        for i in range(1, len(pile)):
+            features[i] = pile[i-1].ranking()
+
+        self.discard_features = features
+        self._encoded_height = len(self.discard_pile)
+
+    # a card was added to the discard pile: the one below it is now exported in the slot for its position
+    def encode_discard(self):
+        height = len(self.discard_pile)
+        if self._encoded_height != height - 1:
+            self.encode_discard_pile()
+            return
+
+        if height == 1:
+            self.discard_features[0] = self.discard_pile[0].ranking()
+        elif height <= self.observable_width:
+            self.discard_features[height - 1] = self.discard_pile[height - 2].ranking()
+        self._encoded_height = height
+
+    # a card was picked up from the discard pile: the new top card is no longer exported
+    def encode_pickup(self):
+        height = len(self.discard_pile)
+        if self._encoded_height != height + 1:
+            self.encode_discard_pile()
+            return
+
+        if height == 0:
+            self.discard_features[0] = 0
+        elif height < self.observable_width:
+            self.discard_features[height] = 0
+        self._encoded_height = height
 
     @notify_observers_after
     def refresh_deck(self):
-        self.deck = GinDeck()
+        self.deck = GinDeck(rng=self.rng)
         self.discard_pile = []
+        self.discard_features = [0] * self.observable_width
+        self._encoded_height = 0
 
     # pop a card from the deck and return it
     @notify_observers_after
@@ -87,6 +143,7 @@ class GinTable(Observable):
     def add_card_to_discard_pile(self, card):
         """ @type card: Card """
         self.discard_pile.append(card)
+        self.encode_discard()
 
     # pop a card from the discard pile and return it
     @notify_observers_after
@@ -95,6 +152,7 @@ class GinTable(Observable):
             card = self.discard_pile.pop()
         except IndexError:
             raise InvalidPlayError("tried to pickup on the first move (with 11 cards)")
+        self.encode_pickup()
         return card
 
 
@@ -0,0 +1,327 @@
+#!/usr/bin/python
+#
+# ginvector.py
+#
+# 2015/05/09
+# rg
+#
+# lockstep engine that plays many single-game matches of gin at once, holding every game in numpy arrays instead of
+# GinDeck/GinHand/GinTable objects. the rules are those of GinMatch, quirks included:
+#
+# - p1 is dealt 11 cards and p2 10, and both play in turn until a valid knock or gin
+# - before p1's turn, a game with 2 or fewer cards left in the stock or 60 turns taken ends in a coin flip
+# - knocks with more than 10 deadwood and gins with any deadwood are improper. the knocker's hand is exposed and the
+#   opponent may accept the knock if their own deadwood is 10 or less. otherwise the game goes on, and the knock
+#   state is left standing for the opponent's turn just as GinMatch leaves it.
+# - a knock with 0 deadwood is scored as a gin
+# - a knock that the defender matches or beats is an undercut, worth the deadwood difference plus 25
+#
+# cards are 0-51, the bit index used by GinCardGroup.mask. a hand is a 52-bit mask, so its cards in GinHand order
+# are simply its set bits from lowest to highest. seats are 0 (p1) and 1 (p2), and knock state is recorded as a
+# seat number plus one, with 0 meaning nobody.
+#
+# decisions come from a callback, decide(batch, games, seats, phase), covering every game in games that is waiting
+# on the player in the corresponding entry of seats:
+# - phase 'start': return (actions, indexes), actions indexing START_ACTIONS. indexes are ignored.
+# - phase 'end': return (actions, indexes), actions indexing END_ACTIONS and indexes picking the card (0-10) to
+#   discard, just like NeuralGinStrategy.determine_best_action()
+# - phase 'accept': return a bool array, True to accept an improper knock
+
+import gindeadwood
+import numpy as np
+
+START_ACTIONS = ['PICKUP-FROM-DISCARD', 'DRAW']
+END_ACTIONS = ['KNOCK', 'DISCARD', 'KNOCK-GIN']
+
+PICKUP_FROM_DISCARD, DRAW = range(len(START_ACTIONS))
+KNOCK, DISCARD, KNOCK_GIN = range(len(END_ACTIONS))
+
+
+
+# return an (n, 11) array of the rankings (card + 1) held in each of an array of hand masks of up to 11 cards, in
+# GinHand order, with 0 for empty slots. this is the GinPlayer observable data.
+def hand_rankings(masks):
+    remaining = np.array(masks, dtype=np.int64)
+    rankings = np.zeros((len(remaining), 11), dtype=np.int64)
+    for slot in range(11):
+        low_bit = remaining & -remaining
+        held = low_bit != 0
+        rankings[held, slot] = np.log2(low_bit[held]).astype(np.int64) + 1
+        remaining ^= low_bit
+    return rankings
+
+
+class GinMatchBatch(object):
+    def __init__(self, count, decks=None, seed=None, knocking_point=10, maximum_turns=60):
+        assert count > 0, 'must play at least one game'
+        self.count = count
+        self.random = np.random.RandomState(seed)
+
+        # rules
+        self.knocking_point = knocking_point
+        self.maximum_turns = maximum_turns
+
+        # each deck lists its cards in stock order. like GinDeck, we deal from the end.
+        if decks is None:
+            decks = self.random.rand(count, 52).argsort(axis=1)
+        self.deck = np.array(decks, dtype=np.int8)
+        assert self.deck.shape == (count, 52), 'need one 52 card deck per game'
+        self.deck_height = np.full(count, 52, dtype=np.int64)
+
+        # hands, and the discard pile with its top at discard_height - 1
+        self.hands = np.zeros((count, 2), dtype=np.int64)
+        self.hand_size = np.zeros((count, 2), dtype=np.int64)
+        self.discard_pile = np.zeros((count, 52), dtype=np.int8)
+        self.discard_height = np.zeros(count, dtype=np.int64)
+
+        # game state
+        self.seat = np.zeros(count, dtype=np.int64)
+        self.turns_taken = np.zeros(count, dtype=np.int64)
+        self.gameover = np.zeros(count, dtype=bool)
+        self.player_who_knocked = np.zeros(count, dtype=np.int64)
+        self.player_who_knocked_gin = np.zeros(count, dtype=np.int64)
+        self.knocked_improperly = np.zeros((count, 2), dtype=bool)
+        self.player_who_won_coinflip = np.zeros(count, dtype=np.int64)
+
+        # score board
+        self.score = np.zeros((count, 2), dtype=np.int64)
+        self.games_won = np.zeros((count, 2), dtype=np.int64)
+        self.wins_by_coinflip = np.zeros((count, 2), dtype=np.int64)
+
+        # we have 11 + 33 + 5 observable points per player, laid out like the observers of a GinNeuralNet
+        self.observable_width = 11 + 33 + 5
+
+    # play every game to the end and return one GinMatch.run() style result per game. players, if given, holds a
+    # (p1, p2) pair per game to report as winner/loser. otherwise seats are reported as 1 and 2.
+    def run(self, decide, players=None):
+        self.deal_cards()
+        while not self.gameover.all():
+            self.take_turns(decide)
+        self.update_score(np.arange(self.count))
+        return self.match_results(players)
+
+    # deal 10 cards to each player, then an 11th to p1, alternating from the end of the deck
+    def deal_cards(self):
+        for i in range(10):
+            self.draw(np.arange(self.count), 0)
+            self.draw(np.arange(self.count), 1)
+        self.draw(np.arange(self.count), 0)
+
+    # move the next stock card into the hand of the given seat(s)
+    def draw(self, games, seats):
+        self.deck_height[games] -= 1
+        cards = self.deck[games, self.deck_height[games]].astype(np.int64)
+        self.hands[games, seats] |= 1 << cards
+        self.hand_size[games, seats] += 1
+
+    def pickup_discard(self, games, seats):
+        self.discard_height[games] -= 1
+        cards = self.discard_pile[games, self.discard_height[games]].astype(np.int64)
+        self.hands[games, seats] |= 1 << cards
+        self.hand_size[games, seats] += 1
+
+    # discard the card at index (in GinHand order) from each hand
+    def discard_card(self, games, seats, indexes):
+        cards = hand_rankings(self.hands[games, seats])[np.arange(len(games)), indexes] - 1
+        self.hands[games, seats] &= ~(1 << cards)
+        self.hand_size[games, seats] -= 1
+        self.discard_pile[games, self.discard_height[games]] = cards
+        self.discard_height[games] += 1
+
+    def deadwood_count(self, games, seats):
+        return gindeadwood.deadwood_count_many(self.hands[games, seats])
+
+    # let every game still in play take one player's turn
+    def take_turns(self, decide):
+        # before p1 plays, end games that are out of stock or out of turns with a coin flip
+        round_start = np.nonzero(~self.gameover & (self.seat == 0))[0]
+        exhausted = (self.deck_height[round_start] <= 2) | (self.turns_taken[round_start] >= self.maximum_turns)
+        self.end_game_with_coinflip(round_start[exhausted])
+
+        games = np.nonzero(~self.gameover)[0]
+        if len(games) == 0:
+            return
+        seats = self.seat[games]
+
+        # players holding 10 cards first draw or pick up the top discard
+        starting = self.hand_size[games, seats] == 10
+        if starting.any():
+            start_games, start_seats = games[starting], seats[starting]
+            actions = np.asarray(decide(self, start_games, start_seats, 'start')[0])
+            pickup = actions == PICKUP_FROM_DISCARD
+            self.pickup_discard(start_games[pickup], start_seats[pickup])
+            self.draw(start_games[~pickup], start_seats[~pickup])
+
+        # then everyone discards, knocks or knocks gin
+        actions, indexes = decide(self, games, seats, 'end')
+        actions = np.asarray(actions)
+        self.discard_card(games, seats, indexes)
+        self.player_who_knocked[games[actions == KNOCK]] = seats[actions == KNOCK] + 1
+        self.player_who_knocked_gin[games[actions == KNOCK_GIN]] = seats[actions == KNOCK_GIN] + 1
+
+        # validate the knock, or the knock_gin, for any game with either standing
+        knocked = self.player_who_knocked[games] != 0
+        knocked_gin = ~knocked & (self.player_who_knocked_gin[games] != 0)
+        self.process_knock(games[knocked], seats[knocked], decide)
+        self.process_knock_gin(games[knocked_gin], seats[knocked_gin], decide)
+
+        # count turns and pass play to the other seat
+        self.turns_taken[games] += 1
+        self.seat[games] = 1 - seats
+
+    def end_game_with_coinflip(self, games):
+        self.gameover[games] = True
+        self.player_who_won_coinflip[games] = np.where(self.random.random_sample(len(games)) < 0.5, 1, 2)
+
+    def process_knock(self, games, knockers, decide):
+        deadwood = self.deadwood_count(games, knockers)
+
+        # improper knocks expose the hand and give the opponent the option to accept
+        improper = deadwood > self.knocking_point
+        self.knocked_improperly[games[improper], knockers[improper]] = True
+        self.offer_to_accept_improper_knock(games[improper], 1 - knockers[improper], decide)
+
+        # a knock with no deadwood is a gin
+        gin = deadwood == 0
+        self.player_who_knocked[games[gin]] = 0
+        self.player_who_knocked_gin[games[gin]] = knockers[gin] + 1
+        self.gameover[games[gin]] = True
+
+        # the rest are valid knocks
+        valid = ~improper & ~gin
+        self.player_who_knocked[games[valid]] = knockers[valid] + 1
+        self.gameover[games[valid]] = True
+
+    def process_knock_gin(self, games, knockers, decide):
+        deadwood = self.deadwood_count(games, knockers)
+
+        improper = deadwood != 0
+        self.knocked_improperly[games[improper], knockers[improper]] = True
+        self.offer_to_accept_improper_knock(games[improper], 1 - knockers[improper], decide)
+
+        valid = ~improper
+        self.player_who_knocked_gin[games[valid]] = knockers[valid] + 1
+        self.gameover[games[valid]] = True
+
+    # accepters holding a knock-worthy hand themselves may end the game by accepting an improper knock
+    def offer_to_accept_improper_knock(self, games, accepters, decide):
+        eligible = self.deadwood_count(games, accepters) <= self.knocking_point
+        if eligible.any():
+            accepted = np.asarray(decide(self, games[eligible], accepters[eligible], 'accept'), dtype=bool)
+            self.gameover[games[eligible][accepted]] = True
+
+    # award deadwood scoring and gin bonuses, as GinMatch.update_score() does
+    def update_score(self, games):
+        coinflip = self.player_who_won_coinflip[games]
+        for seat in (0, 1):
+            won = games[coinflip == seat + 1]
+            self.score[won, seat] += 25
+            self.games_won[won, seat] += 1
+            self.wins_by_coinflip[won, seat] += 1
+
+        games = games[coinflip == 0]
+        knocked = self.player_who_knocked[games]
+        knocked_gin = self.player_who_knocked_gin[games]
+        knockers = np.where((knocked == 1) | (knocked_gin == 1), 0, 1)
+        defenders = 1 - knockers
+        knocker_deadwood = self.deadwood_count(games, knockers)
+        defender_deadwood = self.deadwood_count(games, defenders)
+
+        # for gin, the knocker takes the defender's deadwood plus 25
+        gin = knocked_gin != 0
+        self.score[games[gin], knockers[gin]] += defender_deadwood[gin] + 25
+        self.games_won[games[gin], knockers[gin]] += 1
+
+        # for knocks, the deadwood difference goes to the knocker, or to the defender with 25 more for an undercut
+        delta = np.abs(knocker_deadwood - defender_deadwood)
+        undercut = ~gin & (knocked != 0) & (defender_deadwood <= knocker_deadwood)
+        knock = ~gin & (knocked != 0) & ~undercut
+        self.score[games[undercut], defenders[undercut]] += delta[undercut] + 25
+        self.games_won[games[undercut], defenders[undercut]] += 1
+        self.score[games[knock], knockers[knock]] += delta[knock]
+        self.games_won[games[knock], knockers[knock]] += 1
+
+    # tally the final scores of each game, with the same fields as GinMatch.match_result()
+    def match_results(self, players=None):
+        if players is None:
+            players = [(1, 2)] * self.count
+
+        results = []
+        for game in range(self.count):
+            p1_score, p2_score = self.score[game]
+
+            # ties go to a coin flip, with no loser recorded
+            if p1_score == p2_score:
+                winner = 0 if self.random.random_sample() < 0.5 else 1
+                loser = None
+            else:
+                winner = 0 if p1_score > p2_score else 1
+                loser = players[game][1 - winner]
+
+            # this only works for game_count = 1
+            if self.wins_by_coinflip[game].any():
+                winner_point_delta = 0
+            else:
+                winner_point_delta = int(self.score[game, winner] - self.score[game, 1 - winner])
+
+            results.append({'winner': players[game][winner],
+                            'loser':                        loser,
+                            'winner_games_won':             int(self.games_won[game, winner]),
+                            'winner_games_lost':            int(self.games_won[game, 1 - winner]),
+                            'winner_games_won_by_coinflip': int(self.wins_by_coinflip[game, winner]),
+                            'loser_games_won':              int(self.games_won[game, 1 - winner]),
+                            'loser_games_lost':             int(self.games_won[game, winner]),
+                            'loser_games_won_by_coinflip':  int(self.wins_by_coinflip[game, 1 - winner]),
+                            'winner_point_delta':           winner_point_delta})
+
+        return results
+
+    # return what each player's observers would see, one row per game: the GinPlayer data (hand rankings, with 0 for
+    # an empty 11th slot), then the GinTable data and the GinMatch data, quirks and all
+    def observe(self, games, seats):
+        data = np.zeros((len(games), self.observable_width), dtype=np.float64)
+
+        # player: card rankings in hand order
+        data[:, :11] = hand_rankings(self.hands[games, seats])
+
+        # table: GinTable means slot 0 to be the stock height, but it is overwritten by the bottom discard, or by 0
+        # while the pile is empty. slots 1+ hold the discards from the bottom up, leaving out the top card.
+        discard_height = self.discard_height[games]
+        pile = self.discard_pile[games, :32].astype(np.float64) + 1
+        data[:, 11] = np.where(discard_height > 0, pile[:, 0], 0)
+        data[:, 12:44] = np.where(np.arange(1, 33) < discard_height[:, np.newaxis], pile, 0)
+
+        # match: knocking point, scores and games won
+        data[:, 44] = self.knocking_point
+        data[:, 45:47] = self.score[games]
+        data[:, 47:49] = self.games_won[games]
+
+        return data
+
+
+# decide for a GinMatchBatch with the members of a StackedNeuralNet. members holds the member index playing each
+# seat of each game. the outputs are decoded exactly as NeuralGinStrategy decodes them.
+class NeuralBatchPolicy(object):
+    def __init__(self, stack, members):
+        self.stack = stack
+        self.members = np.asarray(members, dtype=np.intp)
+        self.output_columns = dict((key, self.stack.output_keys.index(key))
+                                   for key in ['action_start', 'action_end', 'index', 'accept_improper_knock'])
+
+    # vectorized NeuralGinStrategy.decode_signal
+    @staticmethod
+    def decode_signal(signals, buckets):
+        return np.minimum((signals * buckets).astype(np.int64), buckets - 1)
+
+    def __call__(self, batch, games, seats, phase):
+        outputs = self.stack.forward(self.members[games, seats], batch.observe(games, seats))
+        if phase == 'accept':
+            return NeuralBatchPolicy.decode_signal(outputs[:, self.output_columns['accept_improper_knock']], 2) == 1
+
+        if phase == 'start':
+            actions = NeuralBatchPolicy.decode_signal(outputs[:, self.output_columns['action_start']],
+                                                      len(START_ACTIONS))
+        else:
+            actions = NeuralBatchPolicy.decode_signal(outputs[:, self.output_columns['action_end']], len(END_ACTIONS))
+        indexes = NeuralBatchPolicy.decode_signal(outputs[:, self.output_columns['index']], 11)
+        return actions, indexes
@@ -0,0 +1,132 @@
+#!/usr/bin/python
+#
+# islands.py
+#
+# 2015/05/24
+# rg
+#
+# island-model evolution: a number of independent populations, each evolving in its own process, that every so often
+# send copies of their best members to the next island around a ring. islands checkpoint on their own, so a crash only
+# loses the progress of the island it happens on.
+
+from genetic_algorithm import *
+import Queue
+import os
+
+
+# evolve one island in a worker process, then report its best genomes to the parent. the parent handles Ctrl-C and
+# tells islands to stop through the stop event, so islands ignore it.
+def _run_island(archipelago, island, generations, inboxes, results, stop):
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    # islands are forked with the same random state, so each needs its own
+    if archipelago.seed is None:
+        random.seed()
+    else:
+        random.seed(archipelago.seed + island)
+
+    # migrants still in flight when we finish are dropped, rather than holding up our exit
+    outbox = inboxes[(island + 1) % len(inboxes)]
+    outbox.cancel_join_thread()
+
+    population = archipelago.make_population(island)
+    archipelago.evolve(population, generations, inboxes[island], outbox, stop)
+    results.put((island, population.current_generation,
+                 [np.asarray(geneset.genes) for geneset in population.get_top_members(population.retain_best)]))
+
+
+class Archipelago(object):
+    def __init__(self, island_count, gene_size, population_size, retain_best=None, migration_interval=10, migrants=1,
+                 local_storage=None, seed=None):
+        assert island_count > 0, "need at least one island"
+        assert migration_interval > 0, "migration interval must be at least one generation"
+        self.island_count = island_count
+        self.gene_size = gene_size
+        self.population_size = population_size
+        self.retain_best = retain_best
+
+        # every migration_interval generations, each island sends its best migrants members to the next
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+
+        # island i checkpoints to local_storage + '.island<i>'
+        self.local_storage = local_storage
+
+        # island i seeds its random state with seed + i (or randomly, without a seed)
+        self.seed = seed
+
+        # after run(), each island's (generation, best genomes), or None for islands that didn't report
+        self.results = [None] * island_count
+
+    def island_storage(self, island):
+        if self.local_storage is None:
+            return None
+        return '{0}.island{1}'.format(self.local_storage, island)
+
+    # create an island's population, carrying on from its checkpoint if it has one
+    def make_population(self, island):
+        storage = self.island_storage(island)
+        population = Population(self.gene_size, self.population_size, retain_best=self.retain_best,
+                                 local_storage=storage)
+        if storage is not None and os.path.exists(storage):
+            population.persist(action='load')
+        return population
+
+    # run the given number of generations on every island, in a process each. returns each island's best genomes.
+    def run(self, generations):
+        inboxes = [multiprocessing.Queue() for _ in range(self.island_count)]
+        results = multiprocessing.Queue()
+        stop = multiprocessing.Event()
+        processes = [multiprocessing.Process(target=_run_island,
+                                             args=(self, island, generations, inboxes, results, stop))
+                     for island in range(self.island_count)]
+        for process in processes:
+            process.start()
+
+        # collect reports until every island has reported or died. on Ctrl-C, islands finish their generation, store
+        # their checkpoints and report.
+        self.results = [None] * self.island_count
+        reported = 0
+        while reported < self.island_count:
+            try:
+                island, generation, genomes = results.get(timeout=1)
+                self.results[island] = (generation, genomes)
+                reported += 1
+            except Queue.Empty:
+                if not any(process.is_alive() for process in processes) and results.empty():
+                    break
+            except KeyboardInterrupt:
+                log_warn("stopping islands after their current generation")
+                stop.set()
+
+        for process in processes:
+            process.join()
+
+        return self.results
+
+    # evolve a population for the given number of generations, migrating every migration_interval generations, then
+    # checkpoint it
+    def evolve(self, population, generations, inbox, outbox, stop=None):
+        for _ in range(generations):
+            if stop is not None and stop.is_set():
+                break
+
+            population.generate_next_generation()
+            if population.current_generation % self.migration_interval == 0:
+                self.migrate(population, inbox, outbox)
+
+        population.persist(action='store')
+        return population
+
+    # send copies of our best to the next island, and take in whoever has arrived from the previous one. migrants join
+    # as newborns of the current generation.
+    def migrate(self, population, inbox, outbox):
+        outbox.put([np.asarray(geneset.genes) for geneset in population.get_top_members(self.migrants)])
+
+        while True:
+            try:
+                genomes = inbox.get_nowait()
+            except Queue.Empty:
+                break
+            for genes in genomes:
+                population.add_member(population.make_geneset(list(genes)), population.current_generation)
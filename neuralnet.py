@@ -10,6 +10,8 @@
 from math import exp
 from utility import *
 from texttable import *
+from observer import FeatureVector
+import numpy as np
 
 
 class NeuralNet(object):
@@ -195,6 +197,204 @@ class GinNeuralNet(NeuralNet):
         super(GinNeuralNet, self).__init__(observers, weightset, output_keys)
 
 
+# the same network as NeuralNet, held as weight matrices instead of a graph of Perceptrons. a pulse is three
+# matrix-vector products. NeuralNet stays around as the reference implementation.
+#
+# inputs come from a list of Observers, which have every state change pushed to them, or from a FeatureVector, which
+# is only read (all at once) when we pulse.
+class MatrixNeuralNet(object):
+    def __init__(self, observers, weightset, output_keys):
+        assert len(observers) > 0, 'must have at least one observer'
+        assert len(weightset.weights) > 0, 'must have non-empty weights dict'
+        assert len(output_keys) > 0, 'must have at least one output_key'
+
+        self.observers = observers
+
+        self.weightset = weightset
+
+        self.outputs = {}
+        for key in output_keys:
+            self.outputs[key] = None
+
+        # NeuralNet assigns output weight rows in the iteration order of its outputs dict, so we do too
+        self.output_keys = self.outputs.keys()
+
+        self.input_count = sum(MatrixNeuralNet.input_widths(self.observers))
+
+        self.validate_weights()
+
+        self.input_weights, self.hidden_weights, self.jidden_weights, self.output_weights = \
+            MatrixNeuralNet.build_layers(self.weightset, MatrixNeuralNet.input_widths(self.observers),
+                                         self.calculate_hidden_count(), len(self.output_keys))
+
+        # scratch space for the sensed inputs
+        self.inputs = np.zeros(self.input_count, dtype=np.float64)
+
+    # the width of each observer, or of each observable in a FeatureVector
+    @staticmethod
+    def input_widths(observers):
+        if isinstance(observers, FeatureVector):
+            return observers.widths
+        return [observer.width for observer in observers]
+
+    # lay a weightset out as one array per layer
+    @staticmethod
+    def build_layers(weightset, input_widths, hidden_count, output_count):
+        weights = weightset.weights
+
+        # each observer reuses input weights 0..width-1, matching NeuralNet.create_input_layer()
+        input_weights = np.concatenate([np.asarray(weights['input'][:width], dtype=np.float64)
+                                        for width in input_widths])
+        hidden_weights = np.asarray(weights['hidden'][:hidden_count], dtype=np.float64)
+        jidden_weights = np.asarray(weights['jidden'][:hidden_count], dtype=np.float64)
+        output_weights = np.asarray(weights['output'][:output_count], dtype=np.float64)
+
+        return input_weights, hidden_weights, jidden_weights, output_weights
+
+    def validate_weights(self):
+        # ensure we have an input, hidden and output key
+        assert 'input'  in self.weightset.weights, "no input  weights"
+        assert 'hidden' in self.weightset.weights, "no hidden weights"
+        assert 'output' in self.weightset.weights, "no output weights"
+
+        # offload the work to the weightset
+        return self.weightset.validate(self.input_count, self.calculate_hidden_count(), len(self.outputs))
+
+    def calculate_hidden_count(self):
+        return int((self.input_count + len(self.outputs)) * 2/3)
+
+    # vectorized Perceptron.sigmoid, including its clamping beyond +/-100
+    @staticmethod
+    def sigmoid(values):
+        clipped = np.clip(values, -101, 101)
+        result = np.negative(clipped)
+        np.exp(result, out=result)
+        result += 1
+        np.reciprocal(result, out=result)
+        result[clipped < -100] = 0
+        result[clipped > 100] = 1
+        return result
+
+    # copy the current value of every input out of our observers, or pull them all from our FeatureVector
+    def sense(self):
+        if isinstance(self.observers, FeatureVector):
+            return self.observers.pull()
+
+        i = 0
+        for observer in self.observers:
+            for key in range(observer.width):
+                self.inputs[i] = observer.get_value_by_index(key)
+                i += 1
+        return self.inputs
+
+    # run the sensed inputs through the network. each layer after the inputs has a bias neuron of weight 1.
+    def forward(self, inputs):
+        input_layer = MatrixNeuralNet.sigmoid(inputs * self.input_weights)
+        hidden_layer = MatrixNeuralNet.sigmoid(self.hidden_weights.dot(input_layer) + 1)
+        jidden_layer = MatrixNeuralNet.sigmoid(self.jidden_weights.dot(hidden_layer) + 1)
+        return MatrixNeuralNet.sigmoid(self.output_weights.dot(jidden_layer) + 1)
+
+    # pulse the neural net and store the output for later use
+    def pulse(self):
+        self.set_outputs(self.forward(self.sense()))
+
+    # store output values computed elsewhere (see StackedNeuralNet)
+    def set_outputs(self, output_values):
+        for i in range(len(self.output_keys)):
+            self.outputs[self.output_keys[i]] = float(output_values[i])
+
+
+class GinMatrixNeuralNet(MatrixNeuralNet):
+    def __init__(self, observers, weightset):
+        output_keys = ['action_start', 'action_end', 'index', 'accept_improper_knock']
+        super(GinMatrixNeuralNet, self).__init__(observers, weightset, output_keys)
+
+
+# the weights of many networks of identical shape, stacked so that one forward pass can serve any mix of them. a
+# member is addressed by its position in the weightsets list.
+class StackedNeuralNet(object):
+    def __init__(self, weightsets, input_widths, output_keys):
+        assert len(weightsets) > 0, 'must have at least one weightset'
+        assert len(input_widths) > 0, 'must have at least one input width'
+        assert len(output_keys) > 0, 'must have at least one output_key'
+
+        self.weightsets = weightsets
+        self.input_widths = input_widths
+
+        # order our outputs exactly as a MatrixNeuralNet with the same keys would
+        outputs = {}
+        for key in output_keys:
+            outputs[key] = None
+        self.output_keys = outputs.keys()
+
+        self.input_count = sum(input_widths)
+        self.hidden_count = int((self.input_count + len(self.output_keys)) * 2/3)
+
+        layers = []
+        for weightset in self.weightsets:
+            assert weightset.validate(self.input_count, self.hidden_count, len(self.output_keys))
+            layers.append(MatrixNeuralNet.build_layers(weightset, self.input_widths, self.hidden_count,
+                                                       len(self.output_keys)))
+
+        # shapes: (members, inputs), (members, hidden, inputs), (members, hidden, hidden), (members, outputs, hidden)
+        self.input_weights  = np.array([layer[0] for layer in layers])
+        self.hidden_weights = np.array([layer[1] for layer in layers])
+        self.jidden_weights = np.array([layer[2] for layer in layers])
+        self.output_weights = np.array([layer[3] for layer in layers])
+
+    def __len__(self):
+        return len(self.weightsets)
+
+    # run row i of inputs through network members[i], for every i at once. returns one row of outputs per input row.
+    # rows are grouped by member, so each member costs one matrix product per layer however many rows it has.
+    def forward(self, members, inputs):
+        members = np.asarray(members, dtype=np.intp)
+        inputs = np.asarray(inputs, dtype=np.float64)
+        outputs = np.empty((len(members), len(self.output_keys)), dtype=np.float64)
+
+        for member in np.unique(members):
+            rows = members == member
+            input_layer = MatrixNeuralNet.sigmoid(inputs[rows] * self.input_weights[member])
+            hidden_layer = MatrixNeuralNet.sigmoid(input_layer.dot(self.hidden_weights[member].T) + 1)
+            jidden_layer = MatrixNeuralNet.sigmoid(hidden_layer.dot(self.jidden_weights[member].T) + 1)
+            outputs[rows] = MatrixNeuralNet.sigmoid(jidden_layer.dot(self.output_weights[member].T) + 1)
+
+        return outputs
+
+
+class GinStackedNeuralNet(StackedNeuralNet):
+    def __init__(self, weightsets, input_widths):
+        output_keys = ['action_start', 'action_end', 'index', 'accept_improper_knock']
+        super(GinStackedNeuralNet, self).__init__(weightsets, input_widths, output_keys)
+
+
+# one member of a StackedNeuralNet, wired to its own observers. it pulses like a MatrixNeuralNet, but can also have
+# its outputs filled in by a batched StackedNeuralNet.forward() covering many members at once.
+class MemberNeuralNet(MatrixNeuralNet):
+    def __init__(self, stack, member, observers):
+        assert 0 <= member < len(stack), 'no such member'
+        assert list(MatrixNeuralNet.input_widths(observers)) == list(stack.input_widths), \
+            'observer widths must match the stack'
+
+        self.stack = stack
+        self.member = member
+        self.observers = observers
+        self.weightset = stack.weightsets[member]
+
+        self.output_keys = stack.output_keys
+        self.outputs = {}
+        for key in self.output_keys:
+            self.outputs[key] = None
+
+        self.input_count = stack.input_count
+
+        # scratch space for the sensed inputs
+        self.inputs = np.zeros(self.input_count, dtype=np.float64)
+
+    def forward(self, inputs):
+        return self.stack.forward([self.member], inputs[np.newaxis])[0]
+
+
 class Perceptron(object):
     def __init__(self, myid=None):
         self.inputs = {}
@@ -325,6 +525,12 @@ class WeightSet(object):
         assert len(gene_set.genes) >= num_inputs + num_hidden * num_inputs + num_outputs * num_hidden, \
             "not enough genes to fill up our weights"
 
+        # array genomes are carved into layers as reshaped views onto the genome's own buffer, with no copying. the
+        # views share memory with the genome, so later changes to the genes show up in the weights.
+        if isinstance(gene_set.genes, np.ndarray):
+            self.weights = WeightSet.layer_views(gene_set.genes, num_inputs, num_hidden, num_outputs)
+            return
+
         # create structure
         self.weights = {'input': [], 'hidden': [], 'jidden': [], 'output': []}
 
@@ -356,8 +562,28 @@ class WeightSet(object):
                 self.weights['output'][i].append(gene_set.genes[gene_index])
                 gene_index += 1
 
+    # lay the layers out over a flat genome in the same order as the list-building code above
+    @staticmethod
+    def layer_views(genes, num_inputs, num_hidden, num_outputs):
+        hidden_start = num_inputs
+        jidden_start = hidden_start + num_hidden * num_inputs
+        output_start = jidden_start + num_hidden * num_hidden
+        output_end = output_start + num_outputs * num_hidden
+
+        return {'input':  genes[:hidden_start],
+                'hidden': genes[hidden_start:jidden_start].reshape(num_hidden, num_inputs),
+                'jidden': genes[jidden_start:output_start].reshape(num_hidden, num_hidden),
+                'output': genes[output_start:output_end].reshape(num_outputs, num_hidden)}
+
     # cut out junk genes
     def prune(self, num_inputs, num_hidden, num_outputs):
+        # layer views can be cut down in place
+        if isinstance(self.weights['input'], np.ndarray):
+            self.weights['input'] = self.weights['input'][:num_inputs]
+            self.weights['hidden'] = self.weights['hidden'][:num_hidden, :num_inputs]
+            self.weights['output'] = self.weights['output'][:num_inputs, :num_hidden]
+            return
+
         # input layer
         self.weights['input'] = self.weights['input'][:num_inputs]
 
@@ -8,6 +8,7 @@
 # classes to implement observer pattern and observe changes that occur in specific classes
 
 import uuid
+import numpy as np
 from utility import *
 
 
@@ -17,22 +18,36 @@ from utility import *
 # For future improvement (garbage collection), look towards: https://github.com/DanielSank/observed
 
 # decorator to be used on methods that affect the state of the game. subscribes the observer to all changes made
-#  to methods in the Observable class
+#  to methods in the Observable class, and bumps the Observable's version
 def notify_observers_after(func):
     def func_wrapper(self, *args, **kwargs):
         ret_value = func(self, *args, **kwargs)
+        self.version += 1
         for observer in self._observers:
-            observer.observe(self.organize_data())
+            observer.notify()
         return ret_value
     return func_wrapper
 
 
+# notify observers ahead of a change. the version goes up once the change is made.
 def notify_observers_before(func):
     def func_wrapper(self, *args, **kwargs):
         for observer in self._observers:
-            observer.observe(self.organize_data())
-        return func(self, *args, **kwargs)
+            observer.notify()
+        ret_value = func(self, *args, **kwargs)
+        self.version += 1
+        return ret_value
+
+    return func_wrapper
 
+
+# decorator for methods that change the state of the game without notifying observers, so that data cached against
+# the Observable's version is rebuilt when next asked for
+def bump_version(func):
+    def func_wrapper(self, *args, **kwargs):
+        ret_value = func(self, *args, **kwargs)
+        self.version += 1
+        return ret_value
     return func_wrapper
 
 
@@ -41,6 +56,16 @@ class Observable(object):
         self._observers = []
         self.id = uuid.uuid4()
 
+        # goes up with every change to our state, so anything derived from it can be cached against (id, version).
+        # methods that change our state either notify observers, which bumps it, or are marked @bump_version.
+        self.version = 0
+
+        # for lazy observers: organize_data() as of the last time anyone asked for it, the version it was built at, and
+        # how many times it has been built
+        self._exported_data = None
+        self._exported_version = None
+        self.exports = 0
+
     def register_observer(self, obj):
         if obj not in self._observers:
             self._observers.append(obj)
@@ -50,10 +75,38 @@ class Observable(object):
     def noop_notify(self):
         pass
 
-
+    # organize_data(), built at most once per version and shared by every lazy observer. the dict is shared too, so it
+    # mustn't be changed.
+    def exported_data(self):
+        if self._exported_version != self.version:
+            self._exported_data = self.organize_data()
+            self._exported_version = self.version
+            self.exports += 1
+        return self._exported_data
+
+    # write our current state into out, an array of observable_width slots, as organize_data() would give it. slots
+    # organize_data() leaves out are 0. subclasses can override this to skip building the dict.
+    def write_features(self, out):
+        out[:] = 0
+        for key, value in self.organize_data().items():
+            out[key] = value
+
+
+# an eager observer (the default) is handed a copy of the observable's organize_data() on every notification. a lazy
+# one fetches the observable's exported_data() when read, if the observable's version has moved on since, so a burst
+# of changes between two reads (such as dealing a hand between two pulses) costs one rebuild rather than one each.
 class Observer(object):
-    def __init__(self, obj):
+    def __init__(self, obj, lazy=False):
         self._observed = obj
+        self.lazy = lazy
+
+        # the observed version our buffer holds (for lazy observers), and whether we have been notified since
+        self.buffer_version = None
+        self.dirty = True
+
+        # notifications a lazy observer took while its buffer was already stale, each of which an eager observer
+        # would have rebuilt its buffer for
+        self.coalesced = 0
         self.register(obj)
         self.buffer = None
         self.id = uuid.uuid4()
@@ -66,6 +119,15 @@ class Observer(object):
     def register(self, obj):
         obj.register_observer(self)
 
+    # the observable has changed
+    def notify(self):
+        if self.lazy:
+            if self.dirty:
+                self.coalesced += 1
+            self.dirty = True
+        else:
+            self.observe(self._observed.organize_data())
+
     # store a copy of the integer dict passed our way
     def observe(self, int_dict):
         if not int_dict:
@@ -75,4 +137,39 @@ class Observer(object):
 
     # return the ith member of the buffer. This is useful for assigning 10 neurons to the same Observer, each with id
     def get_value_by_index(self, index):
-        return self.buffer[index]
\ No newline at end of file
+        if self.lazy and self.buffer_version != self._observed.version:
+            self.buffer = self._observed.exported_data() or None
+            self.buffer_version = self._observed.version
+            self.dirty = False
+        return self.buffer[index]
+
+
+# the pull-based alternative to Observers: one preallocated array with a fixed slot range per observable. nothing
+# happens when observables change state; pull() has each observable whose version has moved on write its current
+# state into its slots, and returns the whole array.
+class FeatureVector(object):
+    def __init__(self, observables):
+        assert len(observables) > 0, 'must have at least one observable'
+        self.observables = observables
+        self.widths = [observable.observable_width for observable in observables]
+        self.width = sum(self.widths)
+        self.values = np.zeros(self.width, dtype=np.float64)
+
+        # views onto values, one per observable, and the version of the observable each holds
+        self.versions = [None] * len(observables)
+        self.slots = []
+        start = 0
+        for width in self.widths:
+            self.slots.append(self.values[start:start + width])
+            start += width
+
+    def __len__(self):
+        return len(self.observables)
+
+    def pull(self):
+        for i in range(len(self.observables)):
+            observable = self.observables[i]
+            if self.versions[i] != observable.version:
+                observable.write_features(self.slots[i])
+                self.versions[i] = observable.version
+        return self.values
@@ -0,0 +1,216 @@
+#!/usr/bin/python
+#
+# pairing.py
+#
+# 2015/05/20
+# rg
+#
+# tournament formats for the fitness test. a scheduler decides who plays whom: its rounds() generator yields rounds of
+# (challenger, defender) pairs of members. each round is played and recorded before the next is asked for, and the
+# (winner, loser) pairs of its matches are sent back into the generator, so formats can react to results.
+
+import math
+import numpy as np
+import random
+
+
+# the key under which an unordered pair of members is tracked
+def pairing_key(a, b):
+    return frozenset((a, b))
+
+
+# an unordered pair of members in a fixed order, whichever order they come in: by their genomes, compared at the first
+# gene in which they differ. the order depends only on the genes, so it is the same from run to run, and for members
+# rebuilt from the same genomes. members with the same genes play the same either way round, and keep the order given.
+def seated_pairing(a, b):
+    a_genes, b_genes = a.genes, b.genes
+    if a_genes[0] != b_genes[0]:
+        first = 0
+    else:
+        differ = np.flatnonzero(np.asarray(a_genes) != np.asarray(b_genes))
+        if not len(differ):
+            return a, b
+        first = differ[0]
+    return (a, b) if a_genes[first] < b_genes[first] else (b, a)
+
+
+# members from best to worst by the population's ranking. ties keep the order members came in.
+def ranked_members(population, members):
+    scores = population.ranking_scores(population.member_genes.select(members))
+    return [members[i] for i in np.argsort(-scores, kind='mergesort')]
+
+
+# the base format, which other formats override rounds() to change: every member plays every other member,
+# games_per_pairing matches for each pair, less the ones it has already had if the population tests incrementally
+class PairingScheduler(object):
+    def rounds(self, population, members):
+        pairings = []
+        for i in range(len(members)):
+            for j in range(i + 1, len(members)):
+                owed = population.games_per_pairing
+                if population.incremental_fitness:
+                    owed -= population.pairing_games.get(pairing_key(members[i], members[j]), 0)
+                pairings.extend([(members[i], members[j])] * max(0, owed))
+
+        if pairings:
+            yield pairings
+
+
+# the base format, under its own name
+class RoundRobinScheduler(PairingScheduler):
+    pass
+
+
+# every member challenges a number of distinct random opponents, for at most members x opponents matches
+class RandomOpponentsScheduler(PairingScheduler):
+    def __init__(self, opponents):
+        assert opponents > 0, "must play at least one opponent"
+        self.opponents = opponents
+
+    def rounds(self, population, members):
+        pairings = random_pairings(members, self.opponents)
+        if pairings:
+            yield pairings
+
+
+# pair every member with a number of distinct random opponents
+def random_pairings(members, opponents):
+    opponents = min(opponents, len(members) - 1)
+    paired = set()
+    pairings = []
+    for i in range(len(members)):
+        # pick until we have enough new opponents. a member whose opponents have mostly picked it already may come up
+        # short rather than search forever.
+        picked = 0
+        for attempt in range(4 * opponents + 16):
+            if picked == opponents:
+                break
+            j = random.randrange(len(members))
+            key = pairing_key(members[i], members[j])
+            if i != j and key not in paired:
+                paired.add(key)
+                pairings.append((members[i], members[j]))
+                picked += 1
+    return pairings
+
+
+# a number of swiss rounds: each round, members are paired down the current rankings, each with the best ranked member
+# it hasn't met yet. the last member sits out odd rounds.
+class SwissScheduler(PairingScheduler):
+    def __init__(self, rounds):
+        assert rounds > 0, "must play at least one round"
+        self.round_count = rounds
+
+    def rounds(self, population, members):
+        met = set()
+        for _ in range(self.round_count):
+            ranked = ranked_members(population, members)
+
+            # greedy pairing can paint itself into a corner, so we backtrack. if there is no way (or no quick way) to
+            # avoid rematches, we allow them.
+            pairings = SwissScheduler.pair_without_rematches(ranked, met, 16 * len(ranked))
+            if pairings is None:
+                pairings = SwissScheduler.pair_greedily(ranked, met)
+            if not pairings:
+                return
+
+            met.update(pairing_key(a, b) for a, b in pairings)
+            yield pairings
+
+    # pair ranked members down the list with no rematches, or return None if that took more than budget steps
+    @staticmethod
+    def pair_without_rematches(ranked, met, budget):
+        # one frame per pairing made: the members left before it, and the index of the opponent chosen among them
+        frames = []
+        remaining, candidate = ranked, 1
+        while len(remaining) > 1:
+            budget -= 1
+            if budget < 0:
+                return None
+
+            while candidate < len(remaining) and pairing_key(remaining[0], remaining[candidate]) in met:
+                candidate += 1
+            if candidate < len(remaining):
+                frames.append((remaining, candidate))
+                remaining, candidate = remaining[1:candidate] + remaining[candidate + 1:], 1
+            elif frames:
+                # nobody left for the top member: try the previous pairing's next option
+                remaining, candidate = frames.pop()
+                candidate += 1
+            else:
+                return None
+
+        return [(remaining[0], remaining[candidate]) for remaining, candidate in frames]
+
+    # pair ranked members down the list, avoiding rematches where the next unpaired member allows it
+    @staticmethod
+    def pair_greedily(ranked, met):
+        unpaired = list(ranked)
+        pairings = []
+        while len(unpaired) > 1:
+            top = unpaired.pop(0)
+            opponent = next((other for other in unpaired if pairing_key(top, other) not in met), unpaired[0])
+            unpaired.remove(opponent)
+            pairings.append((top, opponent))
+        return pairings
+
+
+# the top ranked member holds the hill against every other member in turn, from the bottom of the rankings up. whoever
+# wins a match holds the hill for the next one.
+class KingOfTheHillScheduler(PairingScheduler):
+    def rounds(self, population, members):
+        ranked = ranked_members(population, members)
+        if len(ranked) < 2:
+            return
+
+        king = ranked[0]
+        for challenger in reversed(ranked[1:]):
+            results = yield [(king, challenger)]
+            king = results[0][0]
+
+
+# races members through rounds of random opponents, dropping those who can no longer make the cut. after each round,
+# members whose ranking could at best (see Population.ranking_bounds) not beat the retain_best-th best worst case
+# stop playing. the games they would have played go to the remaining contenders, who face more opponents each, as far
+# as there are opponents to face. the race ends early once no more members than will be retained are left in it.
+class RacingScheduler(PairingScheduler):
+    def __init__(self, rounds, opponents=1, confidence=0.95):
+        assert rounds > 0, "must play at least one round"
+        assert opponents > 0, "must play at least one opponent"
+        self.round_count = rounds
+        self.opponents = opponents
+        self.confidence = confidence
+
+        # how the last race went, next to its budget: the rounds x members x opponents games of a full schedule.
+        # games_played + games_saved = budget. of the games played, games_redirected are those beyond the contenders'
+        # own opponents per round: the games eliminated members would have played, that the contenders played instead.
+        # games_saved are those nobody played, because the race ended early or the contenders ran out of opponents to
+        # face. the population shows these with its leaderboard (see Population.draw).
+        self.games_played = 0
+        self.games_redirected = 0
+        self.games_saved = 0
+
+    def rounds(self, population, members):
+        budget = self.round_count * len(members) * self.opponents
+        self.games_played = 0
+        self.games_redirected = 0
+        contenders = list(members)
+
+        for _ in range(self.round_count):
+            if len(contenders) < 2 or len(contenders) <= population.retain_best:
+                break
+
+            # spread this round's share of the budget over the contenders
+            opponents = max(self.opponents, int(math.ceil(self.opponents * len(members) / float(len(contenders)))))
+            pairings = random_pairings(contenders, opponents)
+            self.games_played += len(pairings)
+            self.games_redirected += max(0, len(pairings) - len(contenders) * self.opponents)
+            yield pairings
+
+            bounds = dict((member, population.ranking_bounds(population.member_genes[member], self.confidence))
+                          for member in members)
+            lower_bounds = sorted((lower for lower, upper in bounds.values()), reverse=True)
+            cutoff = lower_bounds[min(population.retain_best, len(lower_bounds)) - 1]
+            contenders = [member for member in contenders if bounds[member][1] >= cutoff]
+
+        self.games_saved = budget - self.games_played
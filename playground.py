@@ -9,6 +9,10 @@
 
 from genetic_algorithm import *
 from utility import *
+import checkpoint
+from islands import Archipelago
+import multiprocessing
+import os
 import utility
 
 
@@ -16,7 +20,7 @@ class Runner(object):
     def __init__(self):
         self.population_size = 20
         self.gene_size = 4000
-        self.p = Population(self.gene_size, self.population_size)
+        self.p = Population(self.gene_size, self.population_size, workers=multiprocessing.cpu_count())
 
         for _ in range(10):
             self.p.generate_next_generation()
@@ -24,7 +28,7 @@ class Runner(object):
         # get top two and watch a couple games
         best_genes = self.p.get_top_members(2)
 
-        self.p2 = Population(2000, 2)
+        self.p2 = Population(2000, 2, incremental_fitness=False)
         self.p2.member_genes = {}
         self.p2.add_member(best_genes[0], 0)
         self.p2.add_member(best_genes[1], 0)
@@ -49,11 +53,17 @@ class RunCheckIntelligence(object):
         self.gene_size = 4000
         self.max_generations = int(20 * 60 * 24)  # one day of runtime: runs about 20 per minute
 
-        local_storage = 'playground_check_intelligence.persist.txt'
+        local_storage = 'playground_check_intelligence.ckpt'
+
+        # carry on from the pickled population shipped with earlier versions
+        legacy_storage = 'playground_check_intelligence.persist.txt'
+        if not os.path.exists(local_storage) and os.path.exists(legacy_storage):
+            checkpoint.convert_legacy_pickle(legacy_storage, local_storage)
 
         self.p = Population(self.gene_size, self.population_size, retain_best=3, local_storage=local_storage)
         self.p.persist(action='load')
         self.p.retain_best = 4
+        self.p.workers = multiprocessing.cpu_count()
 
         self.register_sigint()
 
@@ -70,7 +80,7 @@ class RunCheckIntelligence(object):
         # get top two and watch a couple games
         best_genes = self.p.get_top_members(2)
 
-        p2 = Population(4000, 2)
+        p2 = Population(4000, 2, incremental_fitness=False)
         p2.member_genes = {}
         p2.add_member(best_genes[0], 0)
         p2.add_member(best_genes[1], 0)
@@ -85,18 +95,35 @@ class RunCheckIntelligence(object):
         the_class = self
 
         def signal_handler(the_signal, frame):
-            print('\nCaught Ctrl-C. Storing population...')
-            the_class.p.persist(action='store')
-            print('population stored. Quitting.')
+            print('\nCaught Ctrl-C. Storing population in the background...')
+            the_class.p.persist(action='store', wait=False)
 
             if the_class.exhibit_winners:
                 the_class.do_exhibit_winners()
 
+            # make sure the store has landed before we go
+            if the_class.p.flush_checkpoints():
+                print('population stored. Quitting.')
+            else:
+                print('failed to store population. Quitting.')
+
             sys.exit(0)
 
         signal.signal(signal.SIGINT, signal_handler)
 
 
+# evolve a population on each core, swapping the best members between them every 10 generations
+class RunIslands(object):
+    def __init__(self):
+        self.archipelago = Archipelago(multiprocessing.cpu_count(), 4000, 9, retain_best=4, migration_interval=10,
+                                       local_storage='playground_islands.ckpt')
+
+    def run(self):
+        for island, result in enumerate(self.archipelago.run(20 * 60 * 24)):
+            if result is not None:
+                print('island {0} reached generation {1}'.format(island, result[0]))
+
+
 for _ in range(1):
     a = RunCheckIntelligence()
     a.run()
@@ -0,0 +1,137 @@
+import unittest
+from checkpoint import *
+from checkpoint import _live_writers
+from genetic_algorithm import Population
+import gc
+import numpy as np
+import os
+import pickle
+import weakref
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.filename = '/tmp/test_checkpoint.ckpt'
+        self.genomes = np.random.RandomState(0).normal(size=(3, 50))
+        self.stats = np.arange(3 * len(STATS_COLUMNS)).reshape(3, len(STATS_COLUMNS))
+        self.info = {'current_generation': 12, 'retain_best': 2}
+
+    def tearDown(self):
+        for filename in (self.filename, self.filename + '.tmp', '/tmp/test_checkpoint.persist.txt'):
+            if os.path.exists(filename):
+                os.remove(filename)
+
+    def test_round_trip(self):
+        write_checkpoint(self.filename, self.genomes, self.stats, self.info)
+        self.assertTrue(is_checkpoint(self.filename))
+        self.assertFalse(os.path.exists(self.filename + '.tmp'))
+
+        for mmap in (True, False):
+            info, columns, genomes, stats = read_checkpoint(self.filename, mmap=mmap)
+            self.assertEqual(self.info, info)
+            self.assertEqual(STATS_COLUMNS, columns)
+            self.assertTrue((self.genomes == genomes).all())
+            self.assertTrue((self.stats == stats).all())
+
+        # the blocks are aligned for mapping
+        header = read_header(self.filename)
+        self.assertEqual(0, header['genome_offset'] % ALIGNMENT)
+        self.assertEqual(0, header['stats_offset'] % ALIGNMENT)
+
+    def test_read_checkpoint_mmap(self):
+        write_checkpoint(self.filename, self.genomes, self.stats, self.info)
+        info, columns, genomes, stats = read_checkpoint(self.filename)
+        self.assertIsInstance(genomes, np.memmap)
+        self.assertFalse(genomes.flags.writeable)
+
+        # a mapping outlives the file being replaced
+        write_checkpoint(self.filename, self.genomes * 2, self.stats, self.info)
+        self.assertTrue((self.genomes == genomes).all())
+
+    def test_write_checkpoint_empty(self):
+        write_checkpoint(self.filename, np.zeros((0, 0)), np.zeros((0, len(STATS_COLUMNS))), self.info)
+        info, columns, genomes, stats = read_checkpoint(self.filename)
+        self.assertEqual((0, 0), genomes.shape)
+        self.assertEqual((0, len(STATS_COLUMNS)), stats.shape)
+
+    def test_read_checkpoint_errors(self):
+        with open(self.filename, 'wb') as f:
+            f.write('not a checkpoint at all')
+        self.assertFalse(is_checkpoint(self.filename))
+        self.assertFalse(is_checkpoint('/tmp/no_such_checkpoint.ckpt'))
+        self.assertRaises(CheckpointError, read_checkpoint, self.filename)
+
+        # truncated blocks are caught when reading
+        write_checkpoint(self.filename, self.genomes, self.stats, self.info)
+        with open(self.filename, 'r+b') as f:
+            f.truncate(os.path.getsize(self.filename) - 8)
+        self.assertRaises(CheckpointError, read_checkpoint, self.filename, False)
+
+    def test_convert_legacy_pickle(self):
+        legacy_filename = '/tmp/test_checkpoint.persist.txt'
+        population = Population(50, 4, retain_best=2)
+        population.current_generation = 7
+        pickle.dump(population, open(legacy_filename, 'w'))
+
+        self.assertEqual(4, convert_legacy_pickle(legacy_filename, self.filename))
+        info, columns, genomes, stats = read_checkpoint(self.filename)
+        self.assertEqual({'current_generation': 7, 'retain_best': 2}, info)
+        stored = sorted(geneset.genes.tolist() for geneset in population.member_genes)
+        self.assertEqual(stored, sorted(genomes.tolist()))
+
+
+class TestCheckpointWriter(unittest.TestCase):
+    def setUp(self):
+        self.filename = '/tmp/test_checkpoint_writer.ckpt'
+        self.writer = CheckpointWriter(self.filename)
+        self.stats = np.zeros((2, len(STATS_COLUMNS)))
+
+    def tearDown(self):
+        self.writer.close()
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test_submit(self):
+        # later snapshots replace earlier ones, and the last one always lands
+        for generation in range(20):
+            self.writer.submit(np.full((2, 10), generation), self.stats, {'current_generation': generation})
+        self.assertTrue(self.writer.flush())
+
+        info, columns, genomes, stats = read_checkpoint(self.filename)
+        self.assertEqual(19, info['current_generation'])
+        self.assertTrue((genomes == 19).all())
+
+    def test_flush_error(self):
+        writer = CheckpointWriter('/tmp/no/such/directory.ckpt')
+        writer.submit(np.zeros((2, 10)), self.stats, {})
+        self.assertFalse(writer.flush())
+        self.assertIsInstance(writer.last_error, (IOError, OSError))
+        self.assertFalse(writer.close())
+
+    def test_close(self):
+        self.writer.submit(np.zeros((2, 10)), self.stats, {})
+        self.assertTrue(self.writer.close())
+        self.assertTrue(is_checkpoint(self.filename))
+        self.assertFalse(self.writer.thread.is_alive())
+        self.assertRaises(AssertionError, self.writer.submit, np.zeros((2, 10)), self.stats, {})
+
+    def test_release(self):
+        # closed writers leave the exit hook's set, and a dropped writer is collected and its thread exits
+        self.assertIn(self.writer, _live_writers)
+        self.writer.close()
+        self.assertNotIn(self.writer, _live_writers)
+
+        writer = CheckpointWriter(self.filename)
+        writer.submit(np.zeros((2, 10)), self.stats, {})
+        self.assertTrue(writer.flush())
+        thread = writer.thread
+        writer_ref = weakref.ref(writer)
+        del writer
+        gc.collect()
+        thread.join(5)
+        self.assertFalse(thread.is_alive())
+        self.assertIsNone(writer_ref())
+
+
+if __name__ == '__main__':
+    unittest.main()
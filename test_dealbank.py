@@ -0,0 +1,54 @@
+import unittest
+from dealbank import *
+from deck import Deck
+import numpy as np
+import os
+
+
+class TestDealBank(unittest.TestCase):
+    def setUp(self):
+        self.filename = '/tmp/test_dealbank.npy'
+
+    def tearDown(self):
+        if os.path.exists(self.filename):
+            os.remove(self.filename)
+
+    def test___init__(self):
+        bank = DealBank([range(52)] * 3)
+        self.assertEqual(3, len(bank))
+        self.assertEqual(np.uint8, bank.deals.dtype)
+        self.assertRaises(AssertionError, DealBank, [range(51)])
+        self.assertRaises(AssertionError, DealBank, np.zeros((0, 52)))
+
+    def test_generate(self):
+        bank = DealBank.generate(20, seed=4)
+        self.assertEqual((20, 52), bank.deals.shape)
+        for deal in bank.deals:
+            self.assertEqual(range(52), sorted(deal))
+
+        # the same seed gives the same deals
+        self.assertTrue((bank.deals == DealBank.generate(20, seed=4).deals).all())
+        self.assertFalse((bank.deals == DealBank.generate(20, seed=5).deals).all())
+
+    def test_deal(self):
+        bank = DealBank.generate(3, seed=0)
+        self.assertEqual(bank.deals[1].tolist(), bank.deal(1))
+        self.assertEqual(bank.deal(1), bank.deal(4))
+
+        # deals stack decks
+        self.assertEqual(bank.deal(2), [card.ranking() - 1 for card in Deck(bank.deal(2)).cards])
+
+    def test_save_load(self):
+        bank = DealBank.generate(10, seed=0)
+        bank.save(self.filename)
+        self.assertEqual(10 * 52 + 128, os.path.getsize(self.filename))
+
+        for mmap in (True, False):
+            loaded = DealBank.load(self.filename, mmap=mmap)
+            self.assertTrue((bank.deals == loaded.deals).all())
+            self.assertEqual(bank.deal(3), loaded.deal(3))
+        self.assertFalse(DealBank.load(self.filename).deals.flags.writeable)
+
+
+if __name__ == '__main__':
+    unittest.main()
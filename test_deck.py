@@ -51,6 +51,16 @@ class TestDeck(unittest.TestCase):
         d = Deck()
         self.assertEqual(len(d.cards), 52)
 
+    def test_new_deck_in_order(self):
+        order = range(51, -1, -1)
+        d = Deck(order)
+        self.assertEqual([c.ranking() - 1 for c in d.cards], order)
+        self.assertEqual(Card(1, 'c'), d.deal_a_card())
+
+        # orders must hold every card once
+        self.assertRaises(AssertionError, Deck, range(51))
+        self.assertRaises(AssertionError, Deck, [0] * 52)
+
     def test_shuffle(self):
         d = Deck()
         d.cards.sort(key=attrgetter('rank', 'suit'))
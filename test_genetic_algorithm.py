@@ -1,5 +1,7 @@
 import unittest
 from genetic_algorithm import *
+from genetic_algorithm import _play_genomes
+import numpy as np
 import utility
 import os
 
@@ -107,6 +109,70 @@ class TestGeneSet(unittest.TestCase):
             self.mutate_with_size_and_probability(1000, 0.0)
 
 
+class TestArrayGeneSet(unittest.TestCase):
+    def test___init__(self):
+        gs = ArrayGeneSet(500)
+        self.assertEqual((500,), gs.genes.shape)
+        self.assertEqual(np.float64, gs.genes.dtype)
+        self.assertGreaterEqual(np.sum(np.abs(gs.genes) < 4), 480)
+
+        # genes may be given as a list or an array, and are copied in
+        genes = [0.1, 0.2, 0.3]
+        self.assertEqual(genes, list(ArrayGeneSet(genes).genes))
+        array = np.array(genes)
+        ArrayGeneSet(array).genes[0] = 5
+        self.assertEqual(0.1, array[0])
+
+        with self.assertRaises(AssertionError):
+            ArrayGeneSet()
+
+        # the random module's seed decides the genome
+        random.seed(3)
+        first = ArrayGeneSet(10).genes
+        random.seed(3)
+        self.assertEqual(list(first), list(ArrayGeneSet(10).genes))
+
+    def test_make_geneset(self):
+        self.assertIsInstance(ArrayGeneSet(10).make_geneset(10), ArrayGeneSet)
+
+    def test_cross(self):
+        mom = ArrayGeneSet(100)
+        dad = ArrayGeneSet(100)
+        kid = mom.cross(dad)
+        self.assertIsInstance(kid, ArrayGeneSet)
+
+        # each gene comes from one parent, and both parents contribute
+        from_mom = kid.genes == mom.genes
+        from_dad = kid.genes == dad.genes
+        self.assertTrue((from_mom | from_dad).all())
+        self.assertTrue(from_mom.any() and from_dad.any())
+
+        # partners may differ in length and storage. the kid takes the longer length, with fresh genes at the end.
+        small = GeneSet(50)
+        kid = mom.cross(small)
+        self.assertEqual(100, len(kid.genes))
+        self.assertTrue(((kid.genes[:50] == small.genes) | (kid.genes[:50] == mom.genes[:50])).all())
+        self.assertFalse((kid.genes[50:] == mom.genes[50:]).all())
+
+    def test_mutate(self):
+        gs = ArrayGeneSet([0.0] * 100000)
+        gs.mutate(0.01)
+        mutated = np.count_nonzero(gs.genes)
+        self.assertTrue(500 < mutated < 1500)
+
+        # no mutations at a rate of 0
+        gs = ArrayGeneSet([0.0] * 1000)
+        gs.mutate(0.0)
+        self.assertEqual(0, np.count_nonzero(gs.genes))
+
+    def test_weightset(self):
+        genes = GeneSet(4000).genes
+        expected = WeightSet(GeneSet(genes), 49, 35, 4).weights
+        weights = WeightSet(ArrayGeneSet(genes), 49, 35, 4).weights
+        for layer in expected:
+            self.assertTrue(np.array_equal(expected[layer], weights[layer]))
+
+
 class TestGinGeneSet(unittest.TestCase):
     def setUp(self):
         pass
@@ -118,6 +184,54 @@ class TestGinGeneSet(unittest.TestCase):
         self.assertIsInstance(factory_gs, GinGeneSet)
 
 
+class TestMemberStats(unittest.TestCase):
+    def setUp(self):
+        self.members = [GeneSet(10) for _ in range(3)]
+        self.stats = [dict((column, i * 10 + j) for j, column in enumerate(checkpoint.STATS_COLUMNS)) for i in range(3)]
+        self.member_stats = MemberStats(zip(self.members, self.stats))
+
+    def test___init__(self):
+        self.assertIsInstance(self.member_stats, dict)
+        self.assertEqual(self.members, self.member_stats.keys())
+        self.assertEqual(self.stats, self.member_stats.values())
+        self.assertEqual(dict(zip(self.members, self.stats)), self.member_stats)
+        self.assertEqual(MemberStats(dict(zip(self.members, self.stats))), self.member_stats)
+
+    def test_rows(self):
+        # rows read and write the table in place
+        row = self.member_stats[self.members[1]]
+        self.assertEqual(15, row['game_points'])
+        self.assertIsInstance(row['game_points'], int)
+        row['game_points'] += 5
+        self.assertEqual(20, self.member_stats.active()['game_points'][1])
+        self.assertEqual(20, self.member_stats[self.members[1]]['game_points'])
+        self.assertRaises(TypeError, row.__delitem__, 'game_points')
+
+    def test___delitem__(self):
+        # the last row fills the hole
+        del self.member_stats[self.members[0]]
+        self.assertEqual([self.members[2], self.members[1]], self.member_stats.keys())
+        self.assertEqual([self.stats[2], self.stats[1]], self.member_stats.values())
+        self.assertNotIn(self.members[0], self.member_stats)
+
+        self.assertEqual(self.stats[1], self.member_stats.pop(self.members[1]))
+        self.assertEqual([(self.members[2], self.stats[2])], self.member_stats.items())
+        self.assertIsNone(self.member_stats.pop(self.members[1], None))
+
+    def test_growth(self):
+        members = [GeneSet(10) for _ in range(100)]
+        for member in members:
+            self.member_stats[member] = self.stats[0]
+        self.assertEqual(103, len(self.member_stats))
+        self.assertEqual(self.stats[2], self.member_stats[self.members[2]])
+        self.assertEqual(self.stats[0], self.member_stats[members[-1]])
+
+    def test_pickle(self):
+        restored = pickle.loads(pickle.dumps(self.member_stats))
+        self.assertIsInstance(restored, MemberStats)
+        self.assertEqual(self.stats, restored.values())
+
+
 class TestPopulation(unittest.TestCase):
     def setUp(self):
         self.gene_size = 100
@@ -140,6 +254,12 @@ class TestPopulation(unittest.TestCase):
     def test_draw(self):
         self.p.draw()
 
+        # a racing scheduler's savings show with the leaderboard
+        self.p.scheduler = RacingScheduler(2)
+        self.p.scheduler.games_played, self.p.scheduler.games_redirected, self.p.scheduler.games_saved = 150, 30, 50
+        self.assertIn("racing: played 150 games, 30 of them taken from eliminated members by the remaining contenders; "
+                      "50 games of the full schedule left unplayed", self.p.draw())
+
     def test_cull(self):
         # rig up 4 winners
         rig_count = 0
@@ -183,6 +303,60 @@ class TestPopulation(unittest.TestCase):
         self.assertEqual(self.initial_population_size, len(self.p.member_genes))
         self.assertEqual(self.gene_size, len(self.p.member_genes.keys()[0].genes))
 
+    def test_persist_list_genesets(self):
+        filename = '/tmp/test_persist_list_genesets.txt'
+        genes = GeneSet(self.gene_size).genes
+
+        # a population stored with list genomes loads into array genomes
+        stored = Population(self.gene_size, 0, local_storage=filename, gene_storage='list')
+        stored.add_member(GeneSet(genes), 3)
+        self.assertTrue(stored.persist(action='store'))
+
+        loaded = Population(self.gene_size, 0, local_storage=filename)
+        self.assertTrue(loaded.persist(action='load'))
+        geneset, stats = loaded.member_genes.items()[0]
+        self.assertIsInstance(geneset, ArrayGeneSet)
+        self.assertEqual(genes, list(geneset.genes))
+        self.assertEqual(3, stats['generation'])
+        os.remove(filename)
+
+    def test_persist_legacy_pickle(self):
+        filename = '/tmp/test_persist_legacy_pickle.txt'
+
+        # populations pickled by earlier versions still load, and are stored back as checkpoints
+        self.p.current_generation = 25
+        pickle.dump(self.p, open(filename, 'w'))
+        loaded = Population(self.gene_size, 0, local_storage=filename)
+        self.assertTrue(loaded.persist(action='load'))
+        self.assertEqual(25, loaded.current_generation)
+        self.assertEqual(filename, loaded.local_storage)
+        self.assertEqual(sorted(geneset.genes.tolist() for geneset in self.p.member_genes),
+                         sorted(geneset.genes.tolist() for geneset in loaded.member_genes))
+
+        self.assertTrue(loaded.persist(action='store'))
+        self.assertTrue(checkpoint.is_checkpoint(filename))
+        os.remove(filename)
+
+    def test_persist_in_background(self):
+        filename = '/tmp/test_persist_in_background.ckpt'
+        self.p.local_storage = filename
+
+        # the store is a snapshot: changes made while it is written don't leak into it
+        self.p.current_generation = 25
+        self.assertTrue(self.p.persist(action='store', wait=False))
+        self.p.current_generation = 26
+        self.assertTrue(self.p.flush_checkpoints())
+        self.assertIsNone(self.p.checkpoint_writer)
+
+        self.p.persist(action='load')
+        self.assertEqual(25, self.p.current_generation)
+
+        # populations with a writer still pickle
+        self.p.persist(action='store', wait=False)
+        self.assertIsNone(pickle.loads(pickle.dumps(self.p)).checkpoint_writer)
+        self.assertTrue(self.p.flush_checkpoints())
+        os.remove(filename)
+
     def test_ranking_func(self):
         gene_item = {'game_wins': 4, 'coinflip_game_wins': 4, 'game_losses': 0, 'generation': 0, 'game_points': 40}
         self.assertEqual(-2500, self.p.ranking_func(gene_item))
@@ -197,6 +371,35 @@ class TestPopulation(unittest.TestCase):
         self.p.current_generation = 1
         self.assertEqual(4000, self.p.ranking_func(gene_item))
 
+    def test_ranking_scores(self):
+        # scoring the whole table matches ranking_func, member by member
+        for stats in self.p.member_genes.values():
+            stats.update({'game_wins': random.randint(0, 20), 'game_losses': random.randint(0, 20),
+                          'game_points': random.randint(0, 500)})
+            stats['coinflip_game_wins'] = random.randint(0, stats['game_wins'])
+        expected = [self.p.ranking_func(stats) for stats in self.p.member_genes.values()]
+        self.assertEqual(expected, list(self.p.ranking_scores(self.p.member_genes.active())))
+
+    def test_member_genes(self):
+        # any mapping of stats assigned is stored in a MemberStats
+        self.p.member_genes = {}
+        self.assertIsInstance(self.p.member_genes, MemberStats)
+        self.p.add_member(GeneSet(10), 3)
+        self.assertEqual(3, self.p.member_genes.values()[0]['generation'])
+
+    def test_ranking_bounds(self):
+        gene_item = {'game_wins': 4, 'coinflip_game_wins': 2, 'game_losses': 2, 'generation': 0, 'game_points': 80}
+        lower, upper = self.p.ranking_bounds(gene_item)
+        self.assertLess(lower, self.p.ranking_func(gene_item))
+        self.assertGreater(upper, self.p.ranking_func(gene_item))
+
+        # bounds tighten with more games, and are wide open without any
+        gene_item.update({'game_wins': 400, 'coinflip_game_wins': 200, 'game_losses': 200, 'game_points': 8000})
+        self.assertGreater(self.p.ranking_bounds(gene_item)[0], lower)
+        self.assertLess(self.p.ranking_bounds(gene_item)[1], upper)
+        self.assertEqual((float('-inf'), float('inf')), self.p.ranking_bounds({'game_wins': 0, 'coinflip_game_wins': 0,
+                                                                               'game_losses': 0, 'game_points': 0}))
+
     def test_get_top_members(self):
         # rig up 4 winners, all of whom won by coinflip
         rig_count = 0
@@ -224,6 +427,16 @@ class TestPopulation(unittest.TestCase):
         top_keys = self.p.get_top_members(5)
         self.assertTrue(key in top_keys)
 
+    def test_get_top_members_order(self):
+        # the same members, in the same order, as sorting everyone by ranking_func would give, ties included
+        for stats in self.p.member_genes.values():
+            stats.update({'game_wins': random.randint(0, 3), 'game_losses': random.randint(0, 3),
+                          'game_points': 10 * random.randint(0, 3)})
+        ranked = sorted(self.p.member_genes.keys(), key=lambda member: self.p.ranking_func(self.p.member_genes[member]),
+                        reverse=True)
+        for count in (0, 1, 7, 50, 100, 150):
+            self.assertEqual(ranked[:count], self.p.get_top_members(count))
+
     def test_cross_over(self):
         breeder_count = 20
         self.p.cross_over(breeder_count)
@@ -260,6 +473,202 @@ class TestPopulation(unittest.TestCase):
         self.assertEqual(expected_games_played, matches_won)
         self.assertEqual(expected_games_played, matches_lost)
 
+    def test_fitness_test_incremental(self):
+        self.p.member_genes = {}
+        for _ in range(4):
+            self.p.add_member(GeneSet(4000), 0)
+
+        def matches_played():
+            return sum(stats['match_wins'] for stats in self.p.member_genes.values())
+
+        # pairings that have had their games aren't replayed...
+        self.p.fitness_test()
+        self.assertEqual(6, matches_played())
+        self.p.fitness_test()
+        self.assertEqual(6, matches_played())
+
+        # ...so only the pairings of new members are
+        newcomer = GeneSet(4000)
+        self.p.add_member(newcomer, 1)
+        self.p.fitness_test()
+        self.assertEqual(10, matches_played())
+        self.assertEqual(4, self.p.member_genes[newcomer]['match_wins'] + self.p.member_genes[newcomer]['match_losses'])
+
+        # pairings owed more games get them
+        self.p.games_per_pairing = 2
+        self.p.fitness_test()
+        self.assertEqual(20, matches_played())
+
+        # the fallen's pairings are forgotten
+        self.p.retain_best = 2
+        self.p.cull()
+        self.assertEqual([frozenset(self.p.member_genes.keys())], self.p.pairing_games.keys())
+
+        # without incremental fitness, every pairing is replayed
+        self.p.incremental_fitness = False
+        self.p.fitness_test()
+        self.p.fitness_test()
+        self.assertEqual([2 + 2 * 2], self.p.pairing_games.values())
+
+    def test_deal_pairings(self):
+        a, b, c = self.p.member_genes.keys()[:3]
+        self.assertEqual([(a, b, None)], self.p.deal_pairings([(a, b)]))
+
+        # every pairing plays the bank's deals in turn, each from both seats, in a fixed order of the pair
+        a, b, c = sorted([a, b, c], key=lambda member: list(member.genes))
+        self.assertEqual([(a, b), (b, c)], [seated_pairing(b, a), seated_pairing(c, b)])
+        self.p.deal_bank = DealBank.generate(2, seed=0)
+        deal = self.p.deal_bank.deal
+        self.assertEqual([(a, b, deal(0)), (b, a, deal(0)), (a, b, deal(1)), (b, c, deal(0))],
+                         self.p.deal_pairings([(a, b), (a, b), (a, b), (c, b)]))
+
+        # the order pairings come in doesn't change who sits where, so both seats of a deal get played
+        self.assertEqual([(a, b, deal(0)), (b, a, deal(0))], self.p.deal_pairings([(b, a), (a, b)]))
+        self.assertEqual([(a, b, deal(0)), (b, a, deal(0))], self.p.deal_pairings([(a, b), (b, a)]))
+
+        # incrementally, pairings carry on from the games they've had
+        self.p.pairing_games[pairing_key(a, b)] = 3
+        self.assertEqual([(b, a, deal(1)), (a, b, deal(0))], self.p.deal_pairings([(a, b), (b, a)]))
+        self.p.incremental_fitness = False
+        self.assertEqual([(a, b, deal(0))], self.p.deal_pairings([(b, a)]))
+
+        self.p.swap_seats = False
+        self.assertEqual([(a, b, deal(0)), (a, b, deal(1))], self.p.deal_pairings([(a, b), (a, b)]))
+
+    def test_deal_pairings_across_rounds(self):
+        # a swiss tournament between two members can only rematch them. without incremental fitness, each round
+        # carries on from the deals of the rounds before it rather than replaying the first.
+        p = Population(4000, 2, incremental_fitness=False, scheduler=SwissScheduler(3),
+                       deal_bank=DealBank.generate(2, seed=0))
+        a, b = sorted(p.member_genes.keys(), key=lambda member: list(member.genes))
+        played = []
+        p.play_pairings = lambda pairings: played.extend(pairings) or [(c, d) for c, d, deck_order in pairings]
+
+        for _ in range(2):
+            del played[:]
+            p.fitness_test()
+            deal = p.deal_bank.deal
+            self.assertEqual([(a, b, deal(0)), (b, a, deal(0)), (a, b, deal(1))], played)
+
+    def test_fitness_test_with_deal_bank(self):
+        genomes = [GeneSet(4000).genes for _ in range(3)]
+        bank = DealBank.generate(1, seed=0)
+
+        # dealt the same cards, the same pairings play out the same. only the coin flips that end some games are left
+        # to the random module, and those win no points.
+        tallies = []
+        for seed in (1, 2):
+            p = Population(4000, 0, games_per_pairing=2, deal_bank=bank)
+            for genes in genomes:
+                p.add_member(GeneSet(list(genes)), 0)
+            random.seed(seed)
+            p.fitness_test()
+            self.assertEqual(6, sum(stats['match_wins'] for stats in p.member_genes.values()))
+            tallies.append(sorted((tuple(geneset.genes), stats['game_wins'] - stats['coinflip_game_wins'],
+                                   stats['game_points']) for geneset, stats in p.member_genes.items()))
+        self.assertEqual(tallies[0], tallies[1])
+
+    def test_fitness_test_with_workers(self):
+        genomes = [GeneSet(4000).genes for _ in range(4)]
+
+        # play the same population in this process (batched or not) and with different numbers of workers, from the
+        # same seed
+        tallies = []
+        for workers, batched_inference in ((1, True), (1, False), (2, True), (3, True)):
+            p = Population(4000, 0, workers=workers, batched_inference=batched_inference)
+            for genes in genomes:
+                p.add_member(GeneSet(list(genes)), 0)
+
+            random.seed(7)
+            p.fitness_test()
+            tallies.append(dict((tuple(geneset.genes), stats) for geneset, stats in p.member_genes.items()))
+
+        # every pairing is played once, and the results don't depend on the worker count
+        self.assertEqual(6, sum(stats['match_wins'] for stats in tallies[0].values()))
+        self.assertEqual(6, sum(stats['match_losses'] for stats in tallies[0].values()))
+        for tally in tallies[1:]:
+            self.assertEqual(tallies[0], tally)
+
+    def test_play_genomes(self):
+        genomes = [GeneSet(4000).genes for _ in range(2)]
+
+        # a match is decided by its seed, and doesn't touch the caller's random state
+        state = random.getstate()
+        results = [_play_genomes((genomes[0], genomes[1], 5, None)) for _ in range(2)]
+        self.assertEqual(state, random.getstate())
+        self.assertEqual(results[0], results[1])
+        self.assertIn(results[0]['winner'], (0, 1))
+
+    def test_next_steady_state_pairing(self):
+        members = self.p.member_genes.keys()
+        for member in members[1:]:
+            self.p.member_genes[member]['match_wins'] = 1
+
+        # the least played member plays next, against someone else...
+        for _ in range(10):
+            challenger, defender = self.p.next_steady_state_pairing({})
+            self.assertIs(members[0], challenger)
+            self.assertIsNot(challenger, defender)
+
+        # ...counting matches in flight
+        challenger, defender = self.p.next_steady_state_pairing({members[0]: 2})
+        self.assertIsNot(members[0], challenger)
+
+    def test_breed_steady_state(self):
+        self.p.retain_best = 2
+        members = self.p.member_genes.keys()
+
+        # nobody has proven themselves yet
+        self.assertFalse(self.p.breed_steady_state(100, 3))
+
+        # the best two proven members breed, and the worst proven member makes room
+        for i, member in enumerate(members[:4]):
+            self.p.member_genes[member].update({'match_wins': 3, 'game_wins': 3, 'game_points': 10 * (i + 1)})
+        self.p.pairing_games[pairing_key(members[0], members[1])] = 1
+        self.p.pairing_games[pairing_key(members[1], members[2])] = 1
+        self.assertTrue(self.p.breed_steady_state(100, 3))
+        self.assertEqual(100, len(self.p.member_genes))
+        self.assertNotIn(members[0], self.p.member_genes)
+        for member in members[1:4]:
+            self.assertIn(member, self.p.member_genes)
+
+        # and the culled member's pairings are forgotten
+        self.assertEqual([pairing_key(members[1], members[2])], self.p.pairing_games.keys())
+
+        # the top retain_best and unproven members are spared: with nobody else to cull, nobody is born
+        self.p.member_genes[members[1]]['match_wins'] = 0
+        self.assertFalse(self.p.breed_steady_state(100, 3))
+        self.assertEqual(100, len(self.p.member_genes))
+        self.assertIn(members[3], self.p.member_genes)
+        self.assertIn(members[2], self.p.member_genes)
+
+    def test_breed_steady_state_parents(self):
+        # parents come from any of the best retain_best proven members, not always the best two
+        self.p.retain_best = 3
+        members = self.p.member_genes.keys()
+        parents = []
+        for i, member in enumerate(members[:5]):
+            self.p.member_genes[member].update({'match_wins': 3, 'game_wins': 3, 'game_points': 10 * (i + 1)})
+            member.cross = lambda mate, member=member: parents.append(pairing_key(member, mate)) or GeneSet(100)
+
+        random.seed(0)
+        for _ in range(30):
+            self.assertTrue(self.p.breed_steady_state(1000, 3))
+        self.assertEqual(set(pairing_key(a, b) for a in members[2:5] for b in members[2:5] if a is not b),
+                         set(parents))
+
+    def test_evolve_steady_state(self):
+        for workers in (1, 2):
+            p = Population(4000, 4, retain_best=2, workers=workers)
+            p.evolve_steady_state(16, minimum_matches=2, matches_per_birth=2)
+
+            # members are replaced one at a time, and a generation passes for every four births. births only start
+            # once two members have played their minimum matches.
+            self.assertEqual(4, len(p.member_genes))
+            self.assertIn(p.current_generation, (1, 2))
+            for pairing in p.pairing_games:
+                self.assertTrue(all(member in p.member_genes for member in pairing))
+
     def test_generate_next_generation(self):
         self.gene_size = 4000
         self.initial_population_size = 6
@@ -0,0 +1,279 @@
+import itertools
+import os
+import random
+import shutil
+import tempfile
+from test_helpers import *
+from gindeadwood import *
+import numpy as np
+
+
+# exhaustive reference: enumerate every set and run in the hand, then every combination of non-overlapping melds
+def brute_force_deadwood(cards):
+    melds = []
+    for rank in range(1, 14):
+        same_rank = [c for c in cards if c.rank == rank]
+        for size in (3, 4):
+            for combo in itertools.combinations(same_rank, size):
+                melds.append(frozenset(combo))
+    for suit in Card.all_suits():
+        by_rank = dict((c.rank, c) for c in cards if c.suit == suit)
+        for low in range(1, 12):
+            for high in range(low + 2, 14):
+                if all(r in by_rank for r in range(low, high + 1)):
+                    melds.append(frozenset(by_rank[r] for r in range(low, high + 1)))
+
+    best = [sum(c.point_value for c in cards)]
+
+    def explore(start, used):
+        best[0] = min(best[0], sum(c.point_value for c in cards if c not in used))
+        for i in range(start, len(melds)):
+            if not melds[i] & used:
+                explore(i + 1, used | melds[i])
+
+    explore(0, frozenset())
+    return best[0]
+
+
+class TestGinDeadwood(Helper):
+    # number of random hands per differential test. raise this for a soak run; the suit tables are checked
+    # exhaustively regardless.
+    hand_count = 2000
+
+    def setUp(self):
+        self.deck = [GinCard(rank, suit) for suit in Card.all_suits() for rank in range(1, 14)]
+        self.rng = random.Random(0)
+
+    def assert_matches_reference(self, cards):
+        cg = GinCardGroup(cards)
+        expected = brute_force_deadwood(cards)
+        self.assertEqual(expected, deadwood_count(cg.mask), "hand: %s" % cg)
+        self.assertEqual(expected, cg.deadwood_count(), "hand: %s" % cg)
+
+    def test_suit_tables_exhaustive(self):
+        # compare every rank mask against a straightforward runs-only dynamic program
+        for suit_mask in range(RANK_MASK + 1):
+            best = [0] * 14
+            for rank in range(1, 14):
+                held = suit_mask & (1 << (rank - 1))
+                best[rank] = best[rank - 1] + (POINT_VALUES[rank] if held else 0)
+                low = rank
+                while low >= 1 and suit_mask & (1 << (low - 1)):
+                    if rank - low >= 2:
+                        best[rank] = min(best[rank], best[low - 1])
+                    low -= 1
+            self.assertEqual(best[13], SUIT_DEADWOOD[suit_mask])
+            self.assertEqual(SUIT_MELDS[suit_mask] & ~suit_mask, 0)
+
+    def test_set_options(self):
+        self.assertEqual((), SET_OPTIONS[0b0011])
+        self.assertEqual((0b0111,), SET_OPTIONS[0b0111])
+        self.assertEqual((0b1111, 0b1110, 0b1101, 0b1011, 0b0111), SET_OPTIONS[0b1111])
+
+    def test_known_hands(self):
+        self.assertEqual(5, deadwood_count(self.generate_gincardgroup_from_card_data(self.card_data1).mask))
+        self.assertEqual(0, deadwood_count(self.generate_gincardgroup_from_card_data(self.card_data2).mask))
+        self.assertEqual(26, deadwood_count(self.generate_gincardgroup_from_card_data(self.card_data4).mask))
+
+    def test_differential_random_hands(self):
+        for _ in range(self.hand_count):
+            self.assert_matches_reference(self.rng.sample(self.deck, self.rng.choice([10, 11])))
+
+    def test_differential_dense_hands(self):
+        # hands drawn from a few adjacent ranks are full of overlapping sets and runs
+        low_ranks = [c for c in self.deck if c.rank <= 6]
+        high_ranks = [c for c in self.deck if c.rank >= 8]
+        for _ in range(self.hand_count / 2):
+            self.assert_matches_reference(self.rng.sample(low_ranks, self.rng.choice([10, 11])))
+            self.assert_matches_reference(self.rng.sample(high_ranks, self.rng.choice([10, 11])))
+
+    def test_arrange(self):
+        for _ in range(self.hand_count / 4):
+            cg = GinCardGroup(self.rng.sample(self.deck[:26], 11))
+            deadwood, melds = arrange(cg.mask)
+
+            # melds are disjoint, held, and either a set or a run
+            seen = 0
+            for meld in melds:
+                self.assertEqual(0, meld & seen)
+                self.assertEqual(meld, meld & cg.mask)
+                seen |= meld
+                meld_cards = [c for c in cg.cards if meld & card_bit(c.rank, c.suit)]
+                self.assertGreaterEqual(len(meld_cards), 3)
+                if len(set(c.rank for c in meld_cards)) > 1:
+                    ranks = sorted(c.rank for c in meld_cards)
+                    self.assertEqual(1, len(set(c.suit for c in meld_cards)))
+                    self.assertEqual(range(ranks[0], ranks[-1] + 1), ranks)
+
+            # whatever is left over is the deadwood
+            leftover = sum(c.point_value for c in cg.cards if not seen & card_bit(c.rank, c.suit))
+            self.assertEqual(deadwood, leftover)
+            self.assertEqual((deadwood, seen), evaluate(cg.mask))
+
+    def test_evaluate_many(self):
+        hands = [GinCardGroup(self.rng.sample(self.deck, self.rng.choice([10, 11]))) for _ in range(self.hand_count)]
+        hands += [GinCardGroup(self.rng.sample(self.deck[:24], 11)) for _ in range(self.hand_count / 2)]
+        masks = np.array([cg.mask for cg in hands], dtype=np.uint64)
+
+        deadwood, meld_masks = evaluate_many(masks)
+        self.assertEqual(len(hands), len(deadwood))
+        for i in range(len(hands)):
+            expected_deadwood, expected_melds = evaluate(hands[i].mask)
+            self.assertEqual(expected_deadwood, deadwood[i])
+
+            # ties may pick a different arrangement, but never one leaving other deadwood
+            melded = int(meld_masks[i])
+            self.assertEqual(melded, melded & hands[i].mask)
+            leftover = sum(c.point_value for c in hands[i].cards if not melded & card_bit(c.rank, c.suit))
+            self.assertEqual(expected_deadwood, leftover)
+
+        self.assertEqual(list(deadwood), list(deadwood_count_many(masks)))
+
+    def test_evaluate_many_empty(self):
+        deadwood, meld_masks = evaluate_many(np.array([], dtype=np.uint64))
+        self.assertEqual(0, len(deadwood))
+        self.assertEqual(0, len(meld_masks))
+
+    def test_split_runs(self):
+        # 1c-3c, 5c-9c and Js-Ks
+        runs = split_runs(0b0000111110111 | (0b1110000000000 << 39))
+        self.assertEqual([0b111, 0b111110000, 0b1110000000000 << 39], runs)
+
+
+class TestHandCache(Helper):
+    def setUp(self):
+        self.deck = [GinCard(rank, suit) for suit in Card.all_suits() for rank in range(1, 14)]
+        self.rng = random.Random(1)
+
+    def test_analyze(self):
+        cg = self.generate_gincardgroup_from_card_data(self.card_data1)
+        deadwood, meld_mask, run_mask, set_mask = analyze(cg.mask)
+
+        self.assertEqual((deadwood, meld_mask), evaluate(cg.mask))
+        # 9s-Ks is the only run
+        self.assertEqual(0b1111100000000 << 39, run_mask)
+        # 9c 9h 9s and Kc Kh Ks are the sets
+        expected_sets = GinCardGroup([GinCard(9, 'c'), GinCard(9, 'h'), GinCard(9, 's'),
+                                      GinCard(13, 'c'), GinCard(13, 'h'), GinCard(13, 's')])
+        self.assertEqual(expected_sets.mask, set_mask)
+
+    def test_lookup_counts_hits_and_misses(self):
+        cache = HandCache(maxsize=10)
+        cg = self.generate_gincardgroup_from_card_data(self.card_data1)
+
+        self.assertEqual(analyze(cg.mask), cache.lookup(cg.mask))
+        self.assertEqual(analyze(cg.mask), cache.lookup(cg.mask))
+
+        stats = cache.stats()
+        self.assertEqual(1, stats['hits'])
+        self.assertEqual(1, stats['misses'])
+        self.assertEqual(0, stats['evictions'])
+        self.assertEqual(1, stats['size'])
+
+        cache.clear()
+        self.assertEqual(0, len(cache))
+        self.assertEqual(0, cache.stats()['hits'])
+
+    def test_eviction_policies(self):
+        a, b, c = 0b111, 0b1110, 0b11100
+
+        lru = HandCache(maxsize=2, policy='lru')
+        lru.lookup(a)
+        lru.lookup(b)
+        lru.lookup(a)
+        lru.lookup(c)
+        # b was least recently used
+        self.assertEqual([a, c], list(lru.entries.keys()))
+        self.assertEqual(1, lru.stats()['evictions'])
+
+        fifo = HandCache(maxsize=2, policy='fifo')
+        fifo.lookup(a)
+        fifo.lookup(b)
+        fifo.lookup(a)
+        fifo.lookup(c)
+        # a was inserted first
+        self.assertEqual([b, c], list(fifo.entries.keys()))
+
+        with self.assertRaises(AssertionError):
+            HandCache(policy='random')
+
+    def test_canonical_form(self):
+        for _ in range(200):
+            mask = GinCardGroup(self.rng.sample(self.deck, 10)).mask
+            canonical, order = canonical_form(mask)
+            self.assertEqual(mask, restore_suits(canonical, order))
+            self.assertEqual(popcount(mask), popcount(canonical))
+
+        # permuting suits gives the same canonical mask
+        hearts = GinCardGroup([GinCard(5, 'h'), GinCard(6, 'h'), GinCard(7, 'h'), GinCard(2, 'c')])
+        spades = GinCardGroup([GinCard(5, 's'), GinCard(6, 's'), GinCard(7, 's'), GinCard(2, 'd')])
+        self.assertEqual(canonical_form(hearts.mask)[0], canonical_form(spades.mask)[0])
+
+    def test_canonicalized_lookup(self):
+        cache = HandCache(maxsize=1000, canonicalize=True)
+        for _ in range(500):
+            mask = GinCardGroup(self.rng.sample(self.deck[:30], 10)).mask
+            self.assertEqual(analyze(mask), cache.lookup(mask))
+
+        hearts = GinCardGroup([GinCard(5, 'h'), GinCard(6, 'h'), GinCard(7, 'h'), GinCard(2, 'c')])
+        spades = GinCardGroup([GinCard(5, 's'), GinCard(6, 's'), GinCard(7, 's'), GinCard(2, 'd')])
+        cache.clear()
+        cache.lookup(hearts.mask)
+        self.assertEqual(analyze(spades.mask), cache.lookup(spades.mask))
+        self.assertEqual(1, cache.stats()['hits'])
+
+    def test_configure_hand_cache(self):
+        import gindeadwood
+        original = gindeadwood.hand_cache
+        try:
+            cache = configure_hand_cache(maxsize=5, policy='fifo', canonicalize=True)
+            self.assertIs(cache, gindeadwood.hand_cache)
+
+            # GinCardGroup goes through the shared cache
+            cg = self.generate_gincardgroup_from_card_data(self.card_data1)
+            cg.deadwood_count()
+            cg.deadwood_cards()
+            self.assertEqual(1, cache.stats()['misses'])
+            self.assertEqual(1, cache.stats()['hits'])
+        finally:
+            gindeadwood.hand_cache = original
+
+
+class TestSuitTableFile(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'suit_table.npy')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_save_and_load(self):
+        save_suit_table(self.path)
+        self.assertFalse(os.path.exists(self.path + '.tmp'))
+
+        table = load_suit_table(self.path)
+        self.assertIsInstance(table, np.memmap)
+        self.assertTrue(verify_suit_table(table))
+        self.assertEqual(SUIT_DEADWOOD.tolist(), table[0].tolist())
+        self.assertEqual(SUIT_MELDS.tolist(), table[1].tolist())
+
+    def test_load_rejects_other_files(self):
+        np.save(self.path, np.zeros((3, 3)))
+        with self.assertRaises(ValueError):
+            load_suit_table(self.path)
+
+        # right shape, wrong contents
+        np.save(self.path, np.zeros((2, RANK_MASK + 1), dtype=np.int64))
+        with self.assertRaises(ValueError):
+            load_suit_table(self.path)
+
+        # initial_suit_table() falls back to building the table
+        self.assertTrue(verify_suit_table(initial_suit_table(self.path)))
+
+    def test_verify_detects_corruption(self):
+        table = build_suit_table()
+        table[0, 0b1011] += 1
+        self.assertFalse(verify_suit_table(table))
+
+    def test_initial_suit_table_without_file(self):
+        self.assertTrue(verify_suit_table(initial_suit_table(os.path.join(self.directory, 'missing.npy'))))
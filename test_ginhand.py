@@ -1,4 +1,5 @@
 import random
+from random import shuffle
 from test_helpers import *
 from ginhand import *
 
@@ -80,6 +81,13 @@ class TestGinCardGroup(Helper):
         cg.add_card(next_card)
         self.assertEqual(next_card, cg.cards[3])
 
+    def test_add_card_twice(self):
+        cg = GinCardGroup()
+        cg.add_card(GinCard(7, 'h'))
+        self.assertRaises(AssertionError, cg.add_card, GinCard(7, 'h'))
+        self.assertEqual(1, len(cg.cards))
+        self.assertEqual(1, popcount(cg.mask))
+
     def test_discard(self):
         g = GinCardGroup()
         gc = GinCard(5, 'c')
@@ -188,6 +196,37 @@ class TestGinCardGroup(Helper):
         self.assertEqual(True, cg.contains(5, 'c'))
         self.assertEqual(False, cg.contains(5, 'd'))
 
+    def test_mask(self):
+        cg = GinCardGroup()
+        self.assertEqual(0, cg.mask)
+
+        # bits follow Card.ranking(): Ac is bit 0, Ks is bit 51
+        cg.add_card(GinCard(1, 'c'))
+        cg.add_card(GinCard(13, 's'))
+        self.assertEqual((1 << 0) | (1 << 51), cg.mask)
+
+        cg.discard(GinCard(1, 'c'))
+        self.assertEqual(1 << 51, cg.mask)
+        self.assertFalse(cg.contains(1, 'c'))
+
+        # masks match for any card order
+        cg1 = self.generate_gincardgroup_from_card_data(self.card_data1)
+        cg2 = self.generate_gincardgroup_from_card_data(list(reversed(self.card_data1)))
+        self.assertEqual(cg1.mask, cg2.mask)
+        self.assertEqual(10, popcount(cg1.mask))
+
+        # memoized() keys card groups on their mask
+        self.assertEqual(cg1.mask, cg1.__memo_key__())
+
+    def test_suit_mask(self):
+        cg = self.generate_gincardgroup_from_card_data(self.card_data1)
+
+        # 9s, 10s, Js, Qs, Ks
+        self.assertEqual(0b1111100000000, cg.suit_mask('s'))
+        # 5c, 9c, Kc
+        self.assertEqual(0b1000100010000, cg.suit_mask('c'))
+        self.assertEqual(0, cg.suit_mask('d'))
+
     def test_contains_card(self):
         cg = self.generate_gincardgroup_from_card_data(self.card_data1)
         card_yes = GinCard(5, 'c')
@@ -471,6 +510,36 @@ class TestGinCardGroup(Helper):
         g4 = self.generate_ginhand_from_card_data(self.card_data4)
         self.assertEqual(26, g4.deadwood_count())
 
+    def test_arrange_melds(self):
+        g = self.generate_ginhand_from_card_data(self.card_data4)
+        melds = g.arrange_melds()
+
+        # 2c 2d 2h and 3c 4c 5c, leaving 3h 3s Js Kh as deadwood
+        expected_melds = self.build_meldgroup_list_from_data([[(2, 'c'), (2, 'd'), (2, 'h')],
+                                                              [(3, 'c'), (4, 'c'), (5, 'c')]])
+        self.compare_arrays_of_cardgroups(expected_melds, melds)
+
+    def test_deadwood_count_many(self):
+        hands = [self.generate_ginhand_from_card_data(data)
+                 for data in (self.card_data1, self.card_data2, self.card_data4, self.card_data5)]
+
+        deadwood, meld_masks = GinCardGroup.deadwood_count_many(hands)
+        self.assertEqual([h.deadwood_count() for h in hands], list(deadwood))
+
+        # masks work just as well as card groups
+        deadwood, meld_masks = GinCardGroup.deadwood_count_many([h.mask for h in hands])
+        self.assertEqual([h.deadwood_count() for h in hands], list(deadwood))
+
+    def test_deadwood_after_each_discard(self):
+        g = self.generate_ginhand_from_card_data(self.card_data1)
+        g.add_card(GinCard(13, 'd'))
+
+        expected = []
+        for c in g.cards:
+            candidate = GinCardGroup([x for x in g.cards if x is not c])
+            expected.append(candidate.deadwood_count())
+        self.assertEqual(expected, g.deadwood_after_each_discard())
+
     def test__examine_melds(self):
         # empty hand = 0 deadwood
         empty_hand = GinCardGroup()
@@ -526,4 +595,14 @@ class TestGinHand(Helper):
         gh_layer.process_layoff(gh_winner)
 
         # we lay off our 2d, 4c, 8c, and 9h. this gives us an expected deadwood count of 14
-        self.assertEqual(gh_layer.deadwood_count(), 14)
\ No newline at end of file
+        self.assertEqual(gh_layer.deadwood_count(), 14)
+
+    def test_process_layoff_connected_cards(self):
+        # we hold 4c5c, the knocker holds Ac2c3c. the 5c lays off once the 4c has.
+        gh_layer = self.generate_ginhand_from_card_data([(4, 'c'), (5, 'c'), (9, 'd')])
+        gh_winner = self.generate_ginhand_from_card_data([(1, 'c'), (2, 'c'), (3, 'c')])
+
+        gh_layer.process_layoff(gh_winner)
+
+        self.assertEqual(1, gh_layer.size())
+        self.assertTrue(gh_layer.contains(9, 'd'))
@@ -1,6 +1,9 @@
 from ginmatch import *
 from test_helpers import *
 from test_ginstrategy import MockGinStrategy
+from genetic_algorithm import GeneSet
+from neuralnet import *
+from ginstrategy import NeuralGinStrategy
 
 
 # noinspection PyProtectedMember
@@ -176,6 +179,54 @@ class TestGinMatch(Helper):
         # use an xor to ensure we only had one knock
         self.assertTrue(someone_knocked ^ someone_knocked_gin)
 
+    def test_run_steps(self):
+        # the steps of a match are the decisions its players face: two at the start of a turn, one holding 11 cards
+        strat_code = {'start': ['DRAW'], 'end': ['DISCARD', 0]}
+        self.p1.strategy = MockGinStrategy(strat_code)
+        self.p2.strategy = MockGinStrategy(strat_code)
+
+        steps = []
+        for player, phase in self.gm.run_steps():
+            steps.append((player, phase))
+            player.consult_strategy(phase)
+
+        self.assertEqual((self.p1, 'end'), steps[0])
+        self.assertEqual([(self.p2, 'start'), (self.p2, 'end'), (self.p1, 'start')], steps[1:4])
+        self.assertEqual(1, self.gm.p1_games_won + self.gm.p2_games_won)
+        self.assertEqual(1, self.gm.match_result()['winner_games_won'])
+
+    def test_run_in_lockstep(self):
+        random.seed(11)
+        weightsets = [WeightSet(GeneSet(4000), 49, 35, 4) for _ in range(3)]
+        stack = GinStackedNeuralNet(weightsets, [11, 33, 5])
+
+        matches = []
+        for challenger, defender in [(0, 1), (0, 2), (1, 2)]:
+            p1, p2 = GinPlayer(), GinPlayer()
+            match = GinMatch(p1, p2)
+            for player, opponent, member in [(p1, p2, challenger), (p2, p1, defender)]:
+                observers = [Observer(player), Observer(match.table), Observer(match)]
+                nn = MemberNeuralNet(stack, member, observers)
+                player.strategy = NeuralGinStrategy(player, opponent, match, nn)
+            matches.append(match)
+
+        # each batched decision must be the one the player's own strategy would have made alone
+        batch_sizes = []
+
+        def decide(requests):
+            batch_sizes.append(len(requests))
+            NeuralGinStrategy.decide_in_batch(requests)
+            for player, phase in requests:
+                self.assertEqual(player.action, player.strategy.determine_best_action(phase))
+
+        results = GinMatch.run_in_lockstep(matches, decide)
+
+        self.assertEqual(3, max(batch_sizes))
+        self.assertEqual(3, len(results))
+        for match, result in zip(matches, results):
+            self.assertIn(result['winner'], (match.p1, match.p2))
+            self.assertEqual(1, result['winner_games_won'])
+
     def test_end_with_knock_invalid(self):
         # morbidly awful hand with deadwood = 55
         self.p1.hand = self.generate_ginhand_from_card_data(self.awful_hand_data)
@@ -1,4 +1,6 @@
 from gintable import *
+import numpy as np
+import random
 import unittest
 
 
@@ -66,6 +68,55 @@ class TestGinTable(unittest.TestCase):
         self.assertTrue(min(found.keys()) >= 0)
         self.assertTrue(max(found.keys()) <= 52)
 
+    def test_organize_data_cache(self):
+        # the data is built once per version of the table
+        data = self.t.organize_data()
+        self.assertIs(data, self.t.organize_data())
+
+        card = self.t.deal_a_card()
+        self.t.add_card_to_discard_pile(card)
+        self.assertIsNot(data, self.t.organize_data())
+        self.assertEqual(card.ranking(), self.t.organize_data()[0])
+        self.assertEqual(self.t.build_organized_data(), self.t.organize_data())
+
+    # organize_data() as it used to be built: from scratch, starting from the deck height
+    @staticmethod
+    def reference_data(table):
+        data = {0: len(table.deck.cards)}
+        for i in range(len(table.discard_pile)):
+            data[i] = table.discard_pile[i].ranking()
+        discard_size = len(table.discard_pile)
+        for i in range(1, discard_size):
+            data[i] = table.discard_pile[i-1].ranking()
+        for i in range(discard_size, 1+32):
+            data[i] = 0
+        return data
+
+    def test_discard_features(self):
+        # discards and pickups are encoded in place, and agree with building the data from scratch
+        random.seed(7)
+        for step in range(200):
+            if self.t.discard_pile and random.random() < 0.4:
+                self.t.pickup_from_discard_pile()
+            elif len(self.t.deck.cards) > 2:
+                self.t.add_card_to_discard_pile(self.t.deal_a_card())
+            else:
+                self.t.refresh_deck()
+            self.assertEqual(TestGinTable.reference_data(self.t), self.t.organize_data())
+            self.assertEqual(len(self.t.discard_pile), self.t._encoded_height)
+
+        # refreshing the deck clears the pile's encoding
+        self.t.add_card_to_discard_pile(self.t.deal_a_card())
+        self.t.refresh_deck()
+        self.assertEqual([0] * 33, self.t.discard_features)
+
+        # a pile changed behind our back is encoded from scratch
+        self.t.discard_pile.append(self.t.deck.cards.pop())
+        self.t.discard_pile.append(self.t.deck.cards.pop())
+        out = np.zeros(33)
+        self.t.write_features(out)
+        self.assertEqual([self.t.discard_pile[0].ranking()] * 2 + [0] * 31, list(out))
+
     def test_deal_a_card(self):
         card = self.t.deal_a_card()
         self.assertIsInstance(card, GinCard)
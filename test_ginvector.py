@@ -0,0 +1,213 @@
+from ginvector import *
+from ginmatch import *
+from neuralnet import *
+from ginstrategy import NeuralGinStrategy
+from genetic_algorithm import GeneSet
+from test_helpers import *
+import numpy as np
+import random
+
+
+# always draw, then act on the given end action with the given card index
+def scripted_policy(end_action, index=0, accept=False):
+    def decide(batch, games, seats, phase):
+        if phase == 'accept':
+            return np.full(len(games), accept, dtype=bool)
+        elif phase == 'start':
+            return np.full(len(games), DRAW), np.zeros(len(games), dtype=np.int64)
+        else:
+            return np.full(len(games), end_action), np.full(len(games), index, dtype=np.int64)
+    return decide
+
+
+class TestGinMatchBatch(Helper):
+
+    awful_hand_data = [(1, 'd'), (2, 'c'), (3, 'd'), (4, 'c'), (5, 'c'),
+                       (6, 'd'), (7, 'c'), (8, 'd'), (9, 'c'), (10, 'd')]
+
+    knock_worthy_hand_data = [(1, 'd'), (2, 'c'), (3, 'c'), (4, 'c'), (5, 'c'),
+                              (6, 'c'), (7, 'c'), (8, 'c'), (9, 'c'), (10, 'c')]
+
+    gin_worthy_hand_data = [(1, 'c'), (2, 'c'), (3, 'c'), (4, 'c'), (5, 'c'),
+                            (6, 'c'), (7, 'c'), (8, 'c'), (9, 'c'), (10, 'c')]
+
+    def setUp(self):
+        self.batch = GinMatchBatch(4, seed=0)
+
+    # give both players of game 0 the hands described by card data, as if a knock had just been made
+    def set_hands(self, p1_data, p2_data):
+        self.batch.hands[0] = [self.generate_ginhand_from_card_data(p1_data).mask,
+                               self.generate_ginhand_from_card_data(p2_data).mask]
+        self.batch.hand_size[0] = [len(p1_data), len(p2_data)]
+
+    # copy a deck of the batch into a GinMatch
+    @staticmethod
+    def match_with_deck(deck, player1, player2):
+        return GinMatch(player1, player2, deck)
+
+    def test___init__(self):
+        self.assertEqual((4, 52), self.batch.deck.shape)
+        for deck in self.batch.deck:
+            self.assertEqual(range(52), sorted(deck))
+
+        # decks may be given, but there must be one per game
+        decks = np.tile(np.arange(52), (2, 1))
+        self.assertEqual(list(decks[1]), list(GinMatchBatch(2, decks=decks).deck[1]))
+        self.assertRaises(AssertionError, GinMatchBatch, 3, decks)
+        self.assertRaises(AssertionError, GinMatchBatch, 0)
+
+    def test_hand_rankings(self):
+        hand = self.generate_ginhand_from_card_data(self.awful_hand_data)
+        rankings = hand_rankings([hand.mask, 0])
+        self.assertEqual([c.ranking() for c in hand.cards] + [0], list(rankings[0]))
+        self.assertEqual([0] * 11, list(rankings[1]))
+
+    def test_deal_cards(self):
+        self.batch.deal_cards()
+        self.assertEqual([[11, 10]] * 4, self.batch.hand_size.tolist())
+        self.assertEqual([31] * 4, list(self.batch.deck_height))
+
+        # we deal exactly as GinMatch does
+        p1, p2 = GinPlayer(), GinPlayer()
+        match = TestGinMatchBatch.match_with_deck(self.batch.deck[2], p1, p2)
+        match.deal_cards()
+        self.assertEqual([p1.hand.mask, p2.hand.mask], list(self.batch.hands[2]))
+
+    def test_discard_card(self):
+        self.batch.deal_cards()
+        games, seats = np.arange(4), np.zeros(4, dtype=np.int64)
+        before = hand_rankings(self.batch.hands[:, 0])
+        self.batch.discard_card(games, seats, [0, 3, 10, 5])
+
+        self.assertEqual([10] * 4, list(self.batch.hand_size[:, 0]))
+        self.assertEqual([1] * 4, list(self.batch.discard_height))
+        for game, index in enumerate([0, 3, 10, 5]):
+            self.assertEqual(before[game][index] - 1, self.batch.discard_pile[game][0])
+            self.assertEqual(0, self.batch.hands[game, 0] & (1 << int(before[game][index] - 1)))
+
+    def test_observe(self):
+        # the observed data must match what a GinNeuralNet's observers see, before and after some play
+        p1, p2 = GinPlayer(), GinPlayer()
+        match = TestGinMatchBatch.match_with_deck(self.batch.deck[1], p1, p2)
+        observers = [Observer(p2), Observer(match.table), Observer(match)]
+        match.deal_cards()
+        self.batch.deal_cards()
+
+        for turn in range(4):
+            expected = [observer.get_value_by_index(i) for observer in observers for i in range(observer.width)]
+            self.assertEqual(expected, list(self.batch.observe(np.array([1]), np.array([1]))[0]))
+
+            p1.discard_card(p1.hand.cards[turn])
+            self.batch.discard_card(np.array([1]), np.array([0]), [turn])
+            p1.draw()
+            self.batch.draw(np.array([1]), np.array([0]))
+
+    def test_coinflip_endings(self):
+        # if nobody ever knocks, every game ends by coin flip once the stock runs low
+        results = self.batch.run(scripted_policy(DISCARD))
+        self.assertTrue(self.batch.gameover.all())
+        self.assertTrue((self.batch.deck_height <= 2).all())
+        for result in results:
+            self.assertEqual(1, result['winner_games_won_by_coinflip'])
+            self.assertEqual(0, result['winner_point_delta'])
+            self.assertIn(result['winner'], (1, 2))
+
+        # ...or the turn limit is reached
+        batch = GinMatchBatch(4, seed=0, maximum_turns=6)
+        batch.run(scripted_policy(DISCARD))
+        self.assertEqual([6] * 4, list(batch.turns_taken))
+        self.assertTrue((batch.player_who_won_coinflip != 0).all())
+
+    def test_process_knock(self):
+        games, knockers = np.array([0]), np.array([1])
+        decide = scripted_policy(KNOCK)
+
+        # valid knocks end the game
+        self.set_hands(self.awful_hand_data, self.knock_worthy_hand_data)
+        self.batch.process_knock(games, knockers, decide)
+        self.assertTrue(self.batch.gameover[0])
+        self.assertEqual(2, self.batch.player_who_knocked[0])
+
+        # knocks with no deadwood are gins
+        self.batch.gameover[0] = False
+        self.set_hands(self.awful_hand_data, self.gin_worthy_hand_data)
+        self.batch.process_knock(games, knockers, decide)
+        self.assertTrue(self.batch.gameover[0])
+        self.assertEqual(0, self.batch.player_who_knocked[0])
+        self.assertEqual(2, self.batch.player_who_knocked_gin[0])
+
+    def test_improper_knock(self):
+        games, knockers = np.array([0]), np.array([0])
+
+        # an improper knock is exposed, and the game goes on if the opponent declines...
+        self.set_hands(self.awful_hand_data, self.knock_worthy_hand_data)
+        self.batch.process_knock(games, knockers, scripted_policy(KNOCK, accept=False))
+        self.assertTrue(self.batch.knocked_improperly[0, 0])
+        self.assertFalse(self.batch.gameover[0])
+
+        # ...or ends if the opponent accepts
+        self.batch.process_knock_gin(games, knockers, scripted_policy(KNOCK, accept=True))
+        self.assertTrue(self.batch.gameover[0])
+
+        # opponents without a knock-worthy hand get no option
+        self.batch.gameover[0] = False
+        self.set_hands(self.awful_hand_data, self.awful_hand_data)
+        self.batch.process_knock(games, knockers, scripted_policy(KNOCK, accept=True))
+        self.assertFalse(self.batch.gameover[0])
+
+    def test_update_score(self):
+        # gin: the defender's deadwood plus 25
+        self.set_hands(self.awful_hand_data, self.gin_worthy_hand_data)
+        self.batch.player_who_knocked_gin[0] = 2
+        self.batch.update_score(np.array([0]))
+        self.assertEqual([0, 55 + 25], list(self.batch.score[0]))
+
+        # knock: the deadwood difference
+        self.batch.score[0] = 0
+        self.batch.player_who_knocked_gin[0] = 0
+        self.set_hands(self.awful_hand_data, self.knock_worthy_hand_data)
+        self.batch.player_who_knocked[0] = 2
+        self.batch.update_score(np.array([0]))
+        self.assertEqual([0, 54], list(self.batch.score[0]))
+
+        # undercut: the deadwood difference plus 25, to the defender
+        self.batch.score[0] = 0
+        self.set_hands(self.knock_worthy_hand_data, self.gin_worthy_hand_data)
+        self.batch.player_who_knocked[0] = 1
+        self.batch.update_score(np.array([0]))
+        self.assertEqual([0, 1 + 25], list(self.batch.score[0]))
+
+    def test_matches_ginmatch(self):
+        # play the same decks with the same networks through GinMatch and compare every game that didn't end in a
+        # coin flip (GinMatch flips its coins with the random module)
+        random.seed(1)
+        game_count = 40
+        weightsets = [WeightSet(GeneSet([3 * gene for gene in GeneSet(4000).genes]), 49, 35, 4) for _ in range(4)]
+        stack = GinStackedNeuralNet(weightsets, [11, 33, 5])
+        members = np.random.RandomState(2).randint(0, 4, size=(game_count, 2))
+
+        batch = GinMatchBatch(game_count, seed=3)
+        results = batch.run(NeuralBatchPolicy(stack, members))
+
+        compared = 0
+        for game in range(game_count):
+            p1, p2 = GinPlayer(), GinPlayer()
+            match = TestGinMatchBatch.match_with_deck(batch.deck[game], p1, p2)
+            for player, opponent, member in [(p1, p2, members[game][0]), (p2, p1, members[game][1])]:
+                observers = [Observer(player), Observer(match.table), Observer(match)]
+                nn = GinMatrixNeuralNet(observers, weightsets[member])
+                player.strategy = NeuralGinStrategy(player, opponent, match, nn)
+            expected = match.run()
+
+            self.assertEqual(match.turns_taken, batch.turns_taken[game])
+            self.assertEqual([match.p1_knocked_improperly, match.p2_knocked_improperly],
+                             list(batch.knocked_improperly[game]))
+            if match.p1_wins_by_coinflip + match.p2_wins_by_coinflip == 0:
+                expected['winner'] = 1 if expected['winner'] is p1 else 2
+                expected['loser'] = 1 if expected['loser'] is p1 else 2
+                self.assertEqual(expected, results[game])
+                compared += 1
+            else:
+                self.assertNotEqual(0, batch.player_who_won_coinflip[game])
+
+        self.assertGreater(compared, 0)
@@ -0,0 +1,64 @@
+import unittest
+from islands import *
+import Queue
+import os
+
+
+class TestArchipelago(unittest.TestCase):
+    def setUp(self):
+        self.storage = '/tmp/test_islands.ckpt'
+        self.archipelago = Archipelago(2, 4000, 3, retain_best=2, migration_interval=1, local_storage=self.storage,
+                                       seed=0)
+        self.remove_checkpoints()
+
+    def tearDown(self):
+        self.remove_checkpoints()
+
+    def remove_checkpoints(self):
+        for island in range(2):
+            for suffix in ('', '.tally'):
+                if os.path.exists(self.archipelago.island_storage(island) + suffix):
+                    os.remove(self.archipelago.island_storage(island) + suffix)
+
+    def test_island_storage(self):
+        self.assertEqual('/tmp/test_islands.ckpt.island1', self.archipelago.island_storage(1))
+        self.assertIsNone(Archipelago(2, 10, 3).island_storage(1))
+
+    def test_migrate(self):
+        sender = Population(10, 3)
+        receiver = Population(10, 3)
+        channel = Queue.Queue()
+        best = sender.get_top_members(1)[0]
+
+        # the sender's best is copied to the receiver, as a newborn
+        self.archipelago.migrate(sender, Queue.Queue(), channel)
+        self.archipelago.migrate(receiver, channel, Queue.Queue())
+        self.assertEqual(3, len(sender.member_genes))
+        self.assertEqual(4, len(receiver.member_genes))
+        migrant = [geneset for geneset in receiver.member_genes if list(geneset.genes) == list(best.genes)][0]
+        self.assertIsNot(best, migrant)
+        self.assertEqual(0, receiver.member_genes[migrant]['match_wins'])
+
+    def test_evolve(self):
+        population = self.archipelago.make_population(0)
+        inbox, outbox = Queue.Queue(), Queue.Queue()
+        self.archipelago.evolve(population, 2, inbox, outbox)
+
+        # we migrate each generation, and checkpoint at the end
+        self.assertEqual(2, outbox.qsize())
+        self.assertEqual(2, self.archipelago.make_population(0).current_generation)
+
+    def test_run(self):
+        results = self.archipelago.run(2)
+        for generation, genomes in results:
+            self.assertEqual(2, generation)
+            self.assertEqual(2, len(genomes))
+            self.assertEqual(4000, len(genomes[0]))
+
+        # islands carry on from their checkpoints
+        results = self.archipelago.run(1)
+        self.assertEqual([3, 3], [generation for generation, genomes in results])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -3,7 +3,10 @@ from neuralnet import *
 from observer import *
 from ginplayer import *
 from gintable import *
-from genetic_algorithm import GeneSet, GinGeneSet
+from ginmatch import *
+from genetic_algorithm import GeneSet, GinGeneSet, ArrayGeneSet
+import numpy as np
+import random
 
 
 # noinspection PyMissingConstructor
@@ -234,6 +237,154 @@ class TestGinNeuralNet(unittest.TestCase):
         self.assertEqual(len(self.gnn.outputs), len(self.output_keys))
 
 
+class TestMatrixNeuralNet(unittest.TestCase):
+    def setUp(self):
+        random.seed(3)
+        self.p1 = GinPlayer()
+        self.p2 = GinPlayer()
+        self.match = GinMatch(self.p1, self.p2)
+        self.match.deal_cards()
+
+        self.num_inputs = 11 + 33 + 5
+        self.num_outputs = 4
+        self.num_hidden = int((self.num_inputs + self.num_outputs) * (2.0 / 3.0))
+        self.weightset = WeightSet(GeneSet(4000), self.num_inputs, self.num_hidden, self.num_outputs)
+
+        self.observers = [Observer(self.p1), Observer(self.match.table), Observer(self.match)]
+
+    def assert_matches_reference(self, mnn):
+        # the Perceptron graph caches its outputs after one pulse, so build a fresh reference for each comparison
+        reference = GinNeuralNet(self.observers, self.weightset)
+        reference.pulse()
+        mnn.pulse()
+
+        self.assertEqual(sorted(reference.outputs.keys()), sorted(mnn.outputs.keys()))
+        for key in reference.outputs:
+            self.assertAlmostEqual(reference.outputs[key], mnn.outputs[key], 10)
+
+    def test___init__(self):
+        mnn = GinMatrixNeuralNet(self.observers, self.weightset)
+        self.assertEqual((self.num_hidden, self.num_inputs), mnn.hidden_weights.shape)
+        self.assertEqual((self.num_hidden, self.num_hidden), mnn.jidden_weights.shape)
+        self.assertEqual((self.num_outputs, self.num_hidden), mnn.output_weights.shape)
+        self.assertEqual(self.num_inputs, len(mnn.input_weights))
+
+        # require at least one observer, one weight and one output
+        invalid_weightset = WeightSet(GeneSet(400), 11, 9, 3)
+        invalid_weightset.weights = {}
+        self.assertRaises(AssertionError, MatrixNeuralNet, [], self.weightset, ['index'])
+        self.assertRaises(AssertionError, MatrixNeuralNet, self.observers, invalid_weightset, ['index'])
+        self.assertRaises(AssertionError, MatrixNeuralNet, self.observers, self.weightset, [])
+
+    def test_sigmoid(self):
+        values = np.array([-150, -100.5, -10, -1, 0, 1, 10, 100.5, 150], dtype=np.float64)
+        expected = [Perceptron.sigmoid(v) for v in values]
+        self.assertEqual(expected, list(MatrixNeuralNet.sigmoid(values)))
+
+    def test_pulse_matches_reference(self):
+        mnn = GinMatrixNeuralNet(self.observers, self.weightset)
+        self.assert_matches_reference(mnn)
+
+        # play a few turns by hand and compare again after each state change
+        for _ in range(5):
+            self.p1.discard_card(self.p1.hand.cards[0])
+            self.p1.draw()
+            self.assert_matches_reference(mnn)
+
+    def test_pulse_from_feature_vector(self):
+        # pulling from a FeatureVector must give what the pushed-to observers give
+        mnn = GinMatrixNeuralNet(FeatureVector([self.p1, self.match.table, self.match]), self.weightset)
+        self.assertEqual(self.num_inputs, mnn.input_count)
+        self.assert_matches_reference(mnn)
+
+        for _ in range(5):
+            self.p1.discard_card(self.p1.hand.cards[0])
+            self.p1.draw()
+            self.assert_matches_reference(mnn)
+
+    def test_pulse_from_lazy_observers(self):
+        lazy_observers = [Observer(self.p1, lazy=True), Observer(self.match.table, lazy=True),
+                          Observer(self.match, lazy=True)]
+        mnn = GinMatrixNeuralNet(lazy_observers, self.weightset)
+        self.assert_matches_reference(mnn)
+
+        for _ in range(5):
+            self.p1.discard_card(self.p1.hand.cards[0])
+            self.p1.draw()
+            self.assert_matches_reference(mnn)
+
+    def test_pulse_tracks_state(self):
+        mnn = GinMatrixNeuralNet(self.observers, self.weightset)
+        mnn.pulse()
+        before = dict(mnn.outputs)
+
+        # a different hand should give different outputs on the next pulse
+        self.p1.discard_card(self.p1.hand.cards[0])
+        self.p1.discard_card(self.p1.hand.cards[0])
+        self.p1.draw()
+        self.p1.draw()
+        mnn.pulse()
+        self.assertNotEqual(before, mnn.outputs)
+
+
+class TestStackedNeuralNet(unittest.TestCase):
+    def setUp(self):
+        random.seed(5)
+        self.p1 = GinPlayer()
+        self.p2 = GinPlayer()
+        self.match = GinMatch(self.p1, self.p2)
+        self.match.deal_cards()
+
+        self.num_inputs = 11 + 33 + 5
+        self.num_outputs = 4
+        self.num_hidden = int((self.num_inputs + self.num_outputs) * (2.0 / 3.0))
+        self.weightsets = [WeightSet(GeneSet(4000), self.num_inputs, self.num_hidden, self.num_outputs)
+                           for _ in range(4)]
+        self.stack = GinStackedNeuralNet(self.weightsets, [11, 33, 5])
+
+        self.observers = [Observer(self.p1), Observer(self.match.table), Observer(self.match)]
+
+    def test___init__(self):
+        self.assertEqual(4, len(self.stack))
+        self.assertEqual((4, self.num_inputs), self.stack.input_weights.shape)
+        self.assertEqual((4, self.num_hidden, self.num_inputs), self.stack.hidden_weights.shape)
+        self.assertEqual((4, self.num_hidden, self.num_hidden), self.stack.jidden_weights.shape)
+        self.assertEqual((4, self.num_outputs, self.num_hidden), self.stack.output_weights.shape)
+
+        # require at least one weightset, input and output, and weights that fit the shape
+        self.assertRaises(AssertionError, StackedNeuralNet, [], [11, 33, 5], ['index'])
+        self.assertRaises(AssertionError, StackedNeuralNet, self.weightsets, [], ['index'])
+        self.assertRaises(AssertionError, StackedNeuralNet, self.weightsets, [11, 33, 5], [])
+        self.assertRaises(AssertionError, GinStackedNeuralNet, self.weightsets, [11, 33, 6])
+
+    def test_forward_matches_matrix_net(self):
+        reference_nets = [GinMatrixNeuralNet(self.observers, weightset) for weightset in self.weightsets]
+        inputs = reference_nets[0].sense().copy()
+
+        # evaluate every member, some twice, in one pass
+        members = [3, 0, 2, 1, 3]
+        outputs = self.stack.forward(members, [inputs] * len(members))
+        self.assertEqual((len(members), self.num_outputs), outputs.shape)
+        for row in range(len(members)):
+            expected = reference_nets[members[row]].forward(inputs)
+            for i in range(self.num_outputs):
+                self.assertAlmostEqual(expected[i], outputs[row][i], 12)
+
+    def test_member_pulse(self):
+        for member in range(len(self.stack)):
+            mnn = MemberNeuralNet(self.stack, member, self.observers)
+            reference = GinMatrixNeuralNet(self.observers, self.weightsets[member])
+            mnn.pulse()
+            reference.pulse()
+            self.assertEqual(reference.output_keys, mnn.output_keys)
+            for key in reference.outputs:
+                self.assertAlmostEqual(reference.outputs[key], mnn.outputs[key], 12)
+
+        # members must exist and observers must match the stacked input layout
+        self.assertRaises(AssertionError, MemberNeuralNet, self.stack, 4, self.observers)
+        self.assertRaises(AssertionError, MemberNeuralNet, self.stack, 0, self.observers[:2])
+
+
 class TestPerceptron(unittest.TestCase):
     def setUp(self):
         self.p1 = Perceptron(myid='self.p1')
@@ -439,6 +590,32 @@ class TestWeightSet(unittest.TestCase):
         self.assertGreaterEqual(len(w.weights['jidden'][0]), num_inputs)
         self.assertGreaterEqual(len(w.weights['output'][0]), num_hidden)
 
+    def test_array_views(self):
+        num_inputs = 10
+        num_hidden = 15
+        num_outputs = 3
+        gs = ArrayGeneSet(1000)
+        w = WeightSet(gs, num_inputs, num_hidden, num_outputs)
+
+        # each layer is a view onto the genome, laid out as for list genomes
+        expected = WeightSet(GeneSet(list(gs.genes)), num_inputs, num_hidden, num_outputs).weights
+        shapes = {'input': (num_inputs,), 'hidden': (num_hidden, num_inputs), 'jidden': (num_hidden, num_hidden),
+                  'output': (num_outputs, num_hidden)}
+        for layer in shapes:
+            self.assertEqual(shapes[layer], w.weights[layer].shape)
+            self.assertTrue(np.shares_memory(gs.genes, w.weights[layer]))
+            self.assertTrue(np.array_equal(expected[layer], w.weights[layer]))
+
+        gs.genes[num_inputs] = 42.0
+        self.assertEqual(42.0, w.weights['hidden'][0][0])
+
+        # views validate and prune like lists
+        self.assertTrue(w.validate(num_inputs, num_hidden, num_outputs))
+        w.prune(num_inputs, num_hidden, num_outputs)
+        self.assertTrue(w.validate(num_inputs, num_hidden, num_outputs))
+        with self.assertRaises(AssertionError):
+            w.validate(num_inputs + 1, num_hidden, num_outputs)
+
     def test_prune(self):
         num_inputs = 10
         num_hidden = 15
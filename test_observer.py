@@ -49,6 +49,21 @@ class TestObservable(unittest.TestCase):
         self.assertIn(self.c1.ranking(), self.mobs.buffer.values())
         self.assertIn(self.c2.ranking(), self.mobs.buffer.values())
 
+    def test_version(self):
+        # every change, notified or not, moves the version on
+        version = self.p.version
+        self.p._add_card(self.c1)
+        self.assertEqual(version + 1, self.p.version)
+        self.p._add_card(self.c2)
+        self.p.empty_hand()
+        self.assertEqual(version + 3, self.p.version)
+
+        # and cached exports are rebuilt once per version
+        data = self.p.exported_data()
+        self.assertIs(data, self.p.exported_data())
+        self.p._add_card(self.c1)
+        self.assertEqual({0: self.c1.ranking()}, self.p.exported_data())
+
     def test_noop_notify(self):
         mobs = MockObserver(self.p)
 
@@ -99,4 +114,103 @@ class TestObserver(unittest.TestCase):
 
         self.p._add_card(self.c2)
         self.assertIn(self.c1.ranking(), self.obs.buffer.values())
-        self.assertIn(self.c2.ranking(), self.obs.buffer.values())
\ No newline at end of file
+        self.assertIn(self.c2.ranking(), self.obs.buffer.values())
+
+    def test_lazy(self):
+        p2 = GinPlayer()
+        match = GinMatch(self.p, p2)
+        observables = [self.p, match.table, match]
+        eager = [Observer(observable) for observable in observables]
+        lazy = [Observer(observable, lazy=True) for observable in observables]
+        exports = [observable.exports for observable in observables]
+
+        # dealing notifies on every card, but a lazy observer doesn't rebuild anything until it's read
+        match.deal_cards()
+        self.assertEqual(exports, [observable.exports for observable in observables])
+        self.assertGreaterEqual(lazy[0].coalesced, 10)
+        self.assertGreaterEqual(lazy[1].coalesced, 20)
+        self.assertEqual(0, eager[0].coalesced)
+
+        # when read, lazy observers see what eager ones were pushed, rebuilding at most once per observable however
+        # many reads
+        for turn in range(4):
+            for lazy_observer, eager_observer in zip(lazy, eager):
+                for i in range(lazy_observer.width):
+                    if i in eager_observer.buffer:
+                        self.assertEqual(eager_observer.get_value_by_index(i), lazy_observer.get_value_by_index(i))
+            for observable, before in zip(observables, exports):
+                self.assertLessEqual(observable.exports - before, 1)
+            exports = [observable.exports for observable in observables]
+
+            self.p.discard_card(self.p.hand.cards[0])
+            self.p.draw()
+
+
+# noinspection PyProtectedMember
+class TestFeatureVector(unittest.TestCase):
+    def setUp(self):
+        self.p1 = GinPlayer()
+        self.p2 = GinPlayer()
+        self.match = GinMatch(self.p1, self.p2)
+        self.observables = [self.p1, self.match.table, self.match]
+        self.features = FeatureVector(self.observables)
+
+    def assert_matches_observers(self):
+        observers = [Observer(observable) for observable in self.observables]
+        expected = [observer.get_value_by_index(i) for observer in observers for i in range(observer.width)
+                    if observer.buffer is not None and i in observer.buffer]
+        pulled = [value for observer, slot in zip(observers, self.features.slots) for i, value in enumerate(slot)
+                  if observer.buffer is not None and i in observer.buffer]
+        self.assertEqual(expected, pulled)
+
+    def test___init__(self):
+        self.assertEqual([11, 33, 5], self.features.widths)
+        self.assertEqual(49, self.features.width)
+        self.assertEqual(3, len(self.features))
+
+        # the slots are views onto one array
+        self.features.slots[1][0] = 7
+        self.assertEqual(7, self.features.values[11])
+
+        # we don't register as an observer, so state changes cost nothing
+        self.assertEqual([], self.p1._observers)
+
+    def test_pull(self):
+        # an empty table pulls as all zeros
+        self.assertEqual([0] * 33, list(self.features.pull()[11:44]))
+
+        # pulled values match what observers are pushed, as the game goes on
+        self.match.deal_cards()
+        self.features.pull()
+        self.assert_matches_observers()
+        for turn in range(6):
+            self.p1.discard_card(self.p1.hand.cards[0])
+            self.p1.draw()
+            self.features.pull()
+            self.assert_matches_observers()
+
+        # and the hand leaves its eleventh slot empty while it holds ten cards
+        self.p1.discard_card(self.p1.hand.cards[0])
+        self.assertEqual(10, len(self.p1.hand.cards))
+        self.assertEqual(0, self.features.pull()[10])
+
+    def test_pull_unchanged(self):
+        # slots whose observable hasn't changed since the last pull are left as they are
+        self.match.deal_cards()
+        self.features.pull()
+        self.features.slots[2][0] = -1
+        self.features.pull()
+        self.assertEqual(-1, self.features.slots[2][0])
+
+        self.features.slots[0][0] = -1
+        self.p1.discard_card(self.p1.hand.cards[0])
+        self.assertEqual(self.p1.hand.cards[0].ranking(), self.features.pull()[0])
+
+    def test_write_features(self):
+        # observables without their own write_features() fall back to organize_data()
+        out = np.zeros(11)
+        Observable.write_features(self.p1, out)
+        self.assertEqual([0] * 11, list(out))
+        self.p1._add_card(GinCard(9, 'c'))
+        Observable.write_features(self.p1, out)
+        self.assertEqual([GinCard(9, 'c').ranking()] + [0] * 10, list(out))
@@ -0,0 +1,177 @@
+import unittest
+from pairing import *
+from genetic_algorithm import Population, GeneSet
+import random
+
+
+class TestPairingScheduler(unittest.TestCase):
+    def setUp(self):
+        random.seed(0)
+        self.p = Population(10, 6)
+        self.members = self.p.member_genes.keys()
+
+    # give members ranking scores in the order given, best first
+    def rank(self, members):
+        for points, member in zip(range(len(members), 0, -1), members):
+            self.p.member_genes[member].update({'game_wins': 1, 'game_points': points})
+
+    # play a round, with challengers winning
+    @staticmethod
+    def play(schedule, results=None):
+        pairings = schedule.send(results)
+        return pairings, [(challenger, defender) for challenger, defender in pairings]
+
+    def test_seated_pairing(self):
+        a, b = self.members[:2]
+        self.assertEqual(seated_pairing(a, b), seated_pairing(b, a))
+
+        # seats follow the genes, so members rebuilt from the same genomes sit the same way
+        rebuilt = dict((member, GeneSet(list(member.genes))) for member in (a, b))
+        seated = seated_pairing(rebuilt[b], rebuilt[a])
+        self.assertEqual([list(member.genes) for member in seated_pairing(a, b)],
+                         [list(member.genes) for member in seated])
+
+        # including those that first differ past their first gene
+        c = GeneSet([a.genes[0]] + [gene + 1 for gene in a.genes[1:]])
+        self.assertEqual((a, c), seated_pairing(c, a))
+        self.assertEqual((a, c), seated_pairing(a, c))
+
+    def test_ranked_members(self):
+        self.rank(self.members[::-1])
+        self.assertEqual(self.members[::-1], ranked_members(self.p, self.members))
+
+    def test_round_robin(self):
+        rounds = list(RoundRobinScheduler().rounds(self.p, self.members))
+        self.assertEqual(1, len(rounds))
+        self.assertEqual(15, len(rounds[0]))
+        self.assertEqual(15, len(set(pairing_key(a, b) for a, b in rounds[0])))
+
+        # pairings that have had their games are skipped
+        self.p.pairing_games[pairing_key(self.members[0], self.members[1])] = 1
+        self.assertEqual(14, len(list(RoundRobinScheduler().rounds(self.p, self.members))[0]))
+        self.p.games_per_pairing = 2
+        self.assertEqual(29, len(list(RoundRobinScheduler().rounds(self.p, self.members))[0]))
+
+    def test_default(self):
+        # the base scheduler plays a round robin
+        self.assertEqual(list(RoundRobinScheduler().rounds(self.p, self.members)),
+                         list(PairingScheduler().rounds(self.p, self.members)))
+
+    def test_random_opponents(self):
+        rounds = list(RandomOpponentsScheduler(2).rounds(self.p, self.members))
+        self.assertEqual(1, len(rounds))
+
+        # no member plays itself or anyone twice, and each challenges up to two others
+        keys = [pairing_key(a, b) for a, b in rounds[0]]
+        self.assertEqual(len(keys), len(set(keys)))
+        self.assertTrue(all(a is not b for a, b in rounds[0]))
+        self.assertLessEqual(len(rounds[0]), 12)
+        for member in self.members:
+            self.assertLessEqual(sum(1 for a, b in rounds[0] if a is member), 2)
+
+        # we can't ask for more opponents than there are
+        self.assertEqual(15, len(list(RandomOpponentsScheduler(10).rounds(self.p, self.members))[0]))
+        self.assertRaises(AssertionError, RandomOpponentsScheduler, 0)
+
+    def test_swiss(self):
+        self.rank(self.members)
+        schedule = SwissScheduler(3).rounds(self.p, self.members)
+
+        # members are paired down the rankings...
+        pairings, results = TestPairingScheduler.play(schedule)
+        self.assertEqual([(self.members[0], self.members[1]), (self.members[2], self.members[3]),
+                          (self.members[4], self.members[5])], pairings)
+
+        # ...avoiding rematches
+        seen = set(pairing_key(a, b) for a, b in pairings)
+        for _ in range(2):
+            pairings, results = TestPairingScheduler.play(schedule, results)
+            self.assertEqual(3, len(pairings))
+            for a, b in pairings:
+                self.assertNotIn(pairing_key(a, b), seen)
+                seen.add(pairing_key(a, b))
+        self.assertRaises(StopIteration, schedule.send, results)
+
+        # odd members out sit a round out
+        self.assertEqual(2, len(next(SwissScheduler(1).rounds(self.p, self.members[:5]))))
+
+        # rematches come only once everyone has met
+        rounds = list(SwissScheduler(6).rounds(self.p, self.members[:4]))
+        self.assertEqual(6, len(rounds))
+        self.assertEqual(6, len(set(pairing_key(a, b) for pairings in rounds[:3] for a, b in pairings)))
+
+    def test_pair_without_rematches(self):
+        a, b, c, d = self.members[:4]
+        met = set([pairing_key(a, b), pairing_key(c, d)])
+
+        # a greedy a-c pairing would leave b and d, who are fine; with b-d met too, a must play d
+        self.assertEqual([(a, c), (b, d)], SwissScheduler.pair_without_rematches([a, b, c, d], met, 100))
+        met.add(pairing_key(b, d))
+        self.assertEqual([(a, d), (b, c)], SwissScheduler.pair_without_rematches([a, b, c, d], met, 100))
+
+        # impossible pairings, or ones over budget, are given up on
+        met.update([pairing_key(a, d), pairing_key(a, c)])
+        self.assertIsNone(SwissScheduler.pair_without_rematches([a, b, c, d], met, 100))
+        self.assertIsNone(SwissScheduler.pair_without_rematches(self.members, set(), 2))
+        self.assertEqual([(a, b), (c, d)], SwissScheduler.pair_greedily([a, b, c, d], met))
+
+    def test_king_of_the_hill(self):
+        self.rank(self.members)
+        schedule = KingOfTheHillScheduler().rounds(self.p, self.members)
+
+        # the top member defends against the bottom one first
+        pairings = schedule.send(None)
+        self.assertEqual([(self.members[0], self.members[5])], pairings)
+
+        # winners hold the hill
+        pairings = schedule.send([(self.members[5], self.members[0])])
+        self.assertEqual([(self.members[5], self.members[4])], pairings)
+        for challenger in (3, 2, 1):
+            pairings = schedule.send([(self.members[5], self.members[challenger + 1])])
+            self.assertEqual([(self.members[5], self.members[challenger])], pairings)
+        self.assertRaises(StopIteration, schedule.send, pairings)
+
+        self.assertEqual([], list(KingOfTheHillScheduler().rounds(self.p, self.members[:1])))
+
+    def test_racing(self):
+        strong = {'game_wins': 100, 'coinflip_game_wins': 0, 'game_losses': 0, 'game_points': 2500}
+        hopeless = {'game_wins': 0, 'coinflip_game_wins': 0, 'game_losses': 100, 'game_points': 0}
+        for member, stats in zip(self.members, [strong, strong, hopeless, hopeless]):
+            self.p.member_genes[member].update(stats)
+        self.p.retain_best = 2
+
+        scheduler = RacingScheduler(3)
+        schedule = scheduler.rounds(self.p, self.members)
+        pairings = schedule.send(None)
+        self.assertEqual(6, len(pairings))
+
+        # the hopeless drop out, and the rest take up their games
+        pairings = schedule.send(None)
+        playing = set(member for pairing in pairings for member in pairing)
+        self.assertEqual(set(self.members) - set(self.members[2:4]), playing)
+        self.assertEqual(6, len(pairings))
+        self.assertEqual(6, len(set(pairing_key(a, b) for a, b in pairings)))
+
+        # once the unknowns prove hopeless too, the race is over
+        for member in self.members[4:]:
+            self.p.member_genes[member].update(hopeless)
+        self.assertRaises(StopIteration, schedule.send, None)
+        self.assertEqual(12, scheduler.games_played)
+        self.assertEqual(2, scheduler.games_redirected)
+        self.assertEqual(6, scheduler.games_saved)
+
+    def test_fitness_test(self):
+        # each format plays out through a population's fitness test
+        for scheduler, matches in [(RandomOpponentsScheduler(1), None), (SwissScheduler(2), 4),
+                                   (KingOfTheHillScheduler(), 3), (RacingScheduler(1), None)]:
+            p = Population(4000, 4, scheduler=scheduler)
+            p.fitness_test()
+            played = sum(stats['match_wins'] for stats in p.member_genes.values())
+            if matches is None:
+                self.assertTrue(2 <= played <= 4)
+            else:
+                self.assertEqual(matches, played)
+
+
+if __name__ == '__main__':
+    unittest.main()
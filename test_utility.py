@@ -0,0 +1,71 @@
+from utility import *
+import unittest
+
+
+class KeyedArgument(object):
+    def __init__(self, value):
+        self.value = value
+        self.repr_calls = 0
+
+    def __repr__(self):
+        self.repr_calls += 1
+        return str(self.value)
+
+    def __memo_key__(self):
+        return self.value
+
+
+class UnkeyedArgument(object):
+    def __init__(self, value):
+        self.value = value
+
+    def __repr__(self):
+        return str(self.value)
+
+
+# noinspection PyMethodMayBeStatic
+class TestMemoized(unittest.TestCase):
+    def setUp(self):
+        self.calls = 0
+
+        @memoized(2)
+        def double(arg):
+            self.calls += 1
+            return arg.value * 2
+
+        self.double = double
+
+    def test_memo_key(self):
+        arg = KeyedArgument(3)
+        self.assertEqual(6, self.double(arg))
+        self.assertEqual(6, self.double(KeyedArgument(3)))
+
+        # the second call is a hit, and neither call needed a repr
+        self.assertEqual(1, self.calls)
+        self.assertEqual(0, arg.repr_calls)
+        self.assertEqual((KeyedArgument, 3), memoized.make_key((arg,), {})[0])
+
+    def test_fallback_to_repr(self):
+        self.assertEqual(8, self.double(UnkeyedArgument(4)))
+        self.assertEqual(8, self.double(UnkeyedArgument(4)))
+        self.assertEqual(1, self.calls)
+        self.assertIsInstance(memoized.make_key((UnkeyedArgument(4),), {}), int)
+
+    def test_cache_info(self):
+        self.double(KeyedArgument(1))
+        self.double(KeyedArgument(1))
+        self.double(KeyedArgument(2))
+        self.double(KeyedArgument(3))
+        # evicts 1 from our 2-entry cache
+        self.double(KeyedArgument(1))
+
+        info = self.double.cache_info()
+        self.assertEqual(1, info['hits'])
+        self.assertEqual(4, info['misses'])
+        self.assertEqual(2, info['maxsize'])
+        self.assertEqual(2, info['currsize'])
+
+        self.double.cache_clear()
+        info = self.double.cache_info()
+        self.assertEqual(0, info['hits'])
+        self.assertEqual(0, info['currsize'])
@@ -93,28 +93,60 @@ from functools import wraps
 
 
 class memoized(object):
-    """ Memoization decorator for functions taking one or more arguments. """
+    """ Memoization decorator for functions taking one or more arguments.
+
+    Arguments that define __memo_key__() are keyed on its (hashable) return value, which lets objects such as
+    GinCardGroup skip building a repr string on every call. Anything else falls back to __repr__() or a pickle.
+    Hit and miss counters are available through the decorated function's cache_info().
+    """
 
     def __init__(self, maxsize=128):
         self.cache = lrucache(maxsize)
+        self.hits = 0
+        self.misses = 0
 
     def __call__(self, func):
         @wraps(func)
         def wrapper(*args, **kwargs):
             key = memoized.make_key(args, kwargs)
             try:
-                return self.cache[key]
+                value = self.cache[key]
+                self.hits += 1
+                return value
             except KeyError:
                 pass
 
+            self.misses += 1
             value = func(*args, **kwargs)
             self.cache[key] = value
             return value
 
+        wrapper.cache_info = self.cache_info
+        wrapper.cache_clear = self.cache_clear
         return wrapper
 
+    # report how well the cache is doing
+    def cache_info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'maxsize': self.cache.size(), 'currsize': len(self.cache)}
+
+    def cache_clear(self):
+        self.cache.clear()
+        self.hits = 0
+        self.misses = 0
+
     @staticmethod
     def make_key(args, kwargs):
+        # fast path: every argument provides a structural key
+        if not kwargs:
+            key = []
+            for arg in args:
+                memo_key = getattr(arg, '__memo_key__', None)
+                if memo_key is None:
+                    break
+                key.append((arg.__class__, memo_key()))
+            else:
+                return tuple(key)
+
         hash_string = ""
         for arg in args:
             try:
@@ -128,4 +160,4 @@ class memoized(object):
             except:
                 hash_string += key + cPickle.dumps(kwargs[key])
 
-        return hash(hash_string)
\ No newline at end of file
+        return hash(hash_string)